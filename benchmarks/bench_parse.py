@@ -0,0 +1,131 @@
+# bench_parse.py — _parse_netsh / 批量解析的微基准
+#
+# 用录制的 fixtures 拼出大规模多适配器输出，对比旧版逐行多正则实现与
+# 当前单遍分类实现的耗时，结果以 JSON 输出：
+#   python benchmarks/bench_parse.py --adapters 500 --repeat 20
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dns_core  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, 'fixtures')
+
+# ── 旧版实现（作为基线保留）───────────────────────────
+LEGACY_DHCP_RE = [
+    re.compile(r'DNS\s+Servers\s+configured\s+through\s+DHCP', re.IGNORECASE),
+    re.compile(r'通过\s*DHCP\s*配置的\s*DNS'),
+    re.compile(r'DHCP\s+配置的\s*DNS'),
+]
+LEGACY_STATIC_RE = [
+    re.compile(r'Statically\s+Configured\s+DNS\s+Servers', re.IGNORECASE),
+    re.compile(r'静态配置的\s*DNS\s*服务器'),
+    re.compile(r'手动配置的\s*DNS'),
+]
+LEGACY_SECTION_RE = re.compile(
+    r'^\s*(?:Configuration\s+for\s+interface\s+"(?P<en>[^"]+)"|接口\s*"(?P<zh>[^"]+)"\s*的配置)\s*$',
+    re.IGNORECASE,
+)
+IP_RE = re.compile(r'(\d{1,3}(?:\.\d{1,3}){3})')
+
+
+def legacy_parse_netsh(output: str, adapter_name: str) -> dict:
+    mode = 'unknown'
+    ips = []
+    for line in output.splitlines():
+        if any(p.search(line) for p in LEGACY_DHCP_RE):
+            mode = 'dhcp'
+            m = IP_RE.search(line)
+            if m: ips.append(m.group(1))
+            continue
+        if any(p.search(line) for p in LEGACY_STATIC_RE):
+            mode = 'static'
+            m = IP_RE.search(line)
+            if m: ips.append(m.group(1))
+            continue
+        if mode == 'static':
+            t = line.strip()
+            if IP_RE.match(t) and '.' in t and not re.search(r'[a-zA-Z]', t):
+                ips.append(t)
+    return {'adapter': adapter_name, 'mode': mode, 'ips': ips, 'raw': output}
+
+
+def legacy_parse_bulk(output: str) -> dict:
+    sections = []
+    name = None
+    buf = []
+    for line in output.splitlines():
+        m = LEGACY_SECTION_RE.match(line)
+        if m:
+            if name is not None:
+                sections.append((name, '\n'.join(buf)))
+            name = m.group('en') or m.group('zh')
+            buf = [line]
+        elif name is not None:
+            buf.append(line)
+    if name is not None:
+        sections.append((name, '\n'.join(buf)))
+    return {n: legacy_parse_netsh(text, n) for n, text in sections}
+
+
+# ── 输入构造 ─────────────────────────────────────────
+def build_output(locale: str, adapters: int) -> str:
+    """把录制的多适配器输出按段复制并改名，得到指定数量的适配器。"""
+    with open(os.path.join(FIXTURES, f'netsh_show_config_{locale}.txt'), encoding='utf-8') as f:
+        sections = list(dns_core.iter_netsh_configs(f.read().splitlines()))
+    chunks = []
+    for i in range(adapters):
+        section = sections[i % len(sections)]
+        raw = section['raw'].replace(f'"{section["adapter"]}"', f'"{section["adapter"]} #{i}"', 1)
+        chunks.append('\n' + raw)
+    return '\n'.join(chunks) + '\n'
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(adapters: int, repeat: int) -> list[dict]:
+    results = []
+    for locale in ('en', 'zh'):
+        output = build_output(locale, adapters)
+        legacy = legacy_parse_bulk(output)
+        current = dns_core._parse_netsh_bulk(output)
+        assert {k: (v['mode'], v['ips']) for k, v in legacy.items()} == \
+               {k: (v['mode'], v['ips']) for k, v in current.items()}, 'parser mismatch'
+        legacy_s = best_of(lambda: legacy_parse_bulk(output), repeat)
+        current_s = best_of(lambda: dns_core._parse_netsh_bulk(output), repeat)
+        results.append({
+            'name': 'parse_bulk',
+            'locale': locale,
+            'adapters': adapters,
+            'lines': output.count('\n'),
+            'legacy_ms': round(legacy_s * 1000, 3),
+            'current_ms': round(current_s * 1000, 3),
+            'speedup': round(legacy_s / current_s, 2) if current_s else None,
+        })
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='netsh 输出解析微基准')
+    parser.add_argument('--adapters', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+    print(json.dumps(run_benchmarks(args.adapters, args.repeat), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
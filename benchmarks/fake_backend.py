@@ -0,0 +1,91 @@
+# fake_backend.py — 可配置的模拟命令层（netsh / ipconfig）
+#
+# FakeSystem 代替 dns_core.run，按命令类别注入延迟与失败率，适配器数量与
+# 输出语言可配置，netsh 的行为复用 fixtures/fake_netsh.py。
+import contextlib
+import os
+import random
+import shlex
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'fixtures'))
+
+import dns_core  # noqa: E402
+import fake_netsh  # noqa: E402
+
+
+def make_adapters(count: int, static_ratio: float = 0.25, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    kinds = ('Ethernet', 'Wi-Fi', 'vEthernet', 'OpenVPN TAP')
+    adapters = []
+    for i in range(count):
+        name = kinds[i % len(kinds)] + (f' {i}' if i >= len(kinds) else '')
+        if rng.random() < static_ratio:
+            adapters.append({'name': name, 'mode': 'static', 'ips': ['198.18.0.2', '8.8.8.8']})
+        else:
+            adapters.append({'name': name, 'mode': 'dhcp', 'ips': [f'10.{i // 250}.{i % 250}.1']})
+    # 前两个适配器有默认路由
+    for i, adapter in enumerate(adapters[:2]):
+        adapter.update(gateway=f'10.0.{i}.1', metric=25 + i * 10)
+    return adapters
+
+
+class FakeSystem:
+    """模拟的系统命令层，线程安全，可直接替换 dns_core.run。"""
+
+    def __init__(self, adapters: int = 4, locale: str = 'en', latency: dict = None,
+                 failure_rate: float = 0.0, static_ratio: float = 0.25, seed: int = 0):
+        self.netsh = fake_netsh.FakeNetsh(make_adapters(adapters, static_ratio, seed), locale)
+        self.latency = {'netsh': 0.0, 'ipconfig': 0.0}
+        self.latency.update(latency or {})
+        self.failure_rate = failure_rate
+        self.calls: dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def run(self, cmd, check: bool = True) -> str:
+        args = shlex.split(cmd) if isinstance(cmd, str) else [str(c) for c in cmd]
+        verb = os.path.splitext(os.path.basename(args[0]))[0].lower()
+        with self._lock:
+            self.calls[verb] = self.calls.get(verb, 0) + 1
+            failed = self._rng.random() < self.failure_rate
+        delay = self.latency.get(verb, 0.0)
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise dns_core.CommandError(f'{dns_core._format_cmd(cmd)} 执行失败: 模拟故障')
+        if verb == 'netsh':
+            return self._netsh(args[1:])
+        if verb == 'ipconfig':
+            return 'Successfully flushed the DNS Resolver Cache.\n'
+        raise dns_core.CommandError(f'未知命令: {args[0]}')
+
+    def _netsh(self, args: list[str]) -> str:
+        with self._lock:
+            if args[:1] == ['-f']:
+                with open(args[1], 'r', encoding='utf-8', errors='replace') as f:
+                    return ''.join(self.netsh.handle(line) for line in f if line.strip())
+            return self.netsh.handle(shlex.join(args))
+
+    def reset_state(self, adapters: int, static_ratio: float = 0.25, seed: int = 0):
+        with self._lock:
+            self.netsh.adapters = make_adapters(adapters, static_ratio, seed)
+        dns_core.notify_network_change()
+
+
+@contextlib.contextmanager
+def installed(system: FakeSystem):
+    """把 dns_core 的命令执行与数据目录切换到模拟环境。"""
+    with tempfile.TemporaryDirectory(prefix='repairdns-bench-') as data_dir:
+        dns_core.configure(data_dir=data_dir)
+        try:
+            with patch.object(dns_core, 'run', system.run):
+                yield data_dir
+        finally:
+            dns_core.configure(None)
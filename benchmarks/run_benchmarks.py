@@ -0,0 +1,148 @@
+# run_benchmarks.py — 基于模拟命令层的性能基准
+#
+# 用法：
+#   python benchmarks/run_benchmarks.py --adapters 1,8,50,500 --output bench.json
+#   python benchmarks/run_benchmarks.py --latency-ms 15 --failure-rate 0.05 --locale zh
+#   python benchmarks/run_benchmarks.py --compare old.json new.json
+#
+# 输出为 JSON：meta 记录运行参数，results 中每项为一个 (基准, 适配器数, 语言)
+# 组合的耗时统计（毫秒）。--compare 按相同键对比两次结果并列出变化比例。
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_backend  # noqa: E402
+from fake_backend import FakeSystem, dns_core  # noqa: E402
+
+
+def measure(fn, repeat: int, setup=None) -> dict:
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'max_ms': round(max(samples), 3),
+        'repeat': repeat,
+    }
+
+
+def scenario(system: FakeSystem, count: int, repeat: int) -> dict:
+    """在已安装的模拟环境中逐项测量，返回 {基准名: 统计}。"""
+    names = [a['name'] for a in system.netsh.adapters]
+    first = names[0]
+    raw = system.run(['netsh', 'interface', 'ip', 'show', 'config'])
+    static_reset = lambda: system.reset_state(count, static_ratio=1.0)  # noqa: E731
+    backup = {'adapter': first, 'mode': 'static', 'ips': ['198.18.0.2', '8.8.8.8']}
+    config = {'adapter': first, 'mode': 'static', 'ips': ['1.1.1.1'], 'raw': raw[:2000]}
+
+    # 预先写入一批日志与备份，使持久化基准不在空文件上运行
+    for i in range(200):
+        dns_core._add_log('repair', names[i % len(names)], config, None, True)
+        dns_core._save_backup(dict(config, adapter=names[i % len(names)]))
+
+    return {
+        'get_active_adapters': measure(dns_core.get_active_adapters, repeat),
+        'get_dns_config': measure(lambda: dns_core.get_dns_config(first), repeat),
+        'get_all_dns_configs': measure(lambda: dns_core.get_all_dns_configs(names), repeat),
+        '_parse_netsh': measure(lambda: dns_core._parse_netsh(raw, first), repeat),
+        '_parse_netsh_bulk': measure(lambda: dns_core._parse_netsh_bulk(raw), repeat),
+        'repair_dns': measure(lambda: dns_core.repair_dns(first), repeat, setup=static_reset),
+        'repair_many': measure(lambda: dns_core.repair_many(names), repeat, setup=static_reset),
+        'rollback': measure(lambda: dns_core.rollback(backup), repeat),
+        '_save_backup': measure(lambda: dns_core._save_backup(config), repeat),
+        'get_backups': measure(dns_core.get_backups, repeat),
+        '_add_log': measure(lambda: dns_core._add_log('repair', first, config, None, True), repeat),
+        'get_logs': measure(lambda: dns_core.get_logs(limit=200), repeat),
+        'get_settings': measure(dns_core.get_settings, repeat),
+    }
+
+
+def run_all(adapter_counts, locales, latency_ms: float, failure_rate: float, repeat: int) -> dict:
+    latency = {verb: latency_ms / 1000 for verb in ('netsh', 'ipconfig')}
+    results = []
+    for locale in locales:
+        for count in adapter_counts:
+            system = FakeSystem(adapters=count, locale=locale, latency=latency,
+                                failure_rate=failure_rate)
+            with fake_backend.installed(system):
+                stats = scenario(system, count, repeat)
+            for name, values in stats.items():
+                results.append({'name': name, 'adapters': count, 'locale': locale, **values})
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency_ms': latency_ms,
+            'failure_rate': failure_rate,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> dict:
+    with open(old_path, encoding='utf-8') as f:
+        old = {(r['name'], r['adapters'], r['locale']): r for r in json.load(f)['results']}
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)['results']
+    rows = []
+    for r in new:
+        base = old.get((r['name'], r['adapters'], r['locale']))
+        if not base or not base['median_ms']:
+            continue
+        ratio = r['median_ms'] / base['median_ms']
+        rows.append({
+            'name': r['name'], 'adapters': r['adapters'], 'locale': r['locale'],
+            'old_median_ms': base['median_ms'], 'new_median_ms': r['median_ms'],
+            'ratio': round(ratio, 3), 'regression': ratio > 1 + threshold,
+        })
+    return {'threshold': threshold, 'rows': rows, 'regressions': sum(r['regression'] for r in rows)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='DNS 修复助手性能基准')
+    parser.add_argument('--adapters', default='1,8,50,500', help='逗号分隔的适配器数量')
+    parser.add_argument('--locale', default='en,zh', help='逗号分隔：en / zh')
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='每条命令注入的延迟')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='命令随机失败的概率')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='结果写入文件，默认输出到 stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='对比两次结果')
+    parser.add_argument('--threshold', type=float, default=0.2, help='--compare 判定回归的比例')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        report = compare(*args.compare, threshold=args.threshold)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 1 if report['regressions'] else 0
+
+    report = run_all(
+        [int(x) for x in args.adapters.split(',') if x.strip()],
+        [x.strip() for x in args.locale.split(',') if x.strip()],
+        args.latency_ms, args.failure_rate, args.repeat,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+# dns_cli.py — 无界面的命令行入口（不导入 tkinter）
+#
+#   python -m dns_core check [--json]
+#   python -m dns_core repair [--all | --adapter 名称 ...] [--no-flush] [--json]
+#   python -m dns_core rollback --ts "2025-01-01 12:00:00" [--adapter 名称] [--json]
+#   python -m dns_core logs [--limit 20] [--json]
+#   python -m dns_core monitor [--interval 300] [--repair] [--count N]
+#   python -m dns_core history [--adapter 名称] [--days 30] [--all-modes] [--json]
+import argparse
+import json
+import sys
+import time
+
+import dns_core as core
+
+# ── 退出码 ────────────────────────────────────────────
+EXIT_OK = 0          # DNS 正常 / 操作成功
+EXIT_STATIC = 1      # 发现静态 DNS
+EXIT_USAGE = 2       # 参数错误（argparse 默认）
+EXIT_UNKNOWN = 3     # 无法读取或判断 DNS 状态
+EXIT_FAILED = 4      # 修复或回滚失败
+
+CHECK_DEADLINE = 60  # 一次检测的总时限（秒）
+
+
+# ── 检测 ──────────────────────────────────────────────
+def check_state() -> dict:
+    started = time.monotonic()
+    try:
+        with core.deadline(CHECK_DEADLINE):
+            adapters = core.get_active_adapters()
+            configs = core.get_all_dns_configs(adapters)
+        core.record_refresh(configs, time.monotonic() - started)
+    except Exception as e:
+        return {'ts': core._now(), 'status': 'error', 'error': str(e), 'adapters': [], 'static': []}
+    rows = []
+    for adapter, cfg in zip(adapters, configs):
+        row = {**adapter, 'mode': core.dns_mode(cfg), 'ips': cfg.get('ips', [])}
+        if cfg.get('ipv6'):
+            row['ipv6'] = cfg['ipv6']
+        if cfg.get('error'):
+            row['error'] = cfg['error']
+        rows.append(row)
+    static = [r['name'] for r in rows if r['mode'] == 'static']
+    if not rows:
+        status = 'no_network'
+    elif static:
+        status = 'static'
+    elif any(r['mode'] == 'dhcp' for r in rows):
+        status = 'ok'
+    else:
+        status = 'unknown'
+    return {'ts': core._now(), 'status': status, 'adapters': rows, 'static': static}
+
+
+def _state_signature(state: dict) -> tuple:
+    """监控调度用的状态摘要：状态或任一适配器的 DNS 变化都会改变它。"""
+    return state['status'], tuple(
+        (row['name'], row['mode'], tuple(core.dns_servers(row))) for row in state['adapters']
+    )
+
+
+def _state_exit_code(state: dict) -> int:
+    return {'ok': EXIT_OK, 'static': EXIT_STATIC}.get(state['status'], EXIT_UNKNOWN)
+
+
+def _print_state(state: dict, as_json: bool):
+    if as_json:
+        print(json.dumps(state, ensure_ascii=False))
+        return
+    if state['status'] == 'error':
+        print(f'[ERROR] 网络状态读取失败: {state["error"]}')
+        return
+    if not state['adapters']:
+        print('[INFO] 未检测到活动适配器')
+        return
+    for row in state['adapters']:
+        ips = ', '.join(core.dns_servers(row)) or '—'
+        print(f'{row["mode"].upper():<8} {row["name"]}  {ips}')
+    print(f'[{state["status"].upper()}] 共 {len(state["adapters"])} 个适配器，'
+          f'{len(state["static"])} 个为静态 DNS')
+
+
+# ── 子命令 ────────────────────────────────────────────
+def cmd_check(args) -> int:
+    state = check_state()
+    _print_state(state, args.json)
+    return _state_exit_code(state)
+
+
+def cmd_repair(args) -> int:
+    _warn_if_not_admin()
+    if args.adapter:
+        targets = list(args.adapter)
+    else:
+        state = check_state()
+        if state['status'] == 'error':
+            _print_state(state, args.json)
+            return EXIT_UNKNOWN
+        targets = state['static']
+    settings = core.get_settings()
+    flush = settings['flush_on_repair'] and not args.no_flush
+    if targets and (args.atomic or settings.get('atomic_repair')):
+        # 任一适配器失败时整体回滚，回滚结果按 rollback 动作另行输出
+        outcome = core.repair_transaction(targets, flush=flush, policy='all_or_nothing')
+        _print_results('repair', outcome['results'], args.json)
+        if outcome['rollback']:
+            _print_results('rollback', outcome['rollback'], args.json)
+        return EXIT_OK if outcome['success'] else EXIT_FAILED
+    results = core.repair_many(targets, flush=flush) if targets else []
+    _print_results('repair', results, args.json)
+    return EXIT_FAILED if any(not r['success'] for r in results) else EXIT_OK
+
+
+def cmd_rollback(args) -> int:
+    _warn_if_not_admin()
+    backups = [
+        b for b in core.get_backups()
+        if b.get('ts') == args.ts and (not args.adapter or b.get('adapter') == args.adapter)
+    ]
+    if not backups:
+        print(f'[ERROR] 没有时间为 {args.ts} 的备份', file=sys.stderr)
+        return EXIT_FAILED
+    # 同一适配器在同一秒内有多条备份时只回滚最后一条
+    latest = {b['adapter']: b for b in backups}
+    results = [core.rollback(b) for b in latest.values()]
+    _print_results('rollback', results, args.json)
+    return EXIT_FAILED if any(not r['success'] for r in results) else EXIT_OK
+
+
+def cmd_logs(args) -> int:
+    logs = core.get_logs(limit=args.limit, adapter=args.adapter, action=args.action,
+                         success=False if args.failed else None)
+    if args.json:
+        print(json.dumps(logs, ensure_ascii=False))
+        return EXIT_OK
+    for entry in logs:
+        status = 'OK' if entry.get('success') else 'FAIL'
+        print(f'{entry.get("ts", "")}  [{str(entry.get("action", "")).upper()}] '
+              f'{entry.get("adapter", "")}  {status}  {entry.get("error") or ""}'.rstrip())
+    return EXIT_OK
+
+
+def cmd_monitor(args) -> int:
+    settings = core.get_settings()
+    if args.interval:
+        # 指定 --interval 时按固定间隔检测
+        scheduler = core.AdaptiveScheduler(args.interval, args.interval, jitter=0)
+    else:
+        scheduler = core.create_scheduler(settings)
+    source = core.create_change_source(poll_interval=scheduler.max_interval)
+    # sqlite3 只在需要历史记录的子命令里导入，不拖慢 check 等一次性命令的启动
+    import dns_history
+    history = dns_history.HistoryStore()
+    code = EXIT_OK
+    ticks = 0
+    event = False
+    try:
+        while True:
+            state = check_state()
+            if state['status'] != 'error':
+                history.record(state['adapters'])
+            delay = scheduler.observe(_state_signature(state), event=event)
+            if args.repair and state['static']:
+                state['repair'] = core.repair_many(state['static'], flush=settings['flush_on_repair'])
+                delay = scheduler.tighten()
+            print(json.dumps(state, ensure_ascii=False), flush=True)
+            _write_metrics()
+            code = _state_exit_code(state)
+            ticks += 1
+            if args.count and ticks >= args.count:
+                return code
+            event = source.wait(delay) and source.event_driven
+            if event:
+                core.notify_network_change()
+    except KeyboardInterrupt:
+        return code
+    finally:
+        source.close()
+        history.close()
+
+
+def cmd_history(args) -> int:
+    import dns_history
+    store = dns_history.HistoryStore()
+    try:
+        rows = store.report(adapter=args.adapter, since=time.time() - args.days * 86400,
+                            mode=None if args.all_modes else 'static')
+    finally:
+        store.close()
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False))
+        return EXIT_OK
+    if not rows:
+        print(f'[OK] 最近 {args.days:g} 天没有静态 DNS 记录' if not args.all_modes else '[INFO] 没有历史记录')
+    for row in rows:
+        servers = ', '.join(row['servers']) or '—'
+        print(f'{row["mode"].upper():<8} {row["adapter"]}  {servers}  '
+              f'{row["seconds"] / 3600:.1f} 小时  {row["occurrences"]} 次')
+    return EXIT_OK
+
+
+def _print_results(action: str, results: list, as_json: bool):
+    if as_json:
+        print(json.dumps({'action': action, 'results': results}, ensure_ascii=False))
+        return
+    if not results:
+        print('[OK] 没有需要处理的适配器')
+    for r in results:
+        if r['success']:
+            print(f'[OK] {r["adapter"]}')
+        else:
+            print(f'[FAIL] {r["adapter"]}: {r.get("error", "")}')
+
+
+def _write_metrics():
+    try:
+        core.write_metrics()
+    except OSError as e:
+        print(f'[WARNING] 指标写入失败: {e}', file=sys.stderr)
+
+
+def _warn_if_not_admin():
+    if sys.platform == 'win32' and not core.is_admin():
+        print('[WARNING] 当前不是管理员权限，修改 DNS 可能失败', file=sys.stderr)
+
+
+# ── 入口 ──────────────────────────────────────────────
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m dns_core', description='DNS 一键修复助手（命令行）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('check', help='检测所有活动适配器的 DNS 状态')
+    p.add_argument('--json', action='store_true', help='以 JSON 输出')
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser('repair', help='把静态 DNS 恢复为自动获取')
+    target = p.add_mutually_exclusive_group()
+    target.add_argument('--all', action='store_true', help='修复全部静态 DNS 适配器（默认）')
+    target.add_argument('--adapter', action='append', help='只修复指定适配器，可重复')
+    p.add_argument('--no-flush', action='store_true', help='修复后不清除 DNS 缓存')
+    p.add_argument('--atomic', action='store_true', help='任一适配器修复失败时把全部适配器回滚到修复前')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_repair)
+
+    p = sub.add_parser('rollback', help='按备份时间回滚 DNS 配置')
+    p.add_argument('--ts', required=True, help='备份时间，与 logs / 备份中的 ts 一致')
+    p.add_argument('--adapter', help='只回滚指定适配器')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_rollback)
+
+    p = sub.add_parser('logs', help='查看操作日志')
+    p.add_argument('--limit', type=int, default=20)
+    p.add_argument('--adapter', help='只显示指定适配器的记录')
+    p.add_argument('--action', choices=('repair', 'rollback'), help='只显示指定操作')
+    p.add_argument('--failed', action='store_true', help='只显示失败的记录')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_logs)
+
+    p = sub.add_parser('monitor', help='持续检测，每次结果输出一行 JSON')
+    p.add_argument('--interval', type=float, help='固定检测间隔（秒），默认按设置中的最小 / 最大间隔自适应调整')
+    p.add_argument('--repair', action='store_true', help='发现静态 DNS 时自动修复')
+    p.add_argument('--count', type=int, help='检测指定次数后退出')
+    p.set_defaults(func=cmd_monitor)
+
+    p = sub.add_parser('history', help='统计历史上各适配器被改成静态 DNS 的时长、次数与服务器')
+    p.add_argument('--adapter', help='只统计指定适配器')
+    p.add_argument('--days', type=float, default=30, help='统计最近多少天')
+    p.add_argument('--all-modes', action='store_true', help='同时统计 DHCP 等其他模式')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_history)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,102 @@
 # dns_core.py — DNS 检测与修复核心逻辑
 import subprocess
 import re
+import shlex
 import json
 import os
-import ctypes
 import sys
+import threading
+import queue
+import locale
+import atexit
+import bisect
+import time
+import contextlib
+import contextvars
+import copy
+import hashlib
+import zlib
+from collections import OrderedDict
 from datetime import datetime
-from typing import Sequence, Union
+from typing import Iterable, Iterator, Sequence, Union
 
-# ── 常量 ──────────────────────────────────────────────
-DATA_DIR = os.path.join(os.environ.get('APPDATA', '.'), 'RepairDns')
-BACKUP_FILE = os.path.join(DATA_DIR, 'backups.json')
-LOG_FILE = os.path.join(DATA_DIR, 'log.json')
-SETTINGS_FILE = os.path.join(DATA_DIR, 'settings.json')
+# ── 数据目录 ──────────────────────────────────────────
+# 导入本模块不读取 %APPDATA%、不创建目录；路径在首次使用时才解析。
+# 数据目录优先级：using_data_dir(...) > configure(data_dir=...) > 环境变量 REPAIRDNS_DATA_DIR > %APPDATA%\RepairDns。
+# 直接给 dns_core.DATA_DIR / BACKUP_FILE / LOG_FILE / SETTINGS_FILE 赋值仍然有效，且优先于以上设置。
+DATA_FILES = {
+    'BACKUP_FILE': 'backups.json',
+    'LOG_FILE': 'log.json',
+    'SETTINGS_FILE': 'settings.json',
+}
+
+_configured_data_dir = None
+_scoped_data_dir = contextvars.ContextVar('repairdns_data_dir', default=None)
+_created_dirs: set = set()
+
+
+def configure(data_dir: str = None):
+    """指定数据目录；传 None 恢复默认位置。"""
+    global _configured_data_dir
+    _configured_data_dir = os.path.abspath(data_dir) if data_dir else None
 
-os.makedirs(DATA_DIR, exist_ok=True)
+
+@contextlib.contextmanager
+def using_data_dir(path: str):
+    """在当前线程（上下文）内临时使用另一个数据目录，如批量管理多台主机时每台一个目录。"""
+    token = _scoped_data_dir.set(os.path.abspath(path))
+    try:
+        yield
+    finally:
+        _scoped_data_dir.reset(token)
+
+
+def data_dir() -> str:
+    """返回数据目录，首次使用时创建。"""
+    path = (
+        globals().get('DATA_DIR')
+        or _scoped_data_dir.get()
+        or _configured_data_dir
+        or os.environ.get('REPAIRDNS_DATA_DIR')
+        or os.path.join(os.environ.get('APPDATA', '.'), 'RepairDns')
+    )
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+    return path
+
+
+def _data_file(key: str) -> str:
+    return globals().get(key) or os.path.join(data_dir(), DATA_FILES[key])
+
+
+def __getattr__(name):
+    # 未被赋值覆盖时，模块属性 DATA_DIR / BACKUP_FILE 等按当前配置即时解析
+    if name == 'DATA_DIR':
+        return data_dir()
+    if name in DATA_FILES:
+        return _data_file(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class CommandError(RuntimeError):
     """Raised when a system command cannot be completed successfully."""
 
+
+class CommandTimeout(CommandError):
+    """Raised when a command exceeds its own timeout or the enclosing deadline."""
+
 # ── 权限 ──────────────────────────────────────────────
 def is_admin() -> bool:
     try:
+        import ctypes
         return ctypes.windll.shell32.IsUserAnAdmin() != 0
     except Exception:
         return False
 
 def relaunch_as_admin():
     """以管理员权限重启自身"""
+    import ctypes
     ctypes.windll.shell32.ShellExecuteW(
         None, "runas", sys.executable, subprocess.list2cmdline(sys.argv), None, 1
     )
@@ -50,10 +118,146 @@ def _format_cmd(cmd: Union[str, Sequence[str]]) -> str:
     return subprocess.list2cmdline(list(cmd))
 
 
-def run(cmd: Union[str, Sequence[str]], check: bool = True) -> str:
-    result = subprocess.run(
-        cmd, shell=isinstance(cmd, str), capture_output=True
+# 单条命令的默认超时（秒）；超时后结束整个进程树
+COMMAND_TIMEOUT = 30.0
+
+# 当前上下文的总截止时间（time.monotonic() 值），由 deadline() 设置
+_deadline = contextvars.ContextVar('repairdns_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds: float):
+    """with 块内的所有命令共用 seconds 秒的总时限；嵌套时以更早的截止时间为准。"""
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _command_timeout(cmd, timeout: float = None) -> float:
+    limit = COMMAND_TIMEOUT if timeout is None else timeout
+    at = _deadline.get()
+    if at is not None:
+        remaining = at - time.monotonic()
+        if remaining <= 0:
+            raise CommandTimeout(f'{_format_cmd(cmd)} 未执行：已超过总时限')
+        limit = min(limit, remaining)
+    return limit
+
+
+# 当前上下文的命令执行器，设置后 run() 把命令交给它（例如在远程主机上执行）
+_command_runner = contextvars.ContextVar('repairdns_command_runner', default=None)
+
+
+@contextlib.contextmanager
+def command_runner(runner):
+    """在当前线程（上下文）内用 runner(cmd, check) -> str 代替本机命令执行。"""
+    token = _command_runner.set(runner)
+    try:
+        yield
+    finally:
+        _command_runner.reset(token)
+
+
+def run(cmd: Union[str, Sequence[str]], check: bool = True, timeout: float = None) -> str:
+    """执行命令并返回输出；超过 timeout（默认 COMMAND_TIMEOUT）或总时限时抛出 CommandTimeout。"""
+    runner = _command_runner.get()
+    if runner is not None:
+        return runner(cmd, check)
+    limit = _command_timeout(cmd, timeout)
+    session = _netsh_session
+    with _timed(cmd):
+        if session is not None and _is_session_command(cmd):
+            # 交互式 netsh 没有逐条退出码；写操作之后都会回读校验，失败会在校验时暴露
+            return session.execute(list(cmd)[1:], timeout=limit)
+        result = _spawn(cmd, limit)
+    return _command_output(cmd, result, check)
+
+
+def _spawn(cmd: Union[str, Sequence[str]], timeout: float) -> subprocess.CompletedProcess:
+    # 子进程单独成组，超时时能连同它启动的子进程一起结束
+    kwargs = {} if sys.platform == 'win32' else {'start_new_session': True}
+    _metrics.inc('subprocess_spawns_total', label=_command_verb(cmd))
+    proc = subprocess.Popen(
+        cmd, shell=isinstance(cmd, str), stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs
     )
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_tree(proc)
+        raise CommandTimeout(f'{_format_cmd(cmd)} 超时（{timeout:.1f} 秒），已结束进程') from None
+    except BaseException:
+        _kill_tree(proc)
+        raise
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def _terminate_tree(pid: int):
+    """结束进程及其子进程：Windows 用 taskkill /T，其他系统结束整个进程组。"""
+    try:
+        if sys.platform == 'win32':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(pid)], capture_output=True, timeout=10)
+        else:
+            import signal
+            os.killpg(pid, signal.SIGKILL)
+    except Exception:
+        pass
+
+
+def _kill_tree(proc):
+    if proc.poll() is None:
+        _terminate_tree(proc.pid)
+        try:
+            proc.kill()
+        except OSError:
+            pass
+    try:
+        proc.communicate(timeout=5)
+    except Exception:
+        # 仍有孙进程占着管道时不再等待输出
+        for stream in (proc.stdout, proc.stderr):
+            if stream is not None:
+                stream.close()
+        proc.wait()
+
+
+async def async_run(cmd: Union[str, Sequence[str]], check: bool = True, timeout: float = None) -> str:
+    """run() 的异步版本，基于 asyncio 子进程；超时或任务被取消时结束进程树。"""
+    import asyncio
+    runner = _command_runner.get()
+    if runner is not None:
+        return await asyncio.to_thread(runner, cmd, check)
+    limit = _command_timeout(cmd, timeout)
+    kwargs = {} if sys.platform == 'win32' else {'start_new_session': True}
+    with _timed(cmd):
+        _metrics.inc('subprocess_spawns_total', label=_command_verb(cmd))
+        if isinstance(cmd, str):
+            proc = await asyncio.create_subprocess_shell(
+                cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, **kwargs
+            )
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, **kwargs
+            )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), limit)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if proc.returncode is None:
+                _terminate_tree(proc.pid)
+                with contextlib.suppress(ProcessLookupError):
+                    proc.kill()
+                await proc.wait()
+            if isinstance(e, asyncio.TimeoutError):
+                raise CommandTimeout(f'{_format_cmd(cmd)} 超时（{limit:.1f} 秒），已结束进程') from None
+            raise
+    result = subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+    return _command_output(cmd, result, check)
+
+
+def _command_output(cmd, result: subprocess.CompletedProcess, check: bool) -> str:
     stdout = _decode_output(result.stdout)
     stderr = _decode_output(result.stderr)
     if check and result.returncode != 0:
@@ -61,11 +265,391 @@ def run(cmd: Union[str, Sequence[str]], check: bool = True) -> str:
         raise CommandError(f'{_format_cmd(cmd)} 执行失败: {detail}')
     return stdout or stderr
 
+# ── 命令耗时统计 ──────────────────────────────────────
+# 按命令名（netsh / route / ipconfig ...）累计耗时直方图，桶上界单位为毫秒。
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class LatencyHistogram:
+    """固定分桶的耗时直方图，分位数在桶内线性插值估算。"""
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.timeouts = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float, timed_out: bool = False):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if timed_out:
+            self.timeouts += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.max_ms
+                return round(min(low + (high - low) * (rank - seen) / n, self.max_ms), 1)
+            seen += n
+        return round(self.max_ms, 1)
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'timeouts': self.timeouts,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 1),
+            'sum_ms': round(self.sum_ms, 1),
+        }
+
+
+_latency: dict[str, LatencyHistogram] = {}
+_latency_lock = threading.Lock()
+
+
+def _command_verb(cmd) -> str:
+    first = cmd.split(None, 1)[0] if isinstance(cmd, str) else (list(cmd) or [''])[0]
+    name = os.path.basename(str(first)).lower()
+    stem, ext = os.path.splitext(name)
+    return (stem if ext in ('.exe', '.com', '.bat', '.cmd') else name) or '?'
+
+
+@contextlib.contextmanager
+def _timed(cmd):
+    started = time.perf_counter()
+    timed_out = False
+    try:
+        yield
+    except CommandTimeout:
+        timed_out = True
+        raise
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        verb = _command_verb(cmd)
+        with _latency_lock:
+            _latency.setdefault(verb, LatencyHistogram()).observe(ms, timed_out)
+
+
+def get_latency_stats() -> dict[str, dict]:
+    """按命令名返回耗时统计：次数、超时次数、p50 / p95 / p99 / 最大值（毫秒）。"""
+    with _latency_lock:
+        return {verb: h.summary() for verb, h in sorted(_latency.items())}
+
+
+def reset_latency_stats():
+    with _latency_lock:
+        _latency.clear()
+
+
+# ── 运行指标 ──────────────────────────────────────────
+# 名称 -> (类型, 标签名, 说明)。导出为 Prometheus 文本时加 repairdns_ 前缀。
+METRICS = {
+    'refresh_total': ('counter', None, 'Completed DNS state refreshes'),
+    'refresh_seconds_total': ('counter', None, 'Total time spent in refreshes'),
+    'refresh_last_duration_seconds': ('gauge', None, 'Duration of the most recent refresh'),
+    'adapters_probed_total': ('counter', None, 'Adapters probed across all refreshes'),
+    'adapters_active': ('gauge', None, 'Active adapters seen by the most recent refresh'),
+    'static_dns_detections_total': ('counter', 'adapter', 'Refreshes that found static DNS on the adapter'),
+    'repair_attempts_total': ('counter', None, 'Adapter repairs attempted'),
+    'repair_success_total': ('counter', None, 'Adapter repairs that passed verification'),
+    'repair_failure_total': ('counter', None, 'Adapter repairs that failed'),
+    'verification_failures_total': ('counter', None, 'Post-change DNS verifications that did not match'),
+    'repair_rollbacks_total': ('counter', None, 'Adapters restored after an all-or-nothing repair failed'),
+    'subprocess_spawns_total': ('counter', 'command', 'Processes started, by command'),
+}
+METRICS_JSON = 'metrics.json'
+METRICS_PROM = 'metrics.prom'
+
+
+class Metrics:
+    """进程内的计数器与量表，线程安全。"""
+
+    def __init__(self):
+        self._values: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, label: str = None):
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[label] = series.get(label, 0) + value
+
+    def set(self, name: str, value: float, label: str = None):
+        with self._lock:
+            self._values.setdefault(name, {})[label] = value
+
+    def snapshot(self) -> dict:
+        """无标签的指标为数值，有标签的为 {标签值: 数值}。"""
+        with self._lock:
+            result = {}
+            for name, (_, label_name, _) in METRICS.items():
+                series = self._values.get(name, {})
+                result[name] = dict(sorted(series.items())) if label_name else series.get(None, 0)
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+_metrics = Metrics()
+
+
+def record_refresh(configs: Sequence[dict], duration: float):
+    """记录一次完整检测：耗时、探测的适配器数、各适配器是否为静态 DNS。"""
+    _metrics.inc('refresh_total')
+    _metrics.inc('refresh_seconds_total', duration)
+    _metrics.set('refresh_last_duration_seconds', round(duration, 6))
+    _metrics.inc('adapters_probed_total', len(configs))
+    _metrics.set('adapters_active', len(configs))
+    for cfg in configs:
+        if dns_mode(cfg) == 'static':
+            _metrics.inc('static_dns_detections_total', label=cfg.get('adapter', ''))
+
+
+def get_metrics() -> dict:
+    return {'ts': _now(), 'metrics': _metrics.snapshot(), 'commands': get_latency_stats()}
+
+
+def reset_metrics():
+    _metrics.reset()
+    reset_latency_stats()
+
+
+def format_prometheus() -> str:
+    """按 Prometheus 文本格式导出全部指标及命令耗时直方图。"""
+    lines = []
+    snapshot = _metrics.snapshot()
+    for name, (kind, label_name, help_text) in METRICS.items():
+        full = f'repairdns_{name}'
+        lines += [f'# HELP {full} {help_text}', f'# TYPE {full} {kind}']
+        value = snapshot[name]
+        if label_name:
+            for label, v in value.items():
+                lines.append(f'{full}{{{label_name}="{_prom_escape(label)}"}} {_prom_number(v)}')
+        else:
+            lines.append(f'{full} {_prom_number(value)}')
+
+    full = 'repairdns_command_duration_milliseconds'
+    lines += [f'# HELP {full} Command latency by command', f'# TYPE {full} histogram']
+    timeouts = []
+    with _latency_lock:
+        histograms = sorted(_latency.items())
+        for verb, h in histograms:
+            cmd = _prom_escape(verb)
+            cumulative = 0
+            for bound, n in zip(list(h.bounds) + ['+Inf'], h.counts):
+                cumulative += n
+                lines.append(f'{full}_bucket{{command="{cmd}",le="{bound}"}} {cumulative}')
+            lines.append(f'{full}_sum{{command="{cmd}"}} {_prom_number(round(h.sum_ms, 3))}')
+            lines.append(f'{full}_count{{command="{cmd}"}} {h.count}')
+            timeouts.append(f'repairdns_command_timeouts_total{{command="{cmd}"}} {h.timeouts}')
+    lines += ['# HELP repairdns_command_timeouts_total Commands killed after a timeout',
+              '# TYPE repairdns_command_timeouts_total counter'] + timeouts
+    return '\n'.join(lines) + '\n'
+
+
+def _prom_escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prom_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def write_metrics(directory: str = None) -> tuple[str, str]:
+    """把指标原子地写入 metrics.json 与 metrics.prom（默认在数据目录），返回两个路径。"""
+    directory = directory or data_dir()
+    json_path = os.path.join(directory, METRICS_JSON)
+    prom_path = os.path.join(directory, METRICS_PROM)
+    _write_json_atomic(json_path, get_metrics())
+    _write_text_atomic(prom_path, format_prometheus())
+    return json_path, prom_path
+
+
+# ── netsh 会话 ────────────────────────────────────────
+class NetshSession:
+    """常驻的交互式 netsh 进程。
+
+    每条命令后紧跟一条必然不存在的哨兵命令，netsh 回显"找不到命令"时
+    即可确定上一条命令的输出已经结束。进程意外退出时自动重启一次。
+    """
+
+    PROMPT_RE = re.compile(r'netsh(?:\s+[\w ]+)?>[ ]?')
+
+    def __init__(self, argv: Sequence[str] = ('netsh',), timeout: float = 30.0):
+        self.argv = list(argv)
+        self.timeout = timeout
+        self.starts = 0
+        self._proc = None
+        self._chunks: queue.Queue = queue.Queue()
+        self._pending = b''
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _start(self):
+        flags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+        self._proc = subprocess.Popen(
+            self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, creationflags=flags,
+        )
+        self._chunks = queue.Queue()
+        self._pending = b''
+        self.starts += 1
+        _metrics.inc('subprocess_spawns_total', label=_command_verb(self.argv))
+        threading.Thread(
+            target=self._pump, args=(self._proc.stdout, self._chunks),
+            name='netsh-session', daemon=True,
+        ).start()
+
+    @staticmethod
+    def _pump(stream, chunks: queue.Queue):
+        read = getattr(stream, 'read1', stream.read)
+        while True:
+            try:
+                data = read(4096)
+            except (OSError, ValueError):
+                data = b''
+            chunks.put(data)
+            if not data:
+                return
+
+    def execute(self, args: Sequence[str], timeout: float = None) -> str:
+        """执行一条 netsh 子命令（不含开头的 netsh），返回其输出。"""
+        line = subprocess.list2cmdline(list(args))
+        limit = self.timeout if timeout is None else timeout
+        with self._lock:
+            for attempt in range(2):
+                if not self.alive:
+                    self._start()
+                try:
+                    return self._exchange(line, limit)
+                except (OSError, EOFError) as e:
+                    self._kill()
+                    if attempt:
+                        raise CommandError(f'netsh 会话执行失败: {line}: {e}') from e
+        raise CommandError(f'netsh 会话执行失败: {line}')
+
+    def _exchange(self, line: str, timeout: float) -> str:
+        import uuid
+        token = f'__repairdns_{uuid.uuid4().hex}__'
+        encoding = locale.getpreferredencoding(False) or 'utf-8'
+        payload = f'{line}\n{token}\n'.encode(encoding, errors='replace')
+        self._proc.stdin.write(payload)
+        self._proc.stdin.flush()
+
+        marker = token.encode('ascii')
+        buf = self._pending
+        expires = time.monotonic() + timeout
+        while marker not in buf:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                self._kill()
+                raise CommandTimeout(f'netsh 会话超时（{timeout:.1f} 秒）: {line}')
+            try:
+                data = self._chunks.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if not data:
+                raise EOFError('netsh 进程已退出')
+            buf += data
+
+        pos = buf.index(marker)
+        line_start = buf.rfind(b'\n', 0, pos) + 1
+        line_end = buf.find(b'\n', pos)
+        self._pending = buf[line_end + 1:] if line_end >= 0 else b''
+        return self.PROMPT_RE.sub('', _decode_output(buf[:line_start]))
+
+    def _kill(self):
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.kill()
+                proc.wait(timeout=5)
+            except Exception:
+                pass
+
+    def close(self):
+        with self._lock:
+            if self.alive:
+                try:
+                    self._proc.stdin.write(b'exit\n')
+                    self._proc.stdin.flush()
+                    self._proc.wait(timeout=2)
+                except Exception:
+                    pass
+            self._kill()
+
+
+_netsh_session = None
+
+
+def _is_session_command(cmd) -> bool:
+    if isinstance(cmd, str) or not cmd:
+        return False
+    head = os.path.splitext(os.path.basename(str(cmd[0])))[0].lower()
+    # netsh -f 脚本等带选项的调用仍走独立进程
+    return head == 'netsh' and len(cmd) > 1 and not str(cmd[1]).startswith('-')
+
+
+def enable_netsh_session(enabled: bool = True, argv: Sequence[str] = ('netsh',)):
+    """开启后 run() 中的 netsh 命令改由常驻会话执行，关闭时结束会话进程。"""
+    global _netsh_session
+    old, _netsh_session = _netsh_session, (NetshSession(argv) if enabled else None)
+    if old is not None:
+        old.close()
+    return _netsh_session
+
+
+def _close_netsh_session():
+    if _netsh_session is not None:
+        _netsh_session.close()
+
+
+atexit.register(_close_netsh_session)
+
 # ── 适配器枚举 ────────────────────────────────────────
 CONNECTED_RE = re.compile(r'Connected|已连接', re.IGNORECASE)
 
 def get_active_adapters() -> list[dict]:
-    output = run(['netsh', 'interface', 'show', 'interface'])
+    adapters = _parse_interfaces(run(['netsh', 'interface', 'show', 'interface']))
+    _mark_routes(adapters, get_routing(need=[a['name'] for a in adapters]))
+    return adapters
+
+
+async def async_get_active_adapters() -> list[dict]:
+    import asyncio
+    if _command_runner.get() is None and _cached_routing() is not None:
+        # 有缓存时先枚举适配器，与同步版本一样按名称检查缓存，新出现的适配器会触发重新读取
+        adapters = _parse_interfaces(await async_run(['netsh', 'interface', 'show', 'interface']))
+        _mark_routes(adapters, await async_get_routing(need=[a['name'] for a in adapters]))
+        return adapters
+    interfaces, routing = await asyncio.gather(
+        async_run(['netsh', 'interface', 'show', 'interface']),
+        async_get_routing(),
+        return_exceptions=True,
+    )
+    if isinstance(interfaces, BaseException):
+        raise interfaces
+    adapters = _parse_interfaces(interfaces)
+    _mark_routes(adapters, None if isinstance(routing, BaseException) else routing)
+    return adapters
+
+
+def _parse_interfaces(output: str) -> list[dict]:
     adapters = []
     lines = output.splitlines()
     # 找表头后的数据行
@@ -87,8 +671,8 @@ def get_active_adapters() -> list[dict]:
                     'name': name,
                     'type': _guess_type(name),
                     'has_gateway': False,
+                    'index': None,
                 })
-    _mark_gateway(adapters)
     return adapters
 
 def _guess_type(name: str) -> str:
@@ -98,191 +682,1769 @@ def _guess_type(name: str) -> str:
     if re.search(r'vmware|virtualbox|hyper-v|loopback|虚拟|vethernet', n): return 'virtual'
     return 'other'
 
-def _mark_gateway(adapters: list[dict]):
+# ── 路由表 ────────────────────────────────────────────
+# 接口索引来自 netsh interface ipv4 show interfaces，默认路由（0.0.0.0/0）来自
+# netsh interface ipv4 show route，两者按接口索引关联。结果缓存到网络配置变化
+# （notify_network_change，由 ChangeWatcher 在收到系统通知时调用）或超过
+# ROUTING_CACHE_TTL 秒为止；枚举到缓存中没有的适配器时也会重新读取。
+ROUTING_CACHE_TTL = 300.0
+
+_IFACE_ROW_RE = re.compile(r'^\s*(\d+)\s+(\d+)\s+(\d+)\s+\S+\s+(.+?)\s*$')
+_ROUTE_ROW_RE = re.compile(r'^\s*\S+\s+\S+\s+(\d+)\s+([0-9A-Fa-f.:]+/\d+)\s+(\d+)\s+(.+?)\s*$')
+
+_network_generation = 0
+_routing_cache: dict = {}
+_routing_lock = threading.Lock()
+
+
+def notify_network_change():
+    """网络配置（地址、路由、接口）发生变化，丢弃缓存的接口索引与路由表。"""
+    global _network_generation
+    with _routing_lock:
+        _network_generation += 1
+
+
+def _parse_ipv4_interfaces(output: str) -> dict[str, dict]:
+    """show interfaces 输出 -> {接口名: {'index', 'metric'}}。"""
+    interfaces = {}
+    for line in output.splitlines():
+        m = _IFACE_ROW_RE.match(line)
+        if m:
+            interfaces[m.group(4)] = {'index': int(m.group(1)), 'metric': int(m.group(2))}
+    return interfaces
+
+
+def _parse_default_routes(output: str) -> dict[int, dict]:
+    """show route 输出 -> {接口索引: {'metric', 'gateway'}}，同一接口取跃点数最小的默认路由。"""
+    routes = {}
+    for line in output.splitlines():
+        m = _ROUTE_ROW_RE.match(line)
+        if not m or m.group(2) != '0.0.0.0/0':
+            continue
+        metric, index = int(m.group(1)), int(m.group(3))
+        if index not in routes or metric < routes[index]['metric']:
+            routes[index] = {'metric': metric, 'gateway': m.group(4)}
+    return routes
+
+
+def _cached_routing(need: Sequence[str] = ()):
+    with _routing_lock:
+        cached = _routing_cache.get('value')
+        if (
+            cached is not None
+            and _routing_cache['generation'] == _network_generation
+            and time.monotonic() - _routing_cache['at'] < ROUTING_CACHE_TTL
+            and all(name in cached['interfaces'] for name in need)
+        ):
+            return cached
+        return None
+
+
+def _build_routing(interfaces_output: str, routes_output: str, generation: int) -> dict:
+    routing = {
+        'interfaces': _parse_ipv4_interfaces(interfaces_output),
+        'default_routes': _parse_default_routes(routes_output),
+    }
+    with _routing_lock:
+        if generation == _network_generation:
+            _routing_cache.update(value=routing, generation=generation, at=time.monotonic())
+    return routing
+
+
+def get_routing(need: Sequence[str] = (), refresh: bool = False):
+    """返回 {'interfaces': {名称: {index, metric}}, 'default_routes': {索引: {metric, gateway}}}。
+
+    读取失败时返回 None。通过 command_runner 在其他主机上执行时不使用缓存。
+    """
+    remote = _command_runner.get() is not None
+    if not refresh and not remote:
+        cached = _cached_routing(need)
+        if cached is not None:
+            return cached
+    generation = -1 if remote else _network_generation
     try:
-        out = run(['route', 'print', '0.0.0.0'])
-        for a in adapters:
-            if a['name'] in out:
-                a['has_gateway'] = True
-        if not any(a['has_gateway'] for a in adapters):
-            for a in adapters:
-                if a['type'] in ('ethernet', 'wifi'):
-                    a['has_gateway'] = True
-                    break
+        interfaces = run(['netsh', 'interface', 'ipv4', 'show', 'interfaces'])
+        routes = run(['netsh', 'interface', 'ipv4', 'show', 'route'])
     except Exception:
-        pass
+        return None
+    return _build_routing(interfaces, routes, generation)
+
+
+async def async_get_routing(need: Sequence[str] = (), refresh: bool = False):
+    import asyncio
+    remote = _command_runner.get() is not None
+    if not refresh and not remote:
+        cached = _cached_routing(need)
+        if cached is not None:
+            return cached
+    generation = -1 if remote else _network_generation
+    try:
+        interfaces, routes = await asyncio.gather(
+            async_run(['netsh', 'interface', 'ipv4', 'show', 'interfaces']),
+            async_run(['netsh', 'interface', 'ipv4', 'show', 'route']),
+        )
+    except Exception:
+        return None
+    return _build_routing(interfaces, routes, generation)
+
+
+def _mark_routes(adapters: list[dict], routing: dict = None):
+    """按接口索引补充 index / has_gateway / route_metric / gateway；routing 为 None 时不做标记。
+
+    route_metric 为路由跃点数与接口跃点数之和，即 Windows 选路使用的有效跃点数。
+    """
+    if routing is None:
+        return
+    for a in adapters:
+        iface = routing['interfaces'].get(a['name'])
+        if iface is None:
+            continue
+        a['index'] = iface['index']
+        route = routing['default_routes'].get(iface['index'])
+        if route is not None:
+            a['has_gateway'] = True
+            a['route_metric'] = route['metric'] + iface['metric']
+            a['gateway'] = route['gateway']
+
+
+def primary_adapter(adapters: Sequence[dict]):
+    """有效跃点数最小的带默认路由的适配器；都没有默认路由时返回第一个适配器。"""
+    routed = [a for a in adapters if a.get('has_gateway')]
+    if routed:
+        return min(routed, key=lambda a: a.get('route_metric', float('inf')))
+    return adapters[0] if adapters else None
 
 # ── DNS 状态检测 ──────────────────────────────────────
-DHCP_RE = [
-    re.compile(r'DNS\s+Servers\s+configured\s+through\s+DHCP', re.IGNORECASE),
-    re.compile(r'通过\s*DHCP\s*配置的\s*DNS'),
-    re.compile(r'DHCP\s+配置的\s*DNS'),
-]
-STATIC_RE = [
-    re.compile(r'Statically\s+Configured\s+DNS\s+Servers', re.IGNORECASE),
-    re.compile(r'静态配置的\s*DNS\s*服务器'),
-    re.compile(r'手动配置的\s*DNS'),
-]
-IP_RE = re.compile(r'(\d{1,3}(?:\.\d{1,3}){3})')
+# 每行只用一个预编译的交替模式匹配一次。lastgroup 给出行的类别：
+# dhcp / static 为 DNS 来源标签行，header 为多接口输出中的段落表头，
+# ip 为静态 DNS 的续行。区域（中/英文）按首个可识别的行判定后只用对应子集。
+# ipv6 show dnsservers 的输出与 ipv4 show config 使用相同的表头和标签，地址可带 %区域 后缀。
+_IPV4_ADDR = r'\d{1,3}(?:\.\d{1,3}){3}'
+_IPV6_ADDR = r'[0-9A-Fa-f]{0,4}(?::[0-9A-Fa-f]{0,4}){2,7}(?:%\w+)?'
+IP_RE = re.compile(rf'({_IPV4_ADDR}|{_IPV6_ADDR})')
+_IP_LINE = rf'(?P<ip>(?:{_IPV4_ADDR}|{_IPV6_ADDR})[^a-zA-Z]*?)\s*$'
+_EN_LINE = (
+    r'(?P<dhcp_en>(?i:DNS\s+Servers\s+configured\s+through\s+DHCP))'
+    r'|(?P<static_en>(?i:Statically\s+Configured\s+DNS\s+Servers))'
+    r'|(?i:Configuration\s+for\s+interface)\s+"(?P<header_en>[^"]+)"'
+)
+_ZH_LINE = (
+    r'(?P<dhcp_zh>(?:通过\s*)?DHCP\s*配置的\s*DNS)'
+    r'|(?P<static_zh>静态配置的\s*DNS\s*服务器|手动配置的\s*DNS)'
+    r'|接口\s*"(?P<header_zh>[^"]+)"\s*的配置'
+)
+LINE_PATTERNS = {
+    'en': re.compile(rf'^\s*(?:{_EN_LINE}|{_IP_LINE})'),
+    'zh': re.compile(rf'^\s*(?:{_ZH_LINE}|{_IP_LINE})'),
+    None: re.compile(rf'^\s*(?:{_EN_LINE}|{_ZH_LINE}|{_IP_LINE})'),
+}
+_EN_MARK_RE = re.compile(r'Configuration\s+for\s+interface|DHCP\s+enabled|configured\s+through|Statically', re.IGNORECASE)
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+# ipv4 show config 的每个接口段落紧跟表头都有 "DHCP enabled" 行，ipv6 show dnsservers 没有
+_IPV4_SECTION_RE = re.compile(r'^\s*DHCP\s*(?:enabled|已启用)', re.IGNORECASE)
+
+
+def _detect_locale(line: str):
+    if _EN_MARK_RE.search(line):
+        return 'en'
+    if _CJK_RE.search(line):
+        return 'zh'
+    return None
+
+
+def _classify_lines(lines: Iterable[str]) -> Iterator[tuple]:
+    """单遍扫描 netsh 输出，逐行产出 (类别, 值, 原始行)；无关行的类别为 None。"""
+    pattern = LINE_PATTERNS[None]
+    decided = False
+    for line in lines:
+        if not decided:
+            locale_name = _detect_locale(line)
+            if locale_name is not None:
+                pattern = LINE_PATTERNS[locale_name]
+                decided = True
+        m = pattern.match(line)
+        if m is None:
+            yield None, None, line
+            continue
+        kind = m.lastgroup.split('_')[0]
+        if kind in ('dhcp', 'static'):
+            ip = IP_RE.search(line, m.end())
+            yield kind, ip.group(1) if ip else None, line
+        else:
+            yield kind, m.group(m.lastgroup), line
+
+
+class _DnsSection:
+    def __init__(self, adapter_name: str):
+        self.adapter = adapter_name
+        self.mode = 'unknown'
+        self.ips: list[str] = []
+        self.lines: list[str] = []
+
+    def add(self, kind, value, line):
+        self.lines.append(line)
+        if kind in ('dhcp', 'static'):
+            self.mode = kind
+            if value:
+                self.ips.append(value)
+        elif kind == 'ip' and self.mode == 'static':
+            self.ips.append(value)
+
+    def result(self, raw: str = None) -> dict:
+        return {
+            'adapter': self.adapter, 'mode': self.mode, 'ips': self.ips,
+            'raw': '\n'.join(self.lines) if raw is None else raw,
+        }
 
 
 def _normalize_ips(ips: Sequence[str]) -> list[str]:
     return [ip.strip() for ip in ips if ip and ip.strip()]
 
+
+def dns_mode(config: dict) -> str:
+    """适配器的总体 DNS 模式：IPv4 或 IPv6 任一为静态即为 static。"""
+    if (config.get('ipv6') or {}).get('mode') == 'static':
+        return 'static'
+    return config.get('mode', 'unknown')
+
+
+def dns_servers(config: dict) -> list[str]:
+    """IPv4 与 IPv6 的 DNS 服务器，IPv4 在前。"""
+    return list(config.get('ips', [])) + list((config.get('ipv6') or {}).get('ips', []))
+
+
+def _probe_script(adapter_name: str = None) -> list[str]:
+    """一次探测同时读取 IPv4 配置与 IPv6 DNS 服务器；不指定适配器时读取全部接口。"""
+    target = f' name="{adapter_name}"' if adapter_name else ''
+    return [f'interface ipv4 show config{target}', f'interface ipv6 show dnsservers{target}']
+
+
+def _run_probe(adapter_name: str = None) -> str:
+    """执行双栈探测并返回合并输出；IPv6 部分尽力而为。
+
+    未绑定 IPv6 的适配器（VPN/TAP、仅 IPv4 的网卡）查询 IPv6 会失败，此时只返回
+    IPv4 结果；IPv4 本身失败时照常抛出。
+    """
+    ipv4, ipv6 = _probe_script(adapter_name)
+    if _command_runner.get() is not None or _netsh_session is not None:
+        output = run(['netsh', *shlex.split(ipv4)])
+        try:
+            return output + '\n' + run(['netsh', *shlex.split(ipv6)])
+        except CommandTimeout:
+            raise
+        except CommandError:
+            return output
+    try:
+        return _run_netsh_script([ipv4, ipv6])
+    except CommandTimeout:
+        raise
+    except CommandError:
+        # netsh -f 只要有一行失败就整体报错，单独重读 IPv4
+        return run(['netsh', *shlex.split(ipv4)])
+
+
+async def _async_run_probe(adapter_name: str = None) -> str:
+    ipv4, ipv6 = _probe_script(adapter_name)
+    if _command_runner.get() is not None:
+        output = await async_run(['netsh', *shlex.split(ipv4)])
+        try:
+            return output + '\n' + await async_run(['netsh', *shlex.split(ipv6)])
+        except CommandTimeout:
+            raise
+        except CommandError:
+            return output
+    try:
+        return await _async_run_netsh_batch([ipv4, ipv6])
+    except CommandTimeout:
+        raise
+    except CommandError:
+        return await async_run(['netsh', *shlex.split(ipv4)])
+
+
 def get_dns_config(adapter_name: str) -> dict:
     try:
-        output = run(['netsh', 'interface', 'ip', 'show', 'config', adapter_name])
-        return _parse_netsh(output, adapter_name)
+        output = _run_probe(adapter_name)
+        return _parse_probe(output, adapter_name)
     except Exception as e:
-        return {'adapter': adapter_name, 'mode': 'unknown', 'ips': [], 'raw': str(e)}
+        return _unknown_config(adapter_name, e)
+
+
+async def async_get_dns_config(adapter_name: str) -> dict:
+    try:
+        output = await _async_run_probe(adapter_name)
+        return _parse_probe(output, adapter_name)
+    except Exception as e:
+        return _unknown_config(adapter_name, e)
+
+
+def _unknown_config(adapter_name: str, error: Exception) -> dict:
+    return {'adapter': adapter_name, 'mode': 'unknown', 'ips': [], 'raw': str(error), 'error': str(error)}
+
 
 def _parse_netsh(output: str, adapter_name: str) -> dict:
-    mode = 'unknown'
-    ips = []
-    for line in output.splitlines():
-        if any(p.search(line) for p in DHCP_RE):
-            mode = 'dhcp'
-            m = IP_RE.search(line)
-            if m: ips.append(m.group(1))
-            continue
-        if any(p.search(line) for p in STATIC_RE):
-            mode = 'static'
-            m = IP_RE.search(line)
-            if m: ips.append(m.group(1))
-            continue
-        if mode == 'static':
-            t = line.strip()
-            if IP_RE.match(t) and '.' in t and not re.search(r'[a-zA-Z]', t):
-                ips.append(t)
-    return {'adapter': adapter_name, 'mode': mode, 'ips': ips, 'raw': output}
+    section = _DnsSection(adapter_name)
+    for kind, value, line in _classify_lines(output.splitlines()):
+        section.add(kind, value, line)
+    return section.result(raw=output)
 
 
-def _verify_dns_state(adapter_name: str, expected_mode: str, expected_ips: Sequence[str] = ()) -> dict:
-    after = get_dns_config(adapter_name)
-    if after.get('mode') != expected_mode:
-        raise CommandError(
-            f'{adapter_name} DNS 模式校验失败，期望 {expected_mode}，实际 {after.get("mode", "unknown")}'
-        )
+def _parse_probe(output: str, adapter_name: str) -> dict:
+    """解析单个适配器的双栈探测输出；找不到接口段落时按旧格式整体解析。"""
+    configs = _parse_dual_stack(output)
+    config = configs.get(adapter_name) or next(
+        (cfg for name, cfg in configs.items() if name.lower() == adapter_name.lower()), None)
+    if config is None:
+        return _parse_netsh(output, adapter_name)
+    return {**config, 'adapter': adapter_name, 'raw': output}
+
+
+def iter_netsh_configs(lines: Iterable[str]) -> Iterator[dict]:
+    """流式解析不带适配器名的 show config 输出，每读完一个接口段落就产出其配置。"""
+    section = None
+    for kind, value, line in _classify_lines(lines):
+        if kind == 'header':
+            if section is not None:
+                yield section.result()
+            section = _DnsSection(value)
+        if section is not None:
+            section.add(kind, value, line)
+    if section is not None:
+        yield section.result()
+
+
+def _parse_netsh_bulk(output: str) -> dict[str, dict]:
+    return {cfg['adapter']: cfg for cfg in iter_netsh_configs(output.splitlines())}
+
+
+def _parse_dual_stack(output: str) -> dict[str, dict]:
+    """拆分 ipv4 show config 与 ipv6 show dnsservers 的合并输出，IPv6 结果放在各适配器的 ipv6 字段。
+
+    只有 IPv6 段落、没有 IPv4 段落的接口不出现在结果中。
+    """
+    ipv4: dict[str, dict] = {}
+    ipv6: dict[str, dict] = {}
+    for cfg in iter_netsh_configs(output.splitlines()):
+        lines = cfg['raw'].splitlines()
+        family = ipv4 if any(_IPV4_SECTION_RE.match(line) for line in lines[1:4]) else ipv6
+        family.setdefault(cfg['adapter'], cfg)
+    for name, cfg in ipv4.items():
+        v6 = ipv6.get(name)
+        if v6 is not None:
+            cfg['ipv6'] = {'mode': v6['mode'], 'ips': v6['ips']}
+    return ipv4
+
+
+def get_dns_configs_bulk() -> dict[str, dict]:
+    """一次探测（一个 netsh -f 脚本）读取所有接口的 IPv4 / IPv6 DNS 配置，按适配器名索引。"""
+    return _parse_dual_stack(_run_probe())
+
+
+# 并发探测的线程上限：netsh 进程本身较重，过多并发反而拖慢整机
+PROBE_MAX_WORKERS = 8
+
+
+def get_all_dns_configs(adapters: Sequence[Union[str, dict]], max_workers: int = PROBE_MAX_WORKERS,
+                        bulk: bool = True) -> list[dict]:
+    """读取多个适配器的 DNS 配置，结果按传入顺序返回。
+
+    默认先用一次批量 show config 读取全部接口；批量结果中缺失的适配器
+    再并发逐个读取。单个适配器读取失败只记录在该项的 ``error`` 字段中，
+    不影响其余适配器。
+    """
+    names = [a['name'] if isinstance(a, dict) else a for a in adapters]
+    if not names:
+        return []
+    found: dict[str, dict] = {}
+    if bulk:
+        try:
+            found = get_dns_configs_bulk()
+        except Exception:
+            found = {}
+    missing = [name for name in names if name not in found]
+    if missing:
+        workers = max(1, min(int(max_workers), len(missing)))
+        if workers == 1:
+            probed = [_probe_dns_config(name) for name in missing]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            # 工作线程不继承 contextvars，逐个带上调用方的上下文（命令执行器、数据目录）
+            contexts = [contextvars.copy_context() for _ in missing]
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dns-probe') as pool:
+                probed = list(pool.map(lambda ctx, name: ctx.run(_probe_dns_config, name), contexts, missing))
+        found = {**found, **dict(zip(missing, probed))}
+    return [found[name] for name in names]
+
+
+def _probe_dns_config(adapter_name: str) -> dict:
+    try:
+        return get_dns_config(adapter_name)
+    except Exception as e:
+        return {'adapter': adapter_name, 'mode': 'unknown', 'ips': [], 'raw': '', 'error': str(e)}
+
+
+# ── 修复后校验 ────────────────────────────────────────
+# 写入命令返回时 DHCP 下发的 DNS 可能还没生效：先等 VERIFY_INITIAL_DELAY 秒再读，
+# 不符合时按指数退避（最长 VERIFY_MAX_INTERVAL 秒）重读，符合即结束；超过
+# VERIFY_TIMEOUT 秒（或 deadline() 的总时限）仍不符合才算校验失败。
+VERIFY_INITIAL_DELAY = 0.05
+VERIFY_MAX_INTERVAL = 1.0
+VERIFY_TIMEOUT = 5.0
+
+
+def _verify_limit(started: float) -> float:
+    limit = started + VERIFY_TIMEOUT
+    at = _deadline.get()
+    return limit if at is None else min(limit, at)
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+def _verify_dns_state(adapter_name: str, expected_mode: str, expected_ips: Sequence[str] = (),
+                      ipv6: dict = None) -> dict:
+    return _drive(_verify_steps(adapter_name, expected_mode, expected_ips, ipv6))[0]
+
+
+def _verify_steps(adapter_name: str, expected_mode: str, expected_ips: Sequence[str] = (), ipv6: dict = None):
+    """轮询读取配置直到符合期望，返回 (配置, 生效耗时毫秒)；超时仍不符合时抛出最后一次的校验错误。"""
+    started = time.monotonic()
+    limit = _verify_limit(started)
+    delay = VERIFY_INITIAL_DELAY
+    error = None
+    while True:
+        yield _SLEEP, min(delay, limit - time.monotonic())
+        try:
+            after = yield _READ_CONFIG, adapter_name
+        except Exception:
+            if error is None:
+                raise
+            break
+        try:
+            _match_dns_state(adapter_name, after, expected_mode, expected_ips, ipv6)
+        except CommandError as e:
+            error = e
+        else:
+            return after, _elapsed_ms(started)
+        if time.monotonic() >= limit:
+            break
+        delay = min(delay * 2, VERIFY_MAX_INTERVAL)
+    _metrics.inc('verification_failures_total')
+    raise error
+
+
+def _poll_many(names: Sequence[str], expected: Sequence[tuple]) -> tuple[list, list]:
+    """批量修复 / 回滚的轮询校验，每轮用一次批量读取重读尚未生效的适配器。
+
+    expected 为各适配器期望的 (模式, DNS 服务器, IPv6 状态)。
+    返回 (各适配器最后一次读取的配置, 生效耗时毫秒，未生效为 None)。
+    """
+    started = time.monotonic()
+    limit = _verify_limit(started)
+    afters, settled = [None] * len(names), [None] * len(names)
+    pending = list(range(len(names)))
+    delay = VERIFY_INITIAL_DELAY
+    while pending:
+        time.sleep(max(0.0, min(delay, limit - time.monotonic())))
+        waiting = []
+        for index, after in zip(pending, get_all_dns_configs([names[i] for i in pending])):
+            afters[index] = after
+            try:
+                _match_dns_state(names[index], after, *expected[index])
+            except CommandError:
+                waiting.append(index)
+            else:
+                settled[index] = _elapsed_ms(started)
+        pending = waiting
+        if time.monotonic() >= limit:
+            break
+        delay = min(delay * 2, VERIFY_MAX_INTERVAL)
+    return afters, settled
+
+
+def _check_dns_state(adapter_name: str, after: dict, expected_mode: str, expected_ips: Sequence[str] = (),
+                     ipv6: dict = None) -> dict:
+    try:
+        return _match_dns_state(adapter_name, after, expected_mode, expected_ips, ipv6)
+    except CommandError:
+        _metrics.inc('verification_failures_total')
+        raise
+
+
+def _match_dns_state(adapter_name: str, after: dict, expected_mode: str, expected_ips: Sequence[str] = (),
+                     ipv6: dict = None) -> dict:
+    """校验 IPv4 DNS；ipv6 为 {'mode', 'ips'} 时同时校验 IPv6 DNS。"""
+    _match_family(f'{adapter_name} DNS', after, expected_mode, expected_ips)
+    if ipv6 is not None:
+        _match_family(f'{adapter_name} IPv6 DNS', after.get('ipv6') or {}, ipv6['mode'], ipv6.get('ips', ()))
+    return after
+
+
+def _match_family(label: str, actual: dict, expected_mode: str, expected_ips: Sequence[str] = ()):
+    if actual.get('mode') != expected_mode:
+        raise CommandError(f'{label} 模式校验失败，期望 {expected_mode}，实际 {actual.get("mode", "unknown")}')
     normalized_expected = _normalize_ips(expected_ips)
-    normalized_actual = _normalize_ips(after.get('ips', []))
+    normalized_actual = _normalize_ips(actual.get('ips', []))
     if normalized_expected and normalized_actual != normalized_expected:
         raise CommandError(
-            f'{adapter_name} DNS 服务器校验失败，期望 {", ".join(normalized_expected)}，'
+            f'{label} 服务器校验失败，期望 {", ".join(normalized_expected)}，'
             f'实际 {", ".join(normalized_actual)}'
         )
-    return after
+
+# ── 同步 / 异步共用的操作流程 ─────────────────────────
+# 修复、回滚写成生成器：yield (_RUN, 命令)、(_READ_CONFIG, 适配器名) 或 (_SLEEP, 秒)
+# 请求一次 I/O，结果（或异常）再送回生成器。_drive 用 run / get_dns_config / time.sleep
+# 执行，_adrive 用对应的异步版本执行，同一份流程对应两套 API。
+_RUN = 'run'
+_READ_CONFIG = 'config'
+_SLEEP = 'sleep'
+
+
+def _drive(steps):
+    try:
+        request = next(steps)
+        while True:
+            kind, arg = request
+            try:
+                if kind == _RUN:
+                    result = run(arg)
+                elif kind == _SLEEP:
+                    result = time.sleep(arg) if arg > 0 else None
+                else:
+                    result = get_dns_config(arg)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _adrive(steps):
+    import asyncio
+    try:
+        request = next(steps)
+        while True:
+            kind, arg = request
+            try:
+                if kind == _RUN:
+                    result = await async_run(arg)
+                elif kind == _SLEEP:
+                    result = await asyncio.sleep(arg) if arg > 0 else None
+                else:
+                    result = await async_get_dns_config(arg)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
 
 # ── DNS 修复 ──────────────────────────────────────────
 def repair_dns(adapter_name: str, flush: bool = True) -> dict:
-    before = get_dns_config(adapter_name)
+    return _drive(_repair_steps(adapter_name, flush))
+
+
+async def async_repair_dns(adapter_name: str, flush: bool = True) -> dict:
+    return await _adrive(_repair_steps(adapter_name, flush))
+
+
+def _repair_steps(adapter_name: str, flush: bool):
+    _metrics.inc('repair_attempts_total')
+    before = yield _READ_CONFIG, adapter_name
     _save_backup(before)
+    ipv6 = _ipv6_repair_target(before)
     try:
-        run(['netsh', 'interface', 'ip', 'set', 'dns', adapter_name, 'dhcp'])
+        yield _RUN, ['netsh', 'interface', 'ip', 'set', 'dns', adapter_name, 'dhcp']
+        if ipv6 is not None:
+            yield _RUN, ['netsh', 'interface', 'ipv6', 'set', 'dnsservers', adapter_name, 'dhcp']
         if flush:
-            run(['ipconfig', '/flushdns'])
-        after = _verify_dns_state(adapter_name, 'dhcp')
-        _add_log('repair', adapter_name, before, after, True)
+            yield _RUN, ['ipconfig', '/flushdns']
+        after, settle_ms = yield from _verify_steps(adapter_name, 'dhcp', ipv6=ipv6)
+        _add_log('repair', adapter_name, before, after, True, settle_ms=settle_ms)
+        _metrics.inc('repair_success_total')
         return {'success': True, 'adapter': adapter_name}
     except Exception as e:
         _add_log('repair', adapter_name, before, None, False, str(e))
+        _metrics.inc('repair_failure_total')
         return {'success': False, 'adapter': adapter_name, 'error': str(e)}
 
+
+def _ipv6_repair_target(before: dict):
+    """IPv6 DNS 为静态时返回修复后期望的 IPv6 状态，否则返回 None（不改动 IPv6）。"""
+    if (before.get('ipv6') or {}).get('mode') == 'static':
+        return {'mode': 'dhcp', 'ips': []}
+    return None
+
+
+def repair_many(names: Sequence[str], flush: bool = True) -> list[dict]:
+    """批量修复多个适配器，返回与 repair_dns 相同结构的结果列表。
+
+    一次读取并备份全部适配器，用一个 ``netsh -f`` 脚本执行所有 set dns
+    （IPv6 DNS 为静态的适配器同时执行 ipv6 set dnsservers），
+    最后统一清缓存，轮询批量读取校验（每轮只重读尚未生效的适配器）。
+    """
+    return _repair_batch(names, flush)[1]
+
+
+def _repair_batch(names: Sequence[str], flush: bool) -> tuple[list, list]:
+    """repair_many 的实现，另外返回修复前读取（并已备份）的配置。"""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return [], []
+    _metrics.inc('repair_attempts_total', len(names))
+    befores = get_all_dns_configs(names)
+    _save_backups(befores)
+    expected = [('dhcp', (), _ipv6_repair_target(before)) for before in befores]
+    script = []
+    for name, (_, _, ipv6) in zip(names, expected):
+        script.append(f'interface ip set dns name="{name}" source=dhcp')
+        if ipv6 is not None:
+            script.append(f'interface ipv6 set dnsservers name="{name}" source=dhcp')
+    results, states = _apply_batch(names, script, expected, flush)
+    entries = []
+    for name, before, result, (after, settle_ms) in zip(names, befores, results, states):
+        if result['success']:
+            entries.append(_log_entry('repair', name, before, after, True, settle_ms=settle_ms))
+            _metrics.inc('repair_success_total')
+        else:
+            entries.append(_log_entry('repair', name, before, None, False, result['error']))
+            _metrics.inc('repair_failure_total')
+    _add_logs(entries)
+    return befores, results
+
+
+def _apply_batch(names: Sequence[str], script: Sequence[str], expected: Sequence[tuple],
+                 flush: bool = False) -> tuple[list, list]:
+    """执行一个 netsh 脚本并轮询校验，返回 (结果列表, [(校验后的配置, 生效耗时毫秒)])。
+
+    脚本中任一行失败时 netsh 以非 0 退出，但其余行可能已经生效，因此仍逐个校验；
+    脚本的错误只附加到校验未通过的适配器上。
+    """
+    script_error = None
+    try:
+        try:
+            _run_netsh_writes(script)
+        except CommandTimeout:
+            raise
+        except CommandError as e:
+            script_error = e
+        if flush:
+            run(['ipconfig', '/flushdns'])
+        afters, settled = _poll_many(names, expected)
+    except Exception as e:
+        afters = None
+        batch_error = str(e)
+
+    results, states = [], []
+    for index, name in enumerate(names):
+        try:
+            if afters is None:
+                raise CommandError(batch_error)
+            after = _check_dns_state(name, afters[index], *expected[index])
+            results.append({'success': True, 'adapter': name})
+            states.append((after, settled[index]))
+        except Exception as e:
+            error = str(e) if script_error is None or afters is None else f'{e}（netsh 脚本: {script_error}）'
+            results.append({'success': False, 'adapter': name, 'error': error})
+            states.append((None, None))
+    return results, states
+
+
+def _restore_script(backup: dict) -> tuple[list[str], tuple]:
+    """把一个备份转成 netsh 脚本行，并给出恢复后期望的 (模式, DNS 服务器, IPv6 状态)。"""
+    name = backup['adapter']
+    lines = []
+    families = [('ip', 'dns', backup, True)]
+    if backup.get('ipv6'):
+        families.append(('ipv6', 'dnsservers', backup['ipv6'], False))
+    expected = []
+    for family, noun, config, required in families:
+        ips = _normalize_ips(config.get('ips', []))
+        if config.get('mode') == 'dhcp':
+            lines.append(f'interface {family} set {noun} name="{name}" source=dhcp')
+            expected.append({'mode': 'dhcp', 'ips': []})
+        elif config.get('mode') == 'static' and ips:
+            lines.append(f'interface {family} set {noun} name="{name}" source=static address={ips[0]}')
+            lines += [f'interface {family} add {noun} name="{name}" address={ip} index={index}'
+                      for index, ip in enumerate(ips[1:], start=2)]
+            expected.append({'mode': 'static', 'ips': ips})
+        elif required:
+            raise ValueError(f'{name} 备份中没有可恢复的 DNS 配置')
+        else:
+            expected.append(None)
+    ipv6 = expected[1] if len(expected) > 1 else None
+    return lines, (expected[0]['mode'], expected[0]['ips'], ipv6)
+
+
+def _rollback_many(backups: Sequence[dict]) -> list[dict]:
+    """按备份批量回滚：一个 netsh -f 脚本恢复全部适配器，再一起轮询校验。"""
+    names = [b['adapter'] for b in backups]
+    befores = get_all_dns_configs(names)
+    outcomes = [({'success': False, 'adapter': name}, (None, None)) for name in names]
+    script, expected, pending = [], [], []
+    for index, backup in enumerate(backups):
+        try:
+            lines, expect = _restore_script(backup)
+        except ValueError as e:
+            outcomes[index][0]['error'] = str(e)
+            continue
+        script += lines
+        expected.append(expect)
+        pending.append(index)
+    if pending:
+        results, states = _apply_batch([names[i] for i in pending], script, expected)
+        for index, result, state in zip(pending, results, states):
+            outcomes[index] = (result, state)
+
+    entries = []
+    for name, before, (result, (after, settle_ms)) in zip(names, befores, outcomes):
+        if result['success']:
+            entries.append(_log_entry('rollback', name, before, after, True, settle_ms=settle_ms))
+        else:
+            entries.append(_log_entry('rollback', name, before, None, False, result['error']))
+    _add_logs(entries)
+    return [result for result, _ in outcomes]
+
+
+REPAIR_POLICIES = ('best_effort', 'all_or_nothing')
+
+
+def repair_transaction(names: Sequence[str], flush: bool = True, policy: str = 'best_effort') -> dict:
+    """把一组适配器的修复作为一个整体执行，返回一个结构化结果。
+
+    全部适配器的 set dns 在同一个 ``netsh -f`` 脚本中完成并一起校验（一轮，
+    而不是逐个修复）。policy 为 all_or_nothing 时，只要有适配器失败，就用本次
+    修复前刚做的备份把全部目标适配器恢复原状，不留下部分 DHCP、部分静态的状态。
+
+    返回 {'success', 'status', 'policy', 'results', 'rollback'}；status 为
+    committed（全部成功）、partial / failed（best_effort 下部分或全部失败）、
+    rolled_back（已全部恢复原状）或 rollback_failed（回滚未完成，需要人工处理）。
+    """
+    if policy not in REPAIR_POLICIES:
+        raise ValueError(f'未知修复策略: {policy}')
+    befores, results = _repair_batch(names, flush)
+    failed = [r for r in results if not r['success']]
+    outcome = {'success': not failed, 'status': 'committed', 'policy': policy,
+               'results': results, 'rollback': []}
+    if not failed:
+        return outcome
+    if policy == 'best_effort':
+        outcome['status'] = 'failed' if len(failed) == len(results) else 'partial'
+        return outcome
+    # 校验失败的适配器也可能已部分改动，一并按备份恢复
+    rollback = _rollback_many(befores)
+    restored = sum(1 for r in rollback if r['success'])
+    _metrics.inc('repair_rollbacks_total', restored)
+    outcome['rollback'] = rollback
+    outcome['status'] = 'rolled_back' if restored == len(rollback) else 'rollback_failed'
+    return outcome
+
+
+def _run_netsh_script(lines: Sequence[str]) -> str:
+    with _netsh_script(lines) as path:
+        return run(['netsh', '-f', path])
+
+
+@contextlib.contextmanager
+def _netsh_script(lines: Sequence[str]):
+    import tempfile
+    encoding = locale.getpreferredencoding(False) or 'utf-8'
+    fd, path = tempfile.mkstemp(prefix='repairdns-', suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding, errors='replace') as f:
+            f.write('\n'.join(lines) + '\n')
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _run_netsh_writes(lines: Sequence[str]) -> str:
+    """执行修改配置的 netsh 命令。
+
+    与 _run_netsh_batch 一样，本机执行时写成一个 ``netsh -f`` 脚本，经 command_runner
+    或常驻会话执行时逐条发送；逐条发送时某一行失败仍继续执行其余行，最后抛出
+    第一个错误，与 ``netsh -f`` 的行为一致。
+    """
+    if _command_runner.get() is None and _netsh_session is None:
+        return _run_netsh_script(lines)
+    outputs, error = [], None
+    for line in lines:
+        try:
+            outputs.append(run(['netsh', *shlex.split(line)]))
+        except CommandTimeout:
+            raise
+        except CommandError as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return '\n'.join(outputs)
+
+def _run_netsh_batch(lines: Sequence[str]) -> str:
+    """执行多条只读 netsh 命令并合并输出。
+
+    本机执行时写成一个 ``netsh -f`` 脚本，只启动一个进程；经 command_runner
+    （远程主机看不到本机的脚本文件）或常驻会话执行时逐条发送。
+    """
+    if _command_runner.get() is not None or _netsh_session is not None:
+        return '\n'.join(run(['netsh', *shlex.split(line)]) for line in lines)
+    return _run_netsh_script(lines)
+
+
+async def _async_run_netsh_batch(lines: Sequence[str]) -> str:
+    if _command_runner.get() is not None:
+        return '\n'.join([await async_run(['netsh', *shlex.split(line)]) for line in lines])
+    with _netsh_script(lines) as path:
+        return await async_run(['netsh', '-f', path])
+
+# ── 网络变化通知 ──────────────────────────────────────
+class ChangeSource:
+    """网络配置变化的事件来源。
+
+    wait() 阻塞到发生变化或超时，返回期间是否发生过变化。
+    """
+
+    event_driven = True
+
+    def wait(self, timeout: float) -> bool:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PollingChangeSource(ChangeSource):
+    """没有事件源时的退路：每隔 interval 秒报告一次"可能有变化"。"""
+
+    event_driven = False
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = time.monotonic() + interval
+        self._closed = threading.Event()
+
+    def wait(self, timeout: float) -> bool:
+        remaining = self._next - time.monotonic()
+        if remaining > timeout:
+            self._closed.wait(timeout)
+            return False
+        if remaining > 0 and self._closed.wait(remaining):
+            return False
+        self._next = time.monotonic() + self.interval
+        return True
+
+    def close(self):
+        self._closed.set()
+
+
+class PipeChangeSource(ChangeSource):
+    """从管道或文件逐行读取事件，每读到一行视为一次变化，用作本地替身。"""
+
+    def __init__(self, stream):
+        self._stream = open(stream, 'rb') if isinstance(stream, (str, bytes, os.PathLike)) else stream
+        self._events = queue.Queue()
+        threading.Thread(target=self._read, name='change-pipe', daemon=True).start()
+
+    def _read(self):
+        try:
+            for _ in iter(self._stream.readline, b''):
+                self._events.put(True)
+        except (OSError, ValueError):
+            pass
+
+    def wait(self, timeout: float) -> bool:
+        try:
+            self._events.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        # 把已经排队的事件一起消费掉
+        while not self._events.empty():
+            self._events.get_nowait()
+        return True
+
+    def close(self):
+        try:
+            self._stream.close()
+        except Exception:
+            pass
+
+
+class WindowsChangeSource(ChangeSource):
+    """用 iphlpapi 的 NotifyAddrChange / NotifyRouteChange 重叠调用等待地址或路由变化。"""
+
+    ERROR_IO_PENDING = 997
+    WAIT_TIMEOUT = 0x102
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class OVERLAPPED(ctypes.Structure):
+            _fields_ = [
+                ('Internal', ctypes.c_void_p), ('InternalHigh', ctypes.c_void_p),
+                ('Offset', wintypes.DWORD), ('OffsetHigh', wintypes.DWORD),
+                ('hEvent', wintypes.HANDLE),
+            ]
+
+        self._byref = ctypes.byref
+        self._iphlpapi = ctypes.WinDLL('iphlpapi')
+        self._kernel32 = ctypes.WinDLL('kernel32')
+        self._kernel32.CreateEventW.restype = wintypes.HANDLE
+        self._kernel32.WaitForMultipleObjects.restype = wintypes.DWORD
+        self._slots = []
+        for notify in (self._iphlpapi.NotifyAddrChange, self._iphlpapi.NotifyRouteChange):
+            overlapped = OVERLAPPED()
+            overlapped.hEvent = self._kernel32.CreateEventW(None, False, False, None)
+            self._slots.append((notify, overlapped, wintypes.HANDLE()))
+        self._events = (wintypes.HANDLE * len(self._slots))(*[o.hEvent for _, o, _ in self._slots])
+        for slot in self._slots:
+            self._arm(slot)
+
+    def _arm(self, slot):
+        notify, overlapped, handle = slot
+        rc = notify(self._byref(handle), self._byref(overlapped))
+        if rc not in (0, self.ERROR_IO_PENDING):
+            raise OSError(rc, '网络变化通知注册失败')
+
+    def wait(self, timeout: float) -> bool:
+        rc = self._kernel32.WaitForMultipleObjects(
+            len(self._slots), self._events, False, int(timeout * 1000)
+        )
+        if rc == self.WAIT_TIMEOUT or rc >= len(self._slots):
+            return False
+        self._arm(self._slots[rc])
+        return True
+
+    def close(self):
+        for _, overlapped, _ in self._slots:
+            self._iphlpapi.CancelIPChangeNotify(self._byref(overlapped))
+            self._kernel32.CloseHandle(overlapped.hEvent)
+        self._slots = []
+
+
+def create_change_source(poll_interval: float = None):
+    """优先使用系统通知；不可用时按 poll_interval 轮询，未给出则返回 None。"""
+    if sys.platform == 'win32':
+        try:
+            return WindowsChangeSource()
+        except Exception:
+            pass
+    if poll_interval:
+        return PollingChangeSource(poll_interval)
+    return None
+
+
+class ChangeWatcher:
+    """在后台线程等待 ChangeSource 的事件，合并短时间内的连续变化后回调。
+
+    一次网络切换通常会连续触发多次地址/路由变化，debounce 秒内的后续事件
+    会合并为一次回调，但从首个事件起最多只等 max_delay 秒。
+    """
+
+    def __init__(self, source: ChangeSource, callback, debounce: float = 0.25, max_delay: float = 0.75):
+        self.source = source
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.events = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='change-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                changed = self.source.wait(0.5)
+            except Exception:
+                return
+            if not changed or self._stop.is_set():
+                continue
+            deadline = time.monotonic() + self.max_delay
+            while not self._stop.is_set():
+                remaining = min(self.debounce, deadline - time.monotonic())
+                if remaining <= 0 or not self.source.wait(remaining):
+                    break
+            if self._stop.is_set():
+                return
+            self.events += 1
+            notify_network_change()
+            try:
+                self.callback()
+            except Exception:
+                pass
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self.source.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+# ── 自适应监控调度 ────────────────────────────────────
+# 后台检测不再使用固定间隔：检测到变化、刚执行过修复或出现新适配器时收紧到
+# 最小间隔，状态保持不变时每次按 factor 倍退避，直到最大间隔。每次间隔再随机
+# 缩短最多 jitter 比例，避免大量主机同步检测（只缩短，到达上限后也不会扎堆）。
+# 时钟与随机数可注入，便于测试。
+class AdaptiveScheduler:
+    def __init__(self, min_interval: float, max_interval: float, factor: float = 2.0,
+                 jitter: float = 0.1, clock=time.monotonic, rng=None):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError(f'监控间隔无效: {min_interval} ~ {max_interval}')
+        if rng is None:
+            import random
+            rng = random.Random()
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.factor = factor
+        self.jitter = jitter
+        self.interval = self.min_interval
+        self._clock = clock
+        self._rng = rng
+        self._state = None
+        self._observed = False
+        self.next_at = clock()
+
+    def observe(self, state=None, event: bool = False) -> float:
+        """一次检测完成后调用，返回距下次检测的秒数。
+
+        state 为可比较的状态摘要（见 dns_state_signature），与上次不同或 event 为真
+        （由网络变化通知触发）时收紧到最小间隔，否则退避。
+        """
+        changed = event or (self._observed and state != self._state)
+        self._state, self._observed = state, True
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.max_interval)
+        return self._arm()
+
+    def tighten(self) -> float:
+        """执行了修复等操作后调用：回到最小间隔，返回距下次检测的秒数。"""
+        self.interval = self.min_interval
+        return self._arm()
+
+    def remaining(self) -> float:
+        return max(0.0, self.next_at - self._clock())
+
+    def _arm(self) -> float:
+        delay = self.interval
+        if self.jitter:
+            delay *= 1 - self._rng.uniform(0, self.jitter)
+        self.next_at = self._clock() + delay
+        return delay
+
+
+def dns_state_signature(configs: Sequence[dict]) -> tuple:
+    """各适配器 (名称, 模式, DNS 服务器) 的有序摘要；适配器增减或 DNS 变化都会改变它。"""
+    return tuple(sorted(
+        (cfg.get('adapter', ''), dns_mode(cfg), tuple(dns_servers(cfg))) for cfg in configs
+    ))
+
+
+def create_scheduler(settings: dict = None, **kwargs) -> AdaptiveScheduler:
+    settings = settings or get_settings()
+    return AdaptiveScheduler(settings.get('monitor_min_interval', DEFAULT_SETTINGS['monitor_min_interval']),
+                             settings.get('monitor_max_interval', DEFAULT_SETTINGS['monitor_max_interval']),
+                             **kwargs)
+
 # ── 备份 ─────────────────────────────────────────────
+# 备份以 JSON 行追加写入 journal 文件，另有一个紧凑的索引记录每个
+# 适配器最近 BACKUP_KEEP 条备份在 journal 中的偏移。淘汰旧备份只改索引，
+# 失效记录累积到一定数量后在后台线程中压缩 journal。
+# netsh 原始输出按内容的 SHA-256 存入 backups.blobs\ 目录（相同输出只存一份），
+# journal 中只保留摘要 raw_sha256；索引记录每个摘要被多少条有效备份引用，
+# 引用数归零的 blob 随即删除。
+BACKUP_KEEP = 10
+BACKUP_COMPACT_MIN_DEAD = 64
+BLOB_COMPRESS = True
+
+_compaction_guard = threading.Lock()
+_compaction_thread = None
+
+
+def _backup_base() -> str:
+    return os.path.splitext(_data_file('BACKUP_FILE'))[0]
+
+
+def _journal_path(base: str, index: dict) -> str:
+    return f"{base}.{index['generation']:06d}.jsonl"
+
+
 def _save_backup(config: dict):
-    backups = _load_json(BACKUP_FILE, [])
-    # 每个适配器保留最近 10 条
-    adapter = config.get('adapter')
-    others = [b for b in backups if b.get('adapter') != adapter]
-    same_adapter = [b for b in backups if b.get('adapter') == adapter]
-    same_adapter = same_adapter[-9:]
-    same_adapter.append({'ts': _now(), **config})
-    _save_json(BACKUP_FILE, others + same_adapter)
+    _save_backups([config])
+
+def _save_backups(configs: Sequence[dict]):
+    if not configs:
+        return
+    base = _backup_base()
+    ts = _now()
+    with _locked(base + '.lock'):
+        index = _load_backup_index(base)
+        journal = _journal_path(base, index)
+        released = []
+        with open(journal, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            for config in configs:
+                # 先写 blob 再写 journal 与索引，中途崩溃最多留下未被引用的 blob
+                entry = _externalize_raw(base, {'ts': ts, **config})
+                line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+                f.write(line)
+                released += _ring_append(index, entry.get('adapter'), offset, len(line), entry.get('raw_sha256'))
+                offset += len(line)
+        _write_json_atomic(base + '.idx.json', index)
+        _remove_blobs(base, index, released)
+        needs_compaction = index['dead'] >= max(BACKUP_COMPACT_MIN_DEAD, _live_count(index))
+    if needs_compaction:
+        _schedule_backup_compaction(base)
+
+def _ring_append(index: dict, adapter, offset: int, length: int, digest: str = None) -> list:
+    """把一条备份加入适配器的环形索引，返回因淘汰旧备份而不再被引用的 blob 摘要。"""
+    ring = index['adapters'].setdefault(adapter, [])
+    ring.append([offset, length, digest] if digest else [offset, length])
+    if digest:
+        index['blobs'][digest] = index['blobs'].get(digest, 0) + 1
+    released = []
+    while len(ring) > BACKUP_KEEP:
+        dropped = ring.pop(0)
+        index['dead'] += 1
+        if len(dropped) > 2:
+            remaining = index['blobs'].get(dropped[2], 1) - 1
+            if remaining > 0:
+                index['blobs'][dropped[2]] = remaining
+            else:
+                index['blobs'].pop(dropped[2], None)
+                released.append(dropped[2])
+    return released
+
+def get_backup_raw(backup: dict) -> Union[str, None]:
+    """返回备份对应的 netsh 原始输出；blob 已被清理时返回 None。"""
+    if 'raw' in backup:
+        return backup['raw']
+    digest = backup.get('raw_sha256')
+    return _read_blob(_backup_base(), digest) if digest else None
+
+# ── 备份原始输出的 blob 存储 ──────────────────────────
+def _blob_dir(base: str) -> str:
+    return base + '.blobs'
+
+def _blob_path(base: str, digest: str, compressed: bool) -> str:
+    return os.path.join(_blob_dir(base), digest + ('.z' if compressed else '.txt'))
+
+def _externalize_raw(base: str, entry: dict) -> dict:
+    """把条目中的 raw 移入 blob 存储，换成摘要；raw 为空时原样去掉。"""
+    if 'raw' not in entry:
+        return entry
+    entry = dict(entry)
+    raw = entry.pop('raw')
+    if raw:
+        entry['raw_sha256'] = _put_blob(base, raw)
+    return entry
+
+def _put_blob(base: str, text: str) -> str:
+    data = text.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    if any(os.path.exists(_blob_path(base, digest, c)) for c in (True, False)):
+        return digest
+    path = _blob_path(base, digest, BLOB_COMPRESS)
+    os.makedirs(_blob_dir(base), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(zlib.compress(data, 6) if BLOB_COMPRESS else data)
+    os.replace(tmp, path)
+    return digest
+
+def _read_blob(base: str, digest: str) -> Union[str, None]:
+    for compressed in (True, False):
+        try:
+            with open(_blob_path(base, digest, compressed), 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        try:
+            return (zlib.decompress(data) if compressed else data).decode('utf-8')
+        except (zlib.error, UnicodeDecodeError):
+            return None
+    return None
+
+def _remove_blobs(base: str, index: dict, digests: Iterable[str]):
+    """删除已释放的 blob；同一批写入中被淘汰后又被新备份引用的摘要仍在索引中，保留不删。"""
+    for digest in set(digests) - set(index['blobs']):
+        for compressed in (True, False):
+            try:
+                os.remove(_blob_path(base, digest, compressed))
+            except OSError:
+                pass
+
+def _sweep_blobs(base: str, index: dict):
+    """删除索引中没有引用的 blob（写入 blob 后、更新索引前中断留下的文件）。"""
+    try:
+        names = os.listdir(_blob_dir(base))
+    except OSError:
+        return
+    live = index['blobs']
+    for name in names:
+        digest, ext = os.path.splitext(name)
+        if ext in ('.z', '.txt') and digest not in live:
+            try:
+                os.remove(os.path.join(_blob_dir(base), name))
+            except OSError:
+                pass
 
 def get_backups() -> list:
-    return _load_json(BACKUP_FILE, [])
+    base = _backup_base()
+    with _locked(base + '.lock'):
+        index = _load_backup_index(base)
+        return _read_backup_entries(base, index)
+
+def _live_count(index: dict) -> int:
+    return sum(len(ring) for ring in index['adapters'].values())
+
+def _read_backup_entries(base: str, index: dict) -> list:
+    spans = sorted(span for ring in index['adapters'].values() for span in ring)
+    if not spans:
+        return []
+    status, by_offset = _store.load(_journal_path(base, index), _parse_journal)
+    if status != 'ok':
+        return []
+    return [dict(by_offset[span[0]]) for span in spans if span[0] in by_offset]
+
+def _parse_journal(data: bytes) -> dict:
+    entries = {}
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        try:
+            entries[offset] = json.loads(line)
+        except ValueError:
+            pass
+        offset += len(line)
+    return entries
+
+def _load_backup_index(base: str) -> dict:
+    """读取备份索引；索引缺失时从 journal 重建，或从旧版 backups.json 迁移。"""
+    index = _load_json(base + '.idx.json', None)
+    if isinstance(index, dict) and 'adapters' in index:
+        index.setdefault('blobs', {})
+        return index
+    index = {'generation': 1, 'adapters': {}, 'dead': 0, 'blobs': {}}
+    journal = _journal_path(base, index)
+    legacy = base + '.json'
+    if os.path.exists(journal):
+        _rebuild_backup_index(base, index, journal)
+    elif os.path.exists(legacy):
+        _migrate_legacy_backups(base, index, journal, legacy)
+    return index
+
+def _rebuild_backup_index(base: str, index: dict, journal: str):
+    offset = 0
+    with open(journal, 'rb') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = {}
+            if entry.get('adapter') is not None:
+                _ring_append(index, entry['adapter'], offset, len(line), entry.get('raw_sha256'))
+            offset += len(line)
+    _write_json_atomic(base + '.idx.json', index)
+    _sweep_blobs(base, index)
+
+def _migrate_legacy_backups(base: str, index: dict, journal: str, legacy_path: str):
+    legacy = _load_json(legacy_path, [])
+    released = []
+    with open(journal, 'wb') as f:
+        offset = 0
+        for entry in legacy if isinstance(legacy, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            entry = _externalize_raw(base, entry)
+            line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+            f.write(line)
+            released += _ring_append(index, entry.get('adapter'), offset, len(line), entry.get('raw_sha256'))
+            offset += len(line)
+    _write_json_atomic(base + '.idx.json', index)
+    _remove_blobs(base, index, released)
+    os.replace(legacy_path, legacy_path + '.migrated')
+
+def _schedule_backup_compaction(base: str):
+    global _compaction_thread
+    with _compaction_guard:
+        if _compaction_thread is not None and _compaction_thread.is_alive():
+            return
+        _compaction_thread = threading.Thread(
+            target=_compact_backups, args=(base,), name='backup-compaction', daemon=True
+        )
+        _compaction_thread.start()
+
+def compact_backups():
+    """把仍被索引引用的备份写入新一代 journal，再切换索引并删除旧文件。
+
+    旧版本写入的、内联了 raw 的条目在此时移入 blob 存储；没有引用的 blob 一并清理。
+    """
+    _compact_backups(_backup_base())
+
+def _compact_backups(base: str):
+    with _locked(base + '.lock'):
+        index = _load_backup_index(base)
+        if not index['dead'] and not _has_inline_raw(base, index):
+            return
+        old_journal = _journal_path(base, index)
+        compacted = {'generation': index['generation'] + 1, 'adapters': {}, 'dead': 0, 'blobs': {}}
+        spans = sorted(
+            (span[0], span[1], adapter)
+            for adapter, ring in index['adapters'].items()
+            for span in ring
+        )
+        with open(old_journal, 'rb') as src, open(_journal_path(base, compacted), 'wb') as dst:
+            for offset, length, adapter in spans:
+                src.seek(offset)
+                line = src.read(length)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = {}
+                if 'raw' in entry:
+                    entry = _externalize_raw(base, entry)
+                    line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+                _ring_append(compacted, adapter, dst.tell(), len(line), entry.get('raw_sha256'))
+                dst.write(line)
+        _write_json_atomic(base + '.idx.json', compacted)
+        try:
+            os.remove(old_journal)
+        except OSError:
+            pass
+        _sweep_blobs(base, compacted)
+
+def _has_inline_raw(base: str, index: dict) -> bool:
+    return any('raw' in entry for entry in _read_backup_entries(base, index))
 
 def rollback(backup: dict) -> dict:
+    return _drive(_rollback_steps(backup))
+
+
+async def async_rollback(backup: dict) -> dict:
+    return await _adrive(_rollback_steps(backup))
+
+
+def _rollback_steps(backup: dict):
     adapter = backup['adapter']
-    before = get_dns_config(adapter)
+    before = yield _READ_CONFIG, adapter
     try:
         if backup['mode'] == 'dhcp':
-            run(['netsh', 'interface', 'ip', 'set', 'dns', adapter, 'dhcp'])
-            after = _verify_dns_state(adapter, 'dhcp')
+            yield _RUN, ['netsh', 'interface', 'ip', 'set', 'dns', adapter, 'dhcp']
+            expected_mode, ips = 'dhcp', []
         elif backup['mode'] == 'static' and backup.get('ips'):
             ips = _normalize_ips(backup['ips'])
-            run(['netsh', 'interface', 'ip', 'set', 'dns', adapter, 'static', ips[0]])
+            yield _RUN, ['netsh', 'interface', 'ip', 'set', 'dns', adapter, 'static', ips[0]]
             for index, ip in enumerate(ips[1:], start=2):
-                run(['netsh', 'interface', 'ip', 'add', 'dns', adapter, ip, f'index={index}'])
-            after = _verify_dns_state(adapter, 'static', ips)
+                yield _RUN, ['netsh', 'interface', 'ip', 'add', 'dns', adapter, ip, f'index={index}']
+            expected_mode = 'static'
         else:
             raise ValueError('备份中没有可恢复的 DNS 配置')
-        _add_log('rollback', adapter, before, after, True)
+        ipv6 = yield from _restore_ipv6_steps(adapter, backup.get('ipv6'))
+        after, settle_ms = yield from _verify_steps(adapter, expected_mode, ips, ipv6)
+        _add_log('rollback', adapter, before, after, True, settle_ms=settle_ms)
         return {'success': True, 'adapter': adapter}
     except Exception as e:
         _add_log('rollback', adapter, before, None, False, str(e))
         return {'success': False, 'adapter': adapter, 'error': str(e)}
 
+
+def _restore_ipv6_steps(adapter: str, backup: dict = None):
+    """按备份恢复 IPv6 DNS，返回期望的 IPv6 状态；旧备份没有 IPv6 信息时不改动。"""
+    if backup and backup.get('mode') == 'dhcp':
+        yield _RUN, ['netsh', 'interface', 'ipv6', 'set', 'dnsservers', adapter, 'dhcp']
+        return {'mode': 'dhcp', 'ips': []}
+    if backup and backup.get('mode') == 'static' and backup.get('ips'):
+        ips = _normalize_ips(backup['ips'])
+        yield _RUN, ['netsh', 'interface', 'ipv6', 'set', 'dnsservers', adapter, 'static', ips[0]]
+        for index, ip in enumerate(ips[1:], start=2):
+            yield _RUN, ['netsh', 'interface', 'ipv6', 'add', 'dnsservers', adapter, ip, f'index={index}']
+        return {'mode': 'static', 'ips': ips}
+    return None
+
 # ── 日志 ─────────────────────────────────────────────
-def _add_log(action, adapter, before, after, success, error=None):
-    logs = _load_json(LOG_FILE, [])
-    logs.append({
+# 操作日志按 JSON 行追加写入分段文件，段文件名是该段第一条记录的序号，
+# 记录的序号即段起始序号加行号，可直接用作分页游标。当前段超过
+# LOG_SEGMENT_BYTES 时换新段；保留条数超过 LOG_RETENTION 时整段删除最旧的段。
+LOG_SEGMENT_BYTES = 256 * 1024
+LOG_RETENTION = 100_000
+
+_log_segment_stats: dict[str, tuple[int, int]] = {}
+
+
+def _log_entry(action, adapter, before, after, success, error=None, settle_ms=None) -> dict:
+    entry = {
         'ts': _now(), 'action': action, 'adapter': adapter,
-        'before_mode': before.get('mode'), 'before_ips': before.get('ips', []),
-        'after_mode': after.get('mode') if after else None,
+        'before_mode': dns_mode(before), 'before_ips': dns_servers(before),
+        'after_mode': dns_mode(after) if after else None,
         'success': success, 'error': error,
-    })
-    _save_json(LOG_FILE, logs[-200:])
+    }
+    if settle_ms is not None:
+        # 写入命令完成到读到期望状态的耗时，用于按适配器类型调整校验等待
+        entry['settle_ms'] = settle_ms
+    return entry
 
-def get_logs() -> list:
-    return list(reversed(_load_json(LOG_FILE, [])))
+def _add_log(action, adapter, before, after, success, error=None, settle_ms=None):
+    _add_logs([_log_entry(action, adapter, before, after, success, error, settle_ms)])
+
+def _add_logs(entries: Sequence[dict]):
+    if not entries:
+        return
+    payload = b''.join(
+        json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n' for entry in entries
+    )
+    base = os.path.splitext(_data_file('LOG_FILE'))[0]
+    log_dir = base + '.d'
+    with _locked(base + '.lock'):
+        _prepare_log_dir(log_dir)
+        starts = _log_segments(log_dir)
+        start = starts[-1]
+        path = _segment_path(log_dir, start)
+        size, lines = _segment_stat(path)
+        if size and size + len(payload) > LOG_SEGMENT_BYTES:
+            start += lines
+            path = _segment_path(log_dir, start)
+            size, lines = 0, 0
+            starts.append(start)
+            _trim_log_segments(log_dir, starts, start)
+        with open(path, 'ab') as f:
+            f.write(payload)
+        _log_segment_stats[path] = (size + len(payload), lines + len(entries))
+
+def get_logs(limit: int = None, before: int = None, adapter: str = None,
+             action: str = None, success: bool = None) -> list:
+    """从最新的段向前读取日志，最新的在前。
+
+    每条记录带有 ``seq`` 序号；把上一页最后一条的 ``seq`` 作为 ``before``
+    传入即可读取下一页，只会打开所需的段。adapter / action / success
+    不为 None 时只返回匹配的记录，limit 按匹配的条数计算。
+    """
+    base = os.path.splitext(_data_file('LOG_FILE'))[0]
+    log_dir = base + '.d'
+    if not os.path.isdir(log_dir):
+        with _locked(base + '.lock'):
+            _prepare_log_dir(log_dir)
+    result = []
+    if limit is not None and limit <= 0:
+        return result
+    for start in reversed(_log_segments(log_dir)):
+        if before is not None and start >= before:
+            continue
+        status, entries = _store.load(_segment_path(log_dir, start), _parse_segment)
+        if status != 'ok':
+            continue
+        for i in range(len(entries) - 1, -1, -1):
+            seq = start + i
+            entry = entries[i]
+            if entry is None or (before is not None and seq >= before):
+                continue
+            if ((adapter is not None and entry.get('adapter') != adapter)
+                    or (action is not None and entry.get('action') != action)
+                    or (success is not None and bool(entry.get('success')) != success)):
+                continue
+            result.append({**entry, 'seq': seq})
+            if limit is not None and len(result) >= limit:
+                return result
+    return result
+
+def _parse_segment(data: bytes) -> list:
+    entries = []
+    for line in data.splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            entries.append(None)
+    return entries
 
 def clear_logs():
-    _save_json(LOG_FILE, [])
+    base = os.path.splitext(_data_file('LOG_FILE'))[0]
+    log_dir = base + '.d'
+    with _locked(base + '.lock'):
+        _prepare_log_dir(log_dir)
+        starts = _log_segments(log_dir)
+        next_seq = starts[-1] + _segment_stat(_segment_path(log_dir, starts[-1]))[1]
+        for start in starts:
+            _remove_segment(_segment_path(log_dir, start))
+        open(_segment_path(log_dir, next_seq), 'ab').close()
+
+def _segment_path(log_dir: str, start: int) -> str:
+    return os.path.join(log_dir, f'{start:012d}.jsonl')
+
+def _log_segments(log_dir: str) -> list[int]:
+    try:
+        names = os.listdir(log_dir)
+    except FileNotFoundError:
+        return []
+    starts = []
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext == '.jsonl' and stem.isdigit():
+            starts.append(int(stem))
+    return sorted(starts)
+
+def _segment_stat(path: str) -> tuple[int, int]:
+    """返回段文件的 (字节数, 行数)；大小未变时复用缓存的行数。"""
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return 0, 0
+    cached = _log_segment_stats.get(path)
+    if cached and cached[0] == size:
+        return cached
+    with open(path, 'rb') as f:
+        lines = f.read().count(b'\n')
+    _log_segment_stats[path] = (size, lines)
+    return size, lines
+
+def _trim_log_segments(log_dir: str, starts: list[int], next_seq: int):
+    while len(starts) > 1 and next_seq - starts[1] >= LOG_RETENTION:
+        _remove_segment(_segment_path(log_dir, starts.pop(0)))
+
+def _remove_segment(path: str):
+    _log_segment_stats.pop(path, None)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _prepare_log_dir(log_dir: str):
+    """首次使用时创建分段目录，并把旧版 log.json 迁移为第一段。"""
+    if _log_segments(log_dir):
+        return
+    os.makedirs(log_dir, exist_ok=True)
+    legacy_path = os.path.splitext(log_dir)[0] + '.json'
+    legacy = _load_json(legacy_path, []) if os.path.exists(legacy_path) else []
+    with open(_segment_path(log_dir, 0), 'ab') as f:
+        for entry in legacy if isinstance(legacy, list) else []:
+            f.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+    if os.path.exists(legacy_path):
+        os.replace(legacy_path, legacy_path + '.migrated')
 
 # ── 设置 ─────────────────────────────────────────────
 DEFAULT_SETTINGS = {
     'auto_monitor': False,
-    'monitor_interval': 5,
+    'monitor_min_interval': 60,     # 秒
+    'monitor_max_interval': 1800,   # 秒
     'auto_repair': False,
     'flush_on_repair': True,
+    'atomic_repair': False,
 }
 
-VALID_MONITOR_INTERVALS = (5, 10, 30)
+MONITOR_INTERVAL_RANGE = (10, 86400)
 
 
-def _normalize_settings(data) -> dict:
-    raw = data if isinstance(data, dict) else {}
+def _interval_setting(value, default) -> int:
     try:
-        interval = int(raw.get('monitor_interval', DEFAULT_SETTINGS['monitor_interval']))
+        value = int(value)
     except (TypeError, ValueError):
-        interval = DEFAULT_SETTINGS['monitor_interval']
-    if interval not in VALID_MONITOR_INTERVALS:
-        interval = DEFAULT_SETTINGS['monitor_interval']
+        return default
+    low, high = MONITOR_INTERVAL_RANGE
+    return min(max(value, low), high)
+
+
+def _normalize_settings(data) -> dict:
+    raw = data if isinstance(data, dict) else {}
+    max_default = DEFAULT_SETTINGS['monitor_max_interval']
+    if 'monitor_max_interval' not in raw and 'monitor_interval' in raw:
+        # 旧版设置的固定间隔（分钟）作为退避上限
+        max_default = _interval_setting(_minutes(raw['monitor_interval']), max_default)
+    min_interval = _interval_setting(raw.get('monitor_min_interval'), DEFAULT_SETTINGS['monitor_min_interval'])
+    max_interval = _interval_setting(raw.get('monitor_max_interval', max_default), max_default)
     return {
         'auto_monitor': bool(raw.get('auto_monitor', DEFAULT_SETTINGS['auto_monitor'])),
-        'monitor_interval': interval,
+        'monitor_min_interval': min_interval,
+        'monitor_max_interval': max(max_interval, min_interval),
         'auto_repair': bool(raw.get('auto_repair', DEFAULT_SETTINGS['auto_repair'])),
         'flush_on_repair': bool(raw.get('flush_on_repair', DEFAULT_SETTINGS['flush_on_repair'])),
+        'atomic_repair': bool(raw.get('atomic_repair', DEFAULT_SETTINGS['atomic_repair'])),
     }
 
 
+def _minutes(value):
+    try:
+        return int(value) * 60
+    except (TypeError, ValueError):
+        return None
+
+
 def get_settings() -> dict:
-    return _normalize_settings(_load_json(SETTINGS_FILE, {}))
+    return _normalize_settings(_load_json(_data_file('SETTINGS_FILE'), {}))
 
 def save_settings(s: dict):
-    _save_json(SETTINGS_FILE, _normalize_settings(s))
+    path = _data_file('SETTINGS_FILE')
+    if _store.load(path)[0] == 'corrupt':
+        # 保留损坏的原文件，方便排查
+        os.replace(path, path + '.corrupt')
+    _save_json(path, _normalize_settings(s))
+
+# ── 文档缓存 ──────────────────────────────────────────
+class DocumentStore:
+    """按 (mtime, size) 校验的文件解析结果缓存。
+
+    load() 返回 (状态, 值)，状态为 ok / missing / empty / corrupt 之一；
+    文件签名未变时直接返回上次解析的结果。save() 写入后同步更新缓存。
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._docs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path: str, parse=json.loads) -> tuple[str, object]:
+        key = (path, parse)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._docs.pop(key, None)
+            return 'missing', None
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._docs.get(key)
+            if cached is not None and cached[0] == signature:
+                self.hits += 1
+                self._docs.move_to_end(key)
+                return cached[1], cached[2]
+            self.misses += 1
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 'missing', None
+        if not data.strip():
+            status, value = 'empty', None
+        else:
+            try:
+                status, value = 'ok', parse(data)
+            except (ValueError, UnicodeDecodeError):
+                status, value = 'corrupt', None
+        self._remember(key, signature, status, value)
+        return status, value
+
+    def save(self, path: str, value, serialize) -> None:
+        data = serialize(value)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        st = os.stat(path)
+        self._remember((path, json.loads), (st.st_mtime_ns, st.st_size), 'ok', copy.deepcopy(value))
+
+    def _remember(self, key, signature, status, value):
+        with self._lock:
+            self._docs[key] = (signature, status, value)
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+
+    def invalidate(self, path: str = None):
+        with self._lock:
+            if path is None:
+                self._docs.clear()
+            else:
+                for key in [k for k in self._docs if k[0] == path]:
+                    del self._docs[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._docs)}
+
+
+_store = DocumentStore()
+
+
+def store_stats() -> dict:
+    return _store.stats()
 
 # ── 工具函数 ──────────────────────────────────────────
 def _now() -> str:
     return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
 def _load_json(path: str, default):
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
+    status, value = _store.load(path)
+    if status != 'ok':
         return default
+    # 缓存中的对象可能被调用方修改，返回副本
+    return copy.deepcopy(value)
 
 def _save_json(path: str, data):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    _store.save(path, data, lambda v: json.dumps(v, ensure_ascii=False, indent=2).encode('utf-8'))
+
+def _write_json_atomic(path: str, data):
+    _store.save(path, data, lambda v: json.dumps(v, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+def _write_text_atomic(path: str, text: str):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+_store_locks: dict[str, threading.RLock] = {}
+_store_locks_guard = threading.Lock()
+_held_locks = threading.local()
+
+@contextlib.contextmanager
+def _locked(lock_path: str):
+    """进程内用 RLock、进程间用锁文件串行化对同一存储的读写，可重入。"""
+    with _store_locks_guard:
+        lock = _store_locks.setdefault(lock_path, threading.RLock())
+    with lock:
+        held = getattr(_held_locks, 'paths', None)
+        if held is None:
+            held = _held_locks.paths = set()
+        if lock_path in held:
+            yield
+            return
+        held.add(lock_path)
+        try:
+            with open(lock_path, 'a+b') as f:
+                _lock_file(f)
+                try:
+                    yield
+                finally:
+                    _unlock_file(f)
+        finally:
+            held.discard(lock_path)
+
+try:
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+except ImportError:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# ── 命令行入口 ────────────────────────────────────────
+if __name__ == '__main__':
+    # 让 dns_cli 中的 import dns_core 拿到当前模块，而不是再执行一遍
+    sys.modules.setdefault('dns_core', sys.modules[__name__])
+    from dns_cli import main
+    sys.exit(main())
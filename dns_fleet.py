@@ -0,0 +1,255 @@
+# dns_fleet.py — 批量检测 / 修复多台主机的 DNS
+#
+#   python dns_fleet.py check  --hosts-file hosts.txt [--parallel 32] [--timeout 120]
+#   python dns_fleet.py repair --hosts pc-001,pc-002 [--no-flush] [--atomic]
+#   python dns_fleet.py check  --hosts a,b --transport local \
+#       --program "netsh=python fixtures/fake_netsh.py --state state/{host}.json"
+#
+# 每台主机完成后立即输出一行 JSON，最后一行为汇总（{"summary": ...}）。
+# 默认通过 PowerShell Invoke-Command 在远程主机上执行 netsh / ipconfig，
+# 每台主机的备份与日志保存在本机数据目录的 fleet\<主机名>\ 下。
+import argparse
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, Sequence, Union
+
+import dns_core as core
+from dns_cli import EXIT_OK, EXIT_STATIC, EXIT_UNKNOWN, EXIT_FAILED, check_state
+
+DEFAULT_PARALLEL = 32
+DEFAULT_HOST_TIMEOUT = 120.0
+
+# 远程执行模板：{host} 为主机名，{command} 为转成 PowerShell 语法的命令。
+# 远程命令退出码非 0 时抛出异常，使本地 powershell 进程以非 0 退出。
+POWERSHELL_TEMPLATE = (
+    'powershell', '-NoProfile', '-NonInteractive', '-Command',
+    "Invoke-Command -ComputerName {host} -ErrorAction Stop -ScriptBlock {{ "
+    "{command}; if ($LASTEXITCODE) {{ throw ('exit code ' + $LASTEXITCODE) }} }}",
+)
+
+
+class HostTimeout(core.CommandTimeout):
+    """主机在截止时间前没有完成全部命令。"""
+
+
+# ── 传输层 ────────────────────────────────────────────
+class Transport:
+    """在指定主机上执行一条命令，返回输出文本；失败时抛出 CommandError。"""
+
+    def run(self, host: str, cmd: Union[str, Sequence[str]], timeout: float, check: bool = True) -> str:
+        raise NotImplementedError
+
+    def _exec(self, argv: list, cmd, timeout: float, check: bool) -> str:
+        try:
+            result = subprocess.run(argv, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            raise HostTimeout(f'{core._format_cmd(cmd)} 超时（{timeout:.1f} 秒）') from e
+        except OSError as e:
+            raise core.CommandError(f'{core._format_cmd(cmd)} 无法执行: {e}') from e
+        return core._command_output(cmd, result, check)
+
+
+def _split(cmd: Union[str, Sequence[str]]) -> list[str]:
+    return shlex.split(cmd) if isinstance(cmd, str) else [str(c) for c in cmd]
+
+
+class LocalTransport(Transport):
+    """在本机执行命令，可按命令名替换为其他程序（测试时换成 fixtures/fake_netsh.py）。
+
+    programs 形如 {'netsh': ['python', 'fake_netsh.py', '--state', 'state/{host}.json']}，
+    参数中的 {host} 会替换为主机名；未列出的命令按原样执行。
+    """
+
+    def __init__(self, programs: dict = None):
+        self.programs = {k.lower(): list(v) for k, v in (programs or {}).items()}
+
+    def run(self, host, cmd, timeout, check=True):
+        args = _split(cmd)
+        verb = os.path.splitext(os.path.basename(args[0]))[0].lower()
+        prefix = self.programs.get(verb)
+        if prefix is not None:
+            args = [part.replace('{host}', host) for part in prefix] + args[1:]
+        return self._exec(args, cmd, timeout, check)
+
+
+class RemoteTransport(Transport):
+    """按模板在远程主机上执行命令，默认为 PowerShell Invoke-Command（需要 WinRM）。"""
+
+    def __init__(self, template: Sequence[str] = POWERSHELL_TEMPLATE):
+        self.template = tuple(template)
+
+    def run(self, host, cmd, timeout, check=True):
+        command = '& ' + ' '.join(_ps_quote(arg) for arg in _split(cmd))
+        argv = [part.format(host=_ps_quote(host), command=command) for part in self.template]
+        return self._exec(argv, cmd, timeout, check)
+
+
+def _ps_quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# ── 执行 ──────────────────────────────────────────────
+def run_fleet(hosts: Iterable[str], action: str = 'check', transport: Transport = None,
+              parallel: int = DEFAULT_PARALLEL, host_timeout: float = DEFAULT_HOST_TIMEOUT,
+              data_root: str = None, flush: bool = True, policy: str = 'best_effort') -> Iterator[dict]:
+    """并发处理多台主机，每完成一台就产出一条报告（完成顺序，而不是输入顺序）。
+
+    policy 为修复策略，含义同 dns_core.repair_transaction。
+    """
+    if action not in ('check', 'repair'):
+        raise ValueError(f'未知操作: {action}')
+    hosts = list(dict.fromkeys(h.strip() for h in hosts if h and h.strip()))
+    transport = transport or RemoteTransport()
+    data_root = data_root or os.path.join(core.data_dir(), 'fleet')
+    if not hosts:
+        return
+    workers = max(1, min(int(parallel), len(hosts)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dns-fleet') as pool:
+        futures = [
+            pool.submit(run_host, host, action, transport, host_timeout, data_root, flush, policy)
+            for host in hosts
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def run_host(host: str, action: str, transport: Transport, host_timeout: float,
+             data_root: str, flush: bool = True, policy: str = 'best_effort') -> dict:
+    """在一台主机上执行检测或修复；所有命令共用 host_timeout 秒的截止时间。"""
+    started = time.monotonic()
+    deadline = started + host_timeout
+    expired = threading.Event()
+
+    def runner(cmd, check=True):
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise HostTimeout(f'{core._format_cmd(cmd)} 未执行：已超过 {host_timeout:g} 秒截止时间')
+            return transport.run(host, cmd, remaining, check)
+        except HostTimeout:
+            expired.set()
+            raise
+
+    report = {'host': host, 'action': action}
+    try:
+        with core.command_runner(runner), core.using_data_dir(os.path.join(data_root, _host_dir(host))):
+            state = check_state()
+            report.update(state)
+            if action == 'repair' and state['static']:
+                outcome = core.repair_transaction(state['static'], flush=flush, policy=policy)
+                report['repair'] = outcome['results']
+                if outcome['rollback']:
+                    report['rollback'] = outcome['rollback']
+                    report['transaction'] = outcome['status']
+                report['status'] = 'repaired' if outcome['success'] else 'failed'
+    except Exception as e:
+        report.update(status='error', error=str(e))
+    if expired.is_set():
+        # 超时后读取到的状态不完整，统一记为 timeout
+        report['status'] = 'timeout'
+        report.setdefault('error', f'超过 {host_timeout:g} 秒截止时间')
+    report['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return report
+
+
+def _host_dir(host: str) -> str:
+    return re.sub(r'[^\w.-]', '_', host) or '_'
+
+
+def summarize(reports: Iterable[dict]) -> dict:
+    counts: dict[str, int] = {}
+    total = 0
+    for r in reports:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+        total += 1
+    return {'hosts': total, 'status': counts}
+
+
+def exit_code(summary: dict) -> int:
+    counts = summary['status']
+    if any(counts.get(s) for s in ('failed', 'timeout', 'error')):
+        return EXIT_FAILED
+    if counts.get('static'):
+        return EXIT_STATIC
+    if counts.get('unknown'):
+        return EXIT_UNKNOWN
+    return EXIT_OK
+
+
+# ── 入口 ──────────────────────────────────────────────
+def _read_hosts(args) -> list[str]:
+    hosts = []
+    for item in args.hosts or []:
+        hosts += item.split(',')
+    if args.hosts_file:
+        with open(args.hosts_file, 'r', encoding='utf-8') as handle:
+            for line in handle:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    hosts.append(line)
+    return [h.strip() for h in hosts if h.strip()]
+
+
+def _build_transport(args) -> Transport:
+    if args.transport == 'remote':
+        return RemoteTransport()
+    programs = {}
+    for spec in args.program or []:
+        verb, sep, command = spec.partition('=')
+        if not sep or not verb.strip():
+            raise SystemExit(f'--program 格式应为 命令=程序及参数: {spec}')
+        programs[verb.strip()] = shlex.split(command)
+    return LocalTransport(programs)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python dns_fleet.py', description='批量检测 / 修复多台主机的 DNS')
+    parser.add_argument('action', choices=('check', 'repair'))
+    parser.add_argument('--hosts', action='append', help='主机名，逗号分隔，可重复')
+    parser.add_argument('--hosts-file', help='主机列表文件，每行一个，# 后为注释')
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL, help='同时处理的主机数')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_HOST_TIMEOUT, help='每台主机的截止时间（秒）')
+    parser.add_argument('--transport', choices=('remote', 'local'), default='remote')
+    parser.add_argument('--program', action='append',
+                        help='local 传输时替换命令，如 "netsh=python fake_netsh.py --state {host}.json"')
+    parser.add_argument('--data-dir', help='保存各主机备份与日志的目录，默认为数据目录下的 fleet')
+    parser.add_argument('--no-flush', action='store_true', help='修复后不清除 DNS 缓存')
+    parser.add_argument('--atomic', action='store_true', help='同一主机任一适配器修复失败时全部回滚')
+    parser.add_argument('--output', help='报告写入文件（JSON lines），默认输出到标准输出')
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    hosts = _read_hosts(args)
+    if not hosts:
+        parser.error('需要 --hosts 或 --hosts-file')
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    started = time.monotonic()
+    reports = []
+    try:
+        for report in run_fleet(hosts, args.action, _build_transport(args), args.parallel,
+                                args.timeout, args.data_dir, flush=not args.no_flush,
+                                policy='all_or_nothing' if args.atomic else 'best_effort'):
+            reports.append(report)
+            out.write(json.dumps(report, ensure_ascii=False) + '\n')
+            out.flush()
+        summary = summarize(reports)
+        summary['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        out.write(json.dumps({'summary': summary}, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return exit_code(summary)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# dns_history.py — 各适配器 DNS 状态的历史记录（SQLite，WAL 模式）
+#
+#   store = HistoryStore()                    # 默认保存在数据目录的 history.sqlite3
+#   store.record(configs)                     # 每次检测后调用，只写内存，不等待磁盘
+#   store.report(adapter='Wi-Fi', since=...)  # 某段时间内各 DNS 状态的持续时长与出现次数
+#   store.close()
+#
+# 连续相同的检测结果合并为一个区间（intervals 表），只更新区间的结束时间与样本数；
+# 超过 RAW_RETENTION 的区间按小时汇总、超过 HOURLY_RETENTION 的小时汇总再按天汇总
+# （rollups 表，桶按 UTC 对齐）。写入在后台线程中按批提交，record() 本身只做内存操作。
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Sequence
+
+import dns_core as core
+
+HISTORY_BATCH_SIZE = 64          # 累积多少次检测后提交一次
+HISTORY_FLUSH_INTERVAL = 300.0   # 或距上次提交超过多少秒
+HISTORY_MAX_GAP = 3600.0         # 相邻两次检测间隔超过该值时不再合并为同一区间
+RAW_RETENTION = 7 * 86400        # 原始区间保留时长
+HOURLY_RETENTION = 90 * 86400    # 小时汇总保留时长，更早的汇总为天
+DOWNSAMPLE_INTERVAL = 3600.0     # 两次汇总之间至少间隔的秒数
+
+HOUR, DAY = 3600, 86400
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS intervals (
+    id INTEGER PRIMARY KEY,
+    adapter TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    servers TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    samples INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS intervals_adapter_end ON intervals (adapter, end);
+CREATE INDEX IF NOT EXISTS intervals_end ON intervals (end);
+CREATE TABLE IF NOT EXISTS rollups (
+    bucket TEXT NOT NULL,
+    adapter TEXT NOT NULL,
+    start REAL NOT NULL,
+    mode TEXT NOT NULL,
+    servers TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    transitions INTEGER NOT NULL,
+    PRIMARY KEY (bucket, adapter, start, mode, servers)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollups_start ON rollups (bucket, start);
+'''
+
+_UPSERT_ROLLUP = '''
+INSERT INTO rollups (bucket, adapter, start, mode, servers, seconds, samples, transitions)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (bucket, adapter, start, mode, servers) DO UPDATE SET
+    seconds = seconds + excluded.seconds,
+    samples = samples + excluded.samples,
+    transitions = transitions + excluded.transitions
+'''
+
+
+def default_path() -> str:
+    return os.path.join(core.data_dir(), 'history.sqlite3')
+
+
+def snapshot_row(config: dict) -> tuple[str, str, str]:
+    """把一个适配器的检测结果转成 (适配器, 模式, DNS 服务器 JSON)。
+
+    同时接受 get_dns_config 的结果（adapter 键）与 dns_cli.check_state 的行（name 键）。
+    """
+    adapter = config.get('adapter') or config.get('name') or ''
+    servers = json.dumps(core.dns_servers(config), separators=(',', ':'))
+    return adapter, core.dns_mode(config), servers
+
+
+class HistoryStore:
+    """DNS 状态历史。record() 可在界面线程调用；查询前会先提交尚未写入的记录。"""
+
+    def __init__(self, path: str = None, clock=time.time):
+        self.path = path or default_path()
+        self._clock = clock
+        self._pending: list[tuple[float, list]] = []
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = None
+        self._current: dict[str, list] = {}   # 适配器 -> [区间 id, (模式, 服务器), 结束时间]
+        self._last_flush = clock()
+        self._last_downsample = 0.0
+        self._flush_thread = None
+
+    # ── 写入 ──────────────────────────────────────────
+    def record(self, configs: Sequence[dict], ts: float = None):
+        """记录一次检测结果；configs 为本次检测到的全部适配器，未出现的适配器视为已断开。"""
+        ts = self._clock() if ts is None else ts
+        rows = [snapshot_row(cfg) for cfg in configs]
+        with self._pending_lock:
+            self._pending.append((ts, rows))
+            due = (len(self._pending) >= HISTORY_BATCH_SIZE
+                   or ts - self._last_flush >= HISTORY_FLUSH_INTERVAL)
+        if due:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        with self._pending_lock:
+            if self._flush_thread is not None and self._flush_thread.is_alive():
+                return
+            self._flush_thread = threading.Thread(target=self.flush, name='dns-history', daemon=True)
+            self._flush_thread.start()
+
+    def flush(self):
+        """把内存中的记录合并后在一个事务中写入数据库，必要时顺带汇总旧数据。"""
+        with self._db_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+                self._last_flush = self._clock()
+            if not pending:
+                return
+            conn = self._connect()
+            with conn:
+                self._write(conn, pending)
+                now = pending[-1][0]
+                if now - self._last_downsample >= DOWNSAMPLE_INTERVAL:
+                    self._downsample(conn, now)
+                    self._last_downsample = now
+
+    def _write(self, conn, pending):
+        updates: dict[int, list] = {}   # 区间 id -> [结束时间, 新增样本数]
+        for ts, rows in pending:
+            seen = set()
+            for adapter, mode, servers in rows:
+                seen.add(adapter)
+                key = (mode, servers)
+                current = self._current.get(adapter)
+                if current is not None and ts - current[2] <= HISTORY_MAX_GAP:
+                    if current[1] == key:
+                        current[2] = ts
+                        update = updates.setdefault(current[0], [ts, 0])
+                        update[0] = ts
+                        update[1] += 1
+                        continue
+                    # 状态变化：上一个区间延续到本次检测时刻
+                    updates.setdefault(current[0], [ts, 0])[0] = ts
+                cursor = conn.execute(
+                    'INSERT INTO intervals (adapter, mode, servers, start, end, samples) VALUES (?, ?, ?, ?, ?, 1)',
+                    (adapter, mode, servers, ts, ts),
+                )
+                self._current[adapter] = [cursor.lastrowid, key, ts]
+            for adapter in [a for a in self._current if a not in seen]:
+                del self._current[adapter]
+        conn.executemany(
+            'UPDATE intervals SET end = ?, samples = samples + ? WHERE id = ?',
+            [(end, added, interval_id) for interval_id, (end, added) in updates.items()],
+        )
+
+    def close(self):
+        """提交尚未写入的记录并关闭数据库。"""
+        thread = self._flush_thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ── 汇总 ──────────────────────────────────────────
+    def downsample(self, now: float = None):
+        """立即把过期的原始区间汇总为小时、过期的小时汇总为天。"""
+        self.flush()
+        now = self._clock() if now is None else now
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                self._downsample(conn, now)
+            self._last_downsample = now
+
+    def _downsample(self, conn, now: float):
+        cutoff = now - RAW_RETENTION
+        rows = conn.execute(
+            'SELECT id, adapter, mode, servers, start, end, samples FROM intervals WHERE end < ?', (cutoff,)
+        ).fetchall()
+        conn.executemany(_UPSERT_ROLLUP, [
+            ('hour', adapter, bucket, mode, servers, seconds, samples, transitions)
+            for _, adapter, mode, servers, start, end, samples in rows
+            for bucket, seconds, samples, transitions in _split(start, end, samples, HOUR)
+        ])
+        conn.execute('DELETE FROM intervals WHERE end < ?', (cutoff,))
+        dropped = {row[0] for row in rows}
+        for adapter in [a for a, cur in self._current.items() if cur[0] in dropped]:
+            del self._current[adapter]
+
+        day_cutoff = _floor(now - HOURLY_RETENTION, DAY)
+        hourly = conn.execute(
+            "SELECT adapter, start, mode, servers, seconds, samples, transitions FROM rollups "
+            "WHERE bucket = 'hour' AND start < ?", (day_cutoff,)
+        ).fetchall()
+        conn.executemany(_UPSERT_ROLLUP, [
+            ('day', adapter, _floor(start, DAY), mode, servers, seconds, samples, transitions)
+            for adapter, start, mode, servers, seconds, samples, transitions in hourly
+        ])
+        conn.execute("DELETE FROM rollups WHERE bucket = 'hour' AND start < ?", (day_cutoff,))
+
+    # ── 查询 ──────────────────────────────────────────
+    def intervals(self, adapter: str = None, since: float = None, until: float = None) -> list[dict]:
+        """返回与时间范围相交的原始区间，按开始时间排序。"""
+        self.flush()
+        sql = 'SELECT adapter, mode, servers, start, end, samples FROM intervals WHERE end >= ? AND start <= ?'
+        params = [since if since is not None else float('-inf'), until if until is not None else float('inf')]
+        if adapter is not None:
+            sql += ' AND adapter = ?'
+            params.append(adapter)
+        with self._db_lock:
+            rows = self._connect().execute(sql + ' ORDER BY start, id', params).fetchall()
+        return [
+            {'adapter': a, 'mode': m, 'servers': json.loads(s), 'start': start, 'end': end, 'samples': n}
+            for a, m, s, start, end, n in rows
+        ]
+
+    def report(self, adapter: str = None, since: float = None, until: float = None,
+               mode: str = 'static') -> list[dict]:
+        """按 (适配器, DNS 服务器) 统计某模式的持续秒数与出现次数，持续时间长的在前。
+
+        原始区间按时间范围精确截取；已汇总的数据按桶的开始时间筛选，精度为小时或天。
+        mode 为 None 时统计全部模式。
+        """
+        self.flush()
+        lo = since if since is not None else float('-inf')
+        hi = until if until is not None else float('inf')
+        raw_filter, rollup_filter, extra = '', '', []
+        if adapter is not None:
+            raw_filter += ' AND adapter = ?'
+            rollup_filter += ' AND adapter = ?'
+            extra.append(adapter)
+        if mode is not None:
+            raw_filter += ' AND mode = ?'
+            rollup_filter += ' AND mode = ?'
+            extra.append(mode)
+        sql = f'''
+            SELECT adapter, mode, servers, SUM(seconds), SUM(occurrences), SUM(samples) FROM (
+                SELECT adapter, mode, servers, MAX(0, MIN(end, ?) - MAX(start, ?)) AS seconds,
+                       1 AS occurrences, samples
+                FROM intervals WHERE end >= ? AND start <= ?{raw_filter}
+                UNION ALL
+                SELECT adapter, mode, servers, seconds, transitions, samples
+                FROM rollups WHERE start >= ? AND start < ?{rollup_filter}
+            ) GROUP BY adapter, mode, servers ORDER BY SUM(seconds) DESC, adapter
+        '''
+        params = [hi, lo, lo, hi, *extra, _floor(lo, HOUR) if since is not None else lo, hi, *extra]
+        with self._db_lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [
+            {'adapter': a, 'mode': m, 'servers': json.loads(s),
+             'seconds': round(seconds, 3), 'occurrences': occurrences, 'samples': samples}
+            for a, m, s, seconds, occurrences, samples in rows
+        ]
+
+    # ── 连接 ──────────────────────────────────────────
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            # 从上次运行最后一个区间继续合并
+            for interval_id, adapter, mode, servers, end in conn.execute(
+                'SELECT id, adapter, mode, servers, end FROM intervals '
+                'WHERE id IN (SELECT MAX(id) FROM intervals GROUP BY adapter)'
+            ):
+                self._current[adapter] = [interval_id, (mode, servers), end]
+            self._conn = conn
+        return self._conn
+
+
+def _floor(ts: float, size: int) -> float:
+    return ts - ts % size
+
+
+def _split(start: float, end: float, samples: int, size: int):
+    """把 [start, end] 按桶切分，产出 (桶开始时间, 秒数, 样本数, 状态切换次数)。
+
+    样本数与切换次数都计入区间开始所在的桶。
+    """
+    bucket = _floor(start, size)
+    first = True
+    while True:
+        upper = bucket + size
+        yield bucket, min(end, upper) - max(start, bucket), samples if first else 0, 1 if first else 0
+        if end <= upper:
+            return
+        bucket, first = upper, False
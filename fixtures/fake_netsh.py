@@ -0,0 +1,314 @@
+# fake_netsh.py — 本地替身 netsh，用于在非 Windows 环境测试命令会话与解析逻辑
+#
+# 用法：
+#   python fake_netsh.py --adapters "Ethernet=dhcp:192.168.1.1@10.0.0.1/25;Wi-Fi=static:1.1.1.1,8.8.8.8|static:2606:4700::1111"
+#       |模式:地址 为可选的 IPv6 DNS（默认 dhcp），@网关/跃点数 为可选的默认路由，
+#       接口索引按顺序从 11 开始
+#       无命令参数时进入交互模式（与真实 netsh 一样打印 netsh> 提示符并读取 stdin）
+#   python fake_netsh.py interface ip show config
+#       带命令参数时执行一条命令后退出
+#   python fake_netsh.py -f script.txt
+#       逐行执行脚本文件
+#   python fake_netsh.py --state host.json interface ip set dns Ethernet dhcp
+#       适配器状态保存在 JSON 文件中，多次单条调用之间保持修改结果
+#   python fake_netsh.py --locked Wi-Fi ...
+#       列出的适配器接受 set / add 命令但配置不变（模拟被策略锁定的适配器）
+#   python fake_netsh.py --failing Wi-Fi -f script.txt
+#       对列出的适配器执行 set / add 时报错，脚本其余行照常执行，最后以退出码 1 结束
+#   python fake_netsh.py --no-ipv6 VPN interface ipv6 show dnsservers name=VPN
+#       列出的适配器未绑定 IPv6：按名称查询或修改 IPv6 时报错并以退出码 1 结束，
+#       不带名称的 show dnsservers 不列出它们
+import argparse
+import json
+import os
+import shlex
+import sys
+
+TEXT = {
+    'en': {
+        'header': 'Configuration for interface "{name}"',
+        'dhcp_enabled': 'DHCP enabled:                         Yes',
+        'dhcp': 'DNS servers configured through DHCP:',
+        'static': 'Statically Configured DNS Servers:',
+        'none': 'None',
+        'suffix': 'Register with which suffix:           Primary only',
+        'iface_head': ('Admin State', 'State', 'Type', 'Interface Name'),
+        'enabled': 'Enabled',
+        'connected': 'Connected',
+        'dedicated': 'Dedicated',
+        'not_found': 'The following command was not found: {cmd}.',
+        'no_iface': 'The filename, directory name, or volume label syntax is incorrect.',
+        'failed': 'The parameter is incorrect.',
+    },
+    'zh': {
+        'header': '接口 "{name}" 的配置',
+        'dhcp_enabled': 'DHCP 已启用:                          是',
+        'dhcp': '通过 DHCP 配置的 DNS 服务器:',
+        'static': '静态配置的 DNS 服务器:',
+        'none': '无',
+        'suffix': '用哪个前缀注册:                   只是主要',
+        'iface_head': ('管理员状态', '状态', '类型', '接口名称'),
+        'enabled': '已启用',
+        'connected': '已连接',
+        'dedicated': '专用',
+        'not_found': '找不到下列命令: {cmd}。',
+        'no_iface': '文件名、目录名或卷标语法不正确。',
+        'failed': '参数错误。',
+    },
+}
+
+VALUE_COL = 42
+
+
+def parse_adapters(spec: str) -> list[dict]:
+    """解析 "名称=模式:ip1,ip2|v6模式:ip1,ip2@网关/跃点数;..." 形式的适配器描述。"""
+    adapters = []
+    for item in filter(None, (part.strip() for part in spec.split(';'))):
+        name, _, rest = item.partition('=')
+        rest, _, route = rest.partition('@')
+        rest, _, v6 = rest.partition('|')
+        adapter = {'name': name.strip(), **_parse_dns(rest), 'ipv6': _parse_dns(v6)}
+        if route.strip():
+            gateway, _, metric = route.partition('/')
+            adapter['gateway'] = gateway.strip()
+            adapter['metric'] = int(metric or 25)
+        adapters.append(adapter)
+    return adapters
+
+
+def _parse_dns(spec: str) -> dict:
+    mode, _, ips = spec.partition(':')
+    return {'mode': (mode or 'dhcp').strip(), 'ips': [ip.strip() for ip in ips.split(',') if ip.strip()]}
+
+
+def ipv6_config(adapter: dict) -> dict:
+    # 旧的状态文件没有 ipv6 字段，按 DHCP 处理
+    return adapter.setdefault('ipv6', {'mode': 'dhcp', 'ips': []})
+
+
+def _value_line(label: str, value: str) -> str:
+    text = f'    {label}'
+    return text + ' ' * max(1, VALUE_COL - len(text)) + value
+
+
+def _render_dns(name: str, dns: dict, locale: str, extra: list[str]) -> str:
+    t = TEXT[locale]
+    label = t['static'] if dns['mode'] == 'static' else t['dhcp']
+    ips = dns['ips'] or [t['none']]
+    lines = ['', t['header'].format(name=name), *extra, _value_line(label, ips[0])]
+    lines += [' ' * VALUE_COL + ip for ip in ips[1:]]
+    lines += ['    ' + t['suffix'], '']
+    return '\n'.join(lines)
+
+
+def render_config(adapter: dict, locale: str = 'en') -> str:
+    return _render_dns(adapter['name'], adapter, locale, ['    ' + TEXT[locale]['dhcp_enabled']])
+
+
+def render_show_config(adapters: list[dict], locale: str = 'en') -> str:
+    return ''.join(render_config(a, locale) for a in adapters) + '\n'
+
+
+def render_dnsservers(adapter: dict, locale: str = 'en') -> str:
+    return _render_dns(adapter['name'], ipv6_config(adapter), locale, [])
+
+
+def render_show_dnsservers(adapters: list[dict], locale: str = 'en') -> str:
+    return ''.join(render_dnsservers(a, locale) for a in adapters) + '\n'
+
+
+def render_show_interface(adapters: list[dict], locale: str = 'en') -> str:
+    t = TEXT[locale]
+    head = '{:<15}{:<15}{:<17}{}'.format(*t['iface_head'])
+    lines = ['', head, '-' * 72]
+    for a in adapters:
+        lines.append('{:<15}{:<15}{:<17}{}'.format(
+            t['enabled'], t['connected'], t['dedicated'], a['name']))
+    return '\n'.join(lines) + '\n\n'
+
+
+def interface_index(adapters: list[dict], adapter: dict) -> int:
+    return adapter.get('index') or 11 + adapters.index(adapter)
+
+
+def render_ipv4_interfaces(adapters: list[dict], locale: str = 'en') -> str:
+    state = '状态' if locale == 'zh' else 'State'
+    name = '名称' if locale == 'zh' else 'Name'
+    lines = ['', f'Idx     Met         MTU          {state:<21}{name}',
+             '---  ----------  ----------  ------------  ---------------------------',
+             '  1          75  4294967295  connected     Loopback Pseudo-Interface 1']
+    for a in adapters:
+        lines.append('{:>3}  {:>10}  {:>10}  {:<12}  {}'.format(
+            interface_index(adapters, a), a.get('metric', 50), 1500, 'connected', a['name']))
+    return '\n'.join(lines) + '\n\n'
+
+
+def render_ipv4_routes(adapters: list[dict], locale: str = 'en') -> str:
+    head = ('发布     类型      跃点数  前缀                    索引  网关/接口名称' if locale == 'zh'
+            else 'Publish  Type      Met  Prefix                    Idx  Gateway/Interface Name')
+    kind, no = ('手动', '否') if locale == 'zh' else ('Manual', 'No')
+    system = '系统' if locale == 'zh' else 'System'
+    lines = ['', head, '-------  --------  ---  ------------------------  ---  ------------------------']
+    for a in adapters:
+        if a.get('gateway'):
+            lines.append(f'{no:<7}  {kind:<8}  {0:<3}  {"0.0.0.0/0":<24}  {interface_index(adapters, a):>3}  {a["gateway"]}')
+    lines.append(f'{no:<7}  {system:<8}  {256:<3}  {"127.0.0.0/8":<24}  {1:>3}  Loopback Pseudo-Interface 1')
+    for a in adapters:
+        lines.append(f'{no:<7}  {system:<8}  {256:<3}  {"224.0.0.0/4":<24}  {interface_index(adapters, a):>3}  {a["name"]}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class CommandFailed(Exception):
+    """模拟 netsh 对某条命令报错。"""
+
+
+class FakeNetsh:
+    def __init__(self, adapters: list[dict], locale: str = 'en', locked=(), failing=(), no_ipv6=()):
+        self.adapters = adapters
+        self.locale = locale
+        self.locked = set(locked)
+        self.failing = set(failing)
+        self.no_ipv6 = set(no_ipv6)
+        self.failed = False
+
+    def _find(self, name: str):
+        return next((a for a in self.adapters if a['name'] == name), None)
+
+    def _writable(self, name: str):
+        """返回可修改的适配器副本；被锁定的适配器返回一个不会写回的拷贝。"""
+        if name in self.failing:
+            raise CommandFailed(name)
+        adapter = self._find(name)
+        if adapter is not None and name in self.locked:
+            return json.loads(json.dumps(adapter))
+        return adapter
+
+    def handle(self, line: str) -> str:
+        try:
+            return self._handle(line)
+        except CommandFailed:
+            self.failed = True
+            return TEXT[self.locale]['failed'] + '\n'
+
+    def _handle(self, line: str) -> str:
+        try:
+            tokens = shlex.split(line)
+        except ValueError:
+            tokens = line.split()
+        words = [tok.lower() for tok in tokens]
+        params = [tok.split('=', 1)[1] if '=' in tok else tok for tok in tokens]
+        t = TEXT[self.locale]
+
+        if words[:3] == ['interface', 'show', 'interface']:
+            return render_show_interface(self.adapters, self.locale)
+        if words[:2] == ['interface', 'ip'] or words[:2] == ['interface', 'ipv4']:
+            rest, args = words[2:], params[2:]
+            if rest[:2] == ['show', 'interfaces']:
+                return render_ipv4_interfaces(self.adapters, self.locale)
+            if rest[:2] == ['show', 'route']:
+                return render_ipv4_routes(self.adapters, self.locale)
+            if rest[:2] == ['show', 'config']:
+                if len(args) > 2:
+                    adapter = self._find(args[2])
+                    return render_config(adapter, self.locale) + '\n' if adapter else t['no_iface'] + '\n'
+                return render_show_config(self.adapters, self.locale)
+            if rest[:2] == ['set', 'dns'] and len(args) >= 4:
+                adapter = self._writable(args[2])
+                if adapter is None:
+                    return t['no_iface'] + '\n'
+                if args[3].lower() == 'dhcp':
+                    adapter['mode'], adapter['ips'] = 'dhcp', []
+                else:
+                    adapter['mode'], adapter['ips'] = 'static', args[4:5]
+                return '\n'
+            if rest[:2] == ['add', 'dns'] and len(args) >= 4:
+                adapter = self._writable(args[2])
+                if adapter is None:
+                    return t['no_iface'] + '\n'
+                adapter['ips'].append(args[3])
+                return '\n'
+        if words[:2] == ['interface', 'ipv6']:
+            rest, args = words[2:], params[2:]
+            if len(args) > 2 and args[2] in self.no_ipv6:
+                raise CommandFailed(args[2])
+            if rest[:2] == ['show', 'dnsservers']:
+                if len(args) > 2:
+                    adapter = self._find(args[2])
+                    return render_dnsservers(adapter, self.locale) + '\n' if adapter else t['no_iface'] + '\n'
+                bound = [a for a in self.adapters if a['name'] not in self.no_ipv6]
+                return render_show_dnsservers(bound, self.locale)
+            if rest[:1] in (['set'], ['add']) and rest[1:2] == ['dnsservers'] and len(args) >= 4:
+                adapter = self._writable(args[2])
+                if adapter is None:
+                    return t['no_iface'] + '\n'
+                dns = ipv6_config(adapter)
+                if rest[0] == 'add':
+                    dns['ips'].append(args[3])
+                elif args[3].lower() == 'dhcp':
+                    dns['mode'], dns['ips'] = 'dhcp', []
+                else:
+                    dns['mode'], dns['ips'] = 'static', args[4:5]
+                return '\n'
+        return t['not_found'].format(cmd=line.strip()) + '\n'
+
+
+def interactive(fake: FakeNetsh):
+    out = sys.stdout
+    while True:
+        out.write('netsh>')
+        out.flush()
+        line = sys.stdin.readline()
+        if not line:
+            return 0
+        command = line.strip()
+        if not command:
+            continue
+        if command.lower() in ('exit', 'quit', 'bye'):
+            return 0
+        if command.lower() == 'crash':
+            # 模拟 netsh 进程意外退出
+            sys.exit(3)
+        out.write(fake.handle(command))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='fake netsh')
+    parser.add_argument('--adapters', default='Ethernet=dhcp:192.168.1.1')
+    parser.add_argument('--locale', choices=sorted(TEXT), default='en')
+    parser.add_argument('--state', help='保存适配器状态的 JSON 文件')
+    parser.add_argument('--locked', default='', help='配置不可修改的适配器，逗号分隔')
+    parser.add_argument('--failing', default='', help='修改时报错的适配器，逗号分隔')
+    parser.add_argument('--no-ipv6', default='', help='未绑定 IPv6 的适配器，逗号分隔')
+    parser.add_argument('-f', dest='script')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    adapters = parse_adapters(args.adapters)
+    if args.state and os.path.exists(args.state):
+        with open(args.state, 'r', encoding='utf-8') as handle:
+            adapters = json.load(handle)
+    fake = FakeNetsh(adapters, args.locale, filter(None, args.locked.split(',')),
+                     filter(None, args.failing.split(',')), filter(None, args.no_ipv6.split(',')))
+    initial = json.dumps(adapters)
+    try:
+        if args.script:
+            with open(args.script, 'r', encoding='utf-8') as handle:
+                for line in handle:
+                    if line.strip():
+                        sys.stdout.write(fake.handle(line.strip()))
+            return 1 if fake.failed else 0
+        if args.command:
+            sys.stdout.write(fake.handle(shlex.join(args.command)))
+            return 1 if fake.failed else 0
+        return interactive(fake)
+    finally:
+        # 只在状态变化时原子地写回，并发的只读调用不会读到写了一半的文件
+        if args.state and (json.dumps(fake.adapters) != initial or not os.path.exists(args.state)):
+            temp = f'{args.state}.{os.getpid()}.tmp'
+            with open(temp, 'w', encoding='utf-8') as handle:
+                json.dump(fake.adapters, handle, ensure_ascii=False)
+            os.replace(temp, args.state)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
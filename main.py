@@ -1,9 +1,19 @@
 # main.py — DNS 一键修复助手主界面
-import tkinter as tk
-from tkinter import ttk, messagebox
-import threading
-
-import dns_core as core
+#
+#   python main.py --startup-profile    输出启动各阶段耗时（JSON）后退出
+import time
+_T_START = time.perf_counter()
+
+import json  # noqa: E402
+import queue  # noqa: E402
+import sys  # noqa: E402
+import tkinter as tk  # noqa: E402
+from tkinter import ttk, messagebox  # noqa: E402
+import threading  # noqa: E402
+
+_T_TK = time.perf_counter()
+import dns_core as core  # noqa: E402
+_T_IMPORTED = time.perf_counter()
 
 # ── 颜色主题（对应 Pencil 设计）────────────────────────
 BG       = '#1a1a1a'
@@ -25,11 +35,46 @@ FONT_S   = ('Consolas', 10)
 FONT_XS  = ('Consolas', 9)
 
 WIN_W, WIN_H = 480, 600
+# 日志窗口每页读取的条数；滚动到距底部不足 LOG_PREFETCH_ROWS 行时在后台读取下一页
+LOG_PAGE_SIZE = 100
+LOG_PREFETCH_ROWS = 20
+# 一次检测 / 修复的总时限（秒），任何一条命令卡住都不会让界面一直停在"检测中"
+REFRESH_DEADLINE = 60
+REPAIR_DEADLINE = 120
+# 界面线程检查后台线程结果的间隔（毫秒）
+UI_POLL_MS = 50
+# 设置窗口中可选的后台检测最大间隔（分钟）
+MONITOR_CEILING_CHOICES = (5, 10, 30)
+
+
+class StartupProfile:
+    """记录启动各阶段的时间点，单位毫秒，均从 main.py 开始导入时算起。"""
+
+    def __init__(self, start: float = _T_START):
+        self.start = start
+        self.marks: dict[str, float] = {}
+
+    def mark(self, name: str, at: float = None):
+        self.marks.setdefault(name, time.perf_counter() if at is None else at)
+
+    def report(self) -> dict:
+        ms = {k: round((v - self.start) * 1000, 1) for k, v in self.marks.items()}
+        result = {'marks_ms': ms}
+        if 'tk_imported' in ms and 'core_imported' in ms:
+            result['import_core_ms'] = round(ms['core_imported'] - ms['tk_imported'], 1)
+        if 'ui_start' in ms and 'ui_built' in ms:
+            result['ui_build_ms'] = round(ms['ui_built'] - ms['ui_start'], 1)
+        if 'probe_start' in ms and 'probe_done' in ms:
+            result['probe_ms'] = round(ms['probe_done'] - ms['probe_start'], 1)
+        if 'first_result' in ms:
+            result['time_to_first_status_ms'] = ms['first_result']
+        return result
 
 
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self, profile: StartupProfile = None):
         super().__init__()
+        self._profile = profile
         self.title('DNS 一键修复助手')
         self.geometry(f'{WIN_W}x{WIN_H}')
         self.resizable(False, False)
@@ -48,14 +93,49 @@ class App(tk.Tk):
         self.settings = core.get_settings()
         self._static_adapters: list[str] = []
         self._monitor_job = None
+        self._scheduler = None
+        self._watcher = None
+        self._history = None
         self._refresh_in_progress = False
+        self._change_pending = False    # 检测进行中收到的变化通知，检测完成后补做一次
         self._repair_in_progress = False
-
+        # 上一次渲染到各控件的属性，只对发生变化的属性调用 config()
+        self._view: dict[str, dict] = {}
+        self._adapter_names: list[str] = []
+        # 后台线程不直接调用 Tk（进入 mainloop 前 after() 会抛出 RuntimeError），
+        # 而是把回调放进队列，由界面线程定时取出执行
+        self._ui_queue: queue.Queue = queue.Queue()
+        self._ui_poll_job = None
+        self._poll_ui_queue()
+
+        # 首次检测在后台线程中与界面构建同时进行，控件的初始文字就是"检测中"
+        self._start_refresh('startup')
+        self._mark('ui_start')
         self._build_ui()
         self._center()
+        self._mark('ui_built')
         self.protocol('WM_DELETE_WINDOW', self._close_app)
         self._schedule_monitor()
-        self.after(100, lambda: self.refresh(source='startup'))
+
+    def _mark(self, name: str):
+        if self._profile is not None:
+            self._profile.mark(name)
+
+    def _post(self, callback, *args):
+        """在后台线程中调用：把回调交给界面线程执行。"""
+        self._ui_queue.put((callback, args))
+
+    def _poll_ui_queue(self):
+        # 先安排下一次检查，回调抛出异常也不会中断轮询
+        self._ui_poll_job = self.after(UI_POLL_MS, self._poll_ui_queue)
+        while True:
+            try:
+                callback, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+            if self._ui_poll_job is None:
+                return  # 回调中关闭了窗口
 
     # ── 布局 ──────────────────────────────────────────
     def _build_ui(self):
@@ -100,6 +180,11 @@ class App(tk.Tk):
         self.canvas = tk.Canvas(self.status_frame, width=130, height=130,
                                 bg=BG, highlightthickness=0)
         self.canvas.place(relx=0.5, y=20, anchor='n')
+        # 外圆背景、内圆、正常状态的勾，只创建一次，之后按需修改属性
+        self._circle_outer = self.canvas.create_oval(3, 3, 127, 127, fill=BG_CARD, outline=GRAY, width=3)
+        self._circle_inner = self.canvas.create_oval(22, 22, 108, 108, fill=GRAY, outline='')
+        self._circle_check = self.canvas.create_text(65, 65, text='✓', fill=BLACK_T,
+                                                     font=('Arial', 28, 'bold'), state='hidden')
 
         self.lbl_dns_label = tk.Label(self.status_frame, text='// DNS_STATUS',
                                       bg=BG, fg=GRAY, font=FONT_XS)
@@ -114,16 +199,20 @@ class App(tk.Tk):
         self.lbl_desc.place(relx=0.5, y=202, anchor='n')
 
     def _draw_circle(self, color: str, bg_color: str):
+        if self._view.get('circle') == (color, bg_color):
+            return
+        self._view['circle'] = (color, bg_color)
         c = self.canvas
-        c.delete('all')
-        # 外圆背景
-        c.create_oval(3, 3, 127, 127, fill=bg_color, outline=color, width=3)
-        # 内圆
-        c.create_oval(22, 22, 108, 108, fill=color, outline='')
-        # 正常状态显示勾
-        if color == TEAL:
-            c.create_text(65, 65, text='✓', fill=BLACK_T,
-                          font=('Arial', 28, 'bold'))
+        c.itemconfig(self._circle_outer, fill=bg_color, outline=color)
+        c.itemconfig(self._circle_inner, fill=color)
+        c.itemconfig(self._circle_check, state='normal' if color == TEAL else 'hidden')
+
+    def _render(self, widget: tk.Widget, **options):
+        last = self._view.setdefault(str(widget), {})
+        changed = {k: v for k, v in options.items() if last.get(k) != v}
+        if changed:
+            widget.config(**changed)
+            last.update(changed)
 
     def _build_adapter_row(self):
         self.adapter_row = tk.Frame(self, bg=BG, height=32)
@@ -157,20 +246,22 @@ class App(tk.Tk):
         self.info_frame.pack(fill='x', padx=20, pady=(4, 0))
 
         self.info_rows: list[tk.Frame] = []
+        self.info_labels: list[tuple[tk.Label, tk.Label]] = []
         for _ in range(3):
             row = tk.Frame(self.info_frame, bg=BG_CARD, height=42)
             row.pack(fill='x', pady=1)
             row.pack_propagate(False)
+            key_lbl = tk.Label(row, text='', bg=BG_CARD, fg=GRAY, font=FONT_XS)
+            key_lbl.place(x=16, rely=0.5, anchor='w')
+            val_lbl = tk.Label(row, text='', bg=BG_CARD, fg=WHITE, font=FONT_S)
+            val_lbl.place(relx=1, x=-16, rely=0.5, anchor='e')
             self.info_rows.append(row)
+            self.info_labels.append((key_lbl, val_lbl))
 
     def _set_info_row(self, idx: int, key: str, value: str, val_color=WHITE):
-        row = self.info_rows[idx]
-        for w in row.winfo_children():
-            w.destroy()
-        tk.Label(row, text=key, bg=BG_CARD, fg=GRAY,
-                 font=FONT_XS).place(x=16, rely=0.5, anchor='w')
-        tk.Label(row, text=value, bg=BG_CARD, fg=val_color,
-                 font=FONT_S).place(relx=1, x=-16, rely=0.5, anchor='e')
+        key_lbl, val_lbl = self.info_labels[idx]
+        self._render(key_lbl, text=key)
+        self._render(val_lbl, text=value, fg=val_color)
 
     def _build_repair_area(self):
         area = tk.Frame(self, bg=BG)
@@ -214,26 +305,67 @@ class App(tk.Tk):
         if self._monitor_job is not None:
             self.after_cancel(self._monitor_job)
             self._monitor_job = None
+        if self._ui_poll_job is not None:
+            self.after_cancel(self._ui_poll_job)
+            self._ui_poll_job = None
+        self._stop_watcher()
+        if self._history is not None:
+            self._history.close()
+            self._history = None
         self.destroy()
 
+    def _record_history(self, configs: list):
+        """把检测结果交给历史记录；record() 只写内存，数据库由后台线程按批写入。"""
+        if self._profile is not None:
+            return
+        if self._history is None:
+            # sqlite3 在首次记录时才导入，不计入启动耗时
+            import dns_history
+            self._history = dns_history.HistoryStore()
+        self._history.record(configs)
+
     def reload_settings(self):
         self.settings = core.get_settings()
         self._schedule_monitor()
         self.refresh(source='settings')
 
     def _schedule_monitor(self):
+        if not self.settings.get('auto_monitor'):
+            self._arm_monitor(None)
+            self._scheduler = None
+            self._stop_watcher()
+            return
+        self._start_watcher()
+        self._scheduler = core.create_scheduler(self.settings)
+        self._arm_monitor(self._scheduler.tighten())
+
+    def _arm_monitor(self, delay):
+        """delay 秒后执行一次后台检测；None 表示取消。检测完成后由 _apply_refresh 重新安排。"""
         if self._monitor_job is not None:
             self.after_cancel(self._monitor_job)
             self._monitor_job = None
-        if not self.settings.get('auto_monitor'):
-            return
-        interval_ms = self.settings.get('monitor_interval', 5) * 60 * 1000
-        self._monitor_job = self.after(interval_ms, self._monitor_tick)
+        if delay is not None:
+            self._monitor_job = self.after(max(1, int(delay * 1000)), self._monitor_tick)
 
     def _monitor_tick(self):
         self._monitor_job = None
         self.refresh(source='monitor')
-        self._schedule_monitor()
+
+    # 网络配置变化时立即检测；系统通知不可用时只依靠上面的定时轮询
+    def _start_watcher(self):
+        if self._watcher is not None:
+            return
+        source = core.create_change_source()
+        if source is None:
+            return
+        self._watcher = core.ChangeWatcher(
+            source, lambda: self._post(self.refresh, 'change')
+        ).start()
+
+    def _stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
 
     # ── 拖动 ──────────────────────────────────────────
     def _drag_start(self, e):
@@ -252,56 +384,96 @@ class App(tk.Tk):
     # ── 数据刷新 ──────────────────────────────────────
     def refresh(self, source='manual'):
         if self._refresh_in_progress:
+            if source == 'change':
+                self._change_pending = True
             return
+        # 后台检测不切换到"检测中"，避免每次监控都让界面闪烁一遍
+        if source not in ('monitor', 'change'):
+            self._render(self.lbl_status, text='检测中...', fg=GRAY)
+            self._render(self.lbl_desc, text='正在扫描网络适配器...', fg=GRAY)
+            self._draw_circle(GRAY, BG_CARD)
+        self._start_refresh(source)
+
+    def _start_refresh(self, source):
         self._refresh_in_progress = True
-        self.lbl_status.config(text='检测中...', fg=GRAY)
-        self.lbl_desc.config(text='正在扫描网络适配器...', fg=GRAY)
-        self._draw_circle(GRAY, BG_CARD)
         threading.Thread(target=self._do_refresh, args=(source,), daemon=True).start()
 
     def _do_refresh(self, source):
+        if source == 'startup':
+            self._mark('probe_start')
+        started = time.monotonic()
         try:
-            adapters = core.get_active_adapters()
-            configs = {a['name']: core.get_dns_config(a['name']) for a in adapters}
+            with core.deadline(REFRESH_DEADLINE):
+                adapters = core.get_active_adapters()
+                configs = {
+                    a['name']: cfg
+                    for a, cfg in zip(adapters, core.get_all_dns_configs(adapters))
+                }
             error = None
+            core.record_refresh(list(configs.values()), time.monotonic() - started)
         except Exception as exc:
             adapters = []
             configs = {}
             error = str(exc)
-        self.after(0, self._apply_refresh, adapters, configs, source, error)
+        if source in ('monitor', 'change'):
+            # 每次后台检测后刷新指标快照，供外部采集
+            try:
+                core.write_metrics()
+            except OSError:
+                pass
+        if source == 'startup':
+            self._mark('probe_done')
+        self._post(self._apply_refresh, adapters, configs, source, error)
 
     def _apply_refresh(self, adapters, configs, source, error=None):
         self._refresh_in_progress = False
+        change_pending, self._change_pending = self._change_pending, False
         self.adapters = adapters
         self.dns_configs = configs
 
         names = [a['name'] for a in adapters]
-        self.adapter_menu['values'] = names
+        if names != self._adapter_names:
+            self.adapter_menu['values'] = names
+            self._adapter_names = names
         if not names:
             self.selected_adapter.set('')
 
         cur = self.selected_adapter.get()
         if not cur or cur not in names:
-            primary = next((a for a in adapters if a['has_gateway']), adapters[0] if adapters else None)
+            primary = core.primary_adapter(adapters)
             if primary:
                 self.selected_adapter.set(primary['name'])
 
         static_adapters = self._update_status(error=error)
+        if not error:
+            self._record_history(list(configs.values()))
+        if self._scheduler is not None:
+            state = ('error', error) if error else core.dns_state_signature(list(configs.values()))
+            self._arm_monitor(self._scheduler.observe(state, event=source == 'change' or change_pending))
         if (
-            source in ('startup', 'monitor')
+            source in ('startup', 'monitor', 'change')
             and self.settings.get('auto_monitor')
             and self.settings.get('auto_repair')
             and static_adapters
             and not self._repair_in_progress
+            and self._profile is None
         ):
             self._start_repair(static_adapters, auto=True)
+        if change_pending:
+            # 变化可能发生在本次读取之后，再检测一次
+            self.refresh('change')
+        if source == 'startup' and self._profile is not None:
+            self.update_idletasks()
+            self._mark('first_result')
+            print(json.dumps(self._profile.report(), ensure_ascii=False), flush=True)
+            self.after(0, self._close_app)
 
     def _update_status(self, error=None):
         if error:
             self._draw_circle(RED, '#2D1A1A')
-            self.lbl_dns_label.config(fg=RED)
-            self.lbl_status.config(text='CHECK_FAILED', fg=RED)
-            self.lbl_desc.config(text='网络状态读取失败', fg=GRAY)
+            self._render(self.lbl_dns_label, fg=RED)
+            self._render(self.lbl_status, text='CHECK_FAILED', fg=RED)
+            self._render(self.lbl_desc, text='网络状态读取失败', fg=GRAY)
             self._set_info_row(0, 'DETAIL', '请以管理员身份重试', RED)
             self._set_info_row(1, 'ERROR', error[:34], GRAY)
             self._set_info_row(2, '', '')
@@ -310,9 +482,9 @@ class App(tk.Tk):
 
         if not self.adapters:
             self._draw_circle(GRAY, BG_CARD)
-            self.lbl_dns_label.config(fg=GRAY)
-            self.lbl_status.config(text='未检测到网络', fg=GRAY)
-            self.lbl_desc.config(text='请检查网络连接', fg=GRAY)
+            self._render(self.lbl_dns_label, fg=GRAY)
+            self._render(self.lbl_status, text='未检测到网络', fg=GRAY)
+            self._render(self.lbl_desc, text='请检查网络连接', fg=GRAY)
             self._set_info_row(0, 'STATUS', '未发现活动适配器', GRAY)
             self._set_info_row(1, '', '')
             self._set_info_row(2, '', '')
@@ -321,20 +493,20 @@ class App(tk.Tk):
 
         static_adapters = [
             a['name'] for a in self.adapters
-            if self.dns_configs.get(a['name'], {}).get('mode') == 'static'
+            if core.dns_mode(self.dns_configs.get(a['name'], {})) == 'static'
         ]
 
         name = self.selected_adapter.get()
         cfg = self.dns_configs.get(name, {})
-        mode = cfg.get('mode', 'unknown')
-        ips = cfg.get('ips', [])
+        mode = core.dns_mode(cfg)
+        ips = core.dns_servers(cfg)
 
         if static_adapters:
             self._draw_circle(RED, '#2D1A1A')
-            self.lbl_dns_label.config(fg=RED)
+            self._render(self.lbl_dns_label, fg=RED)
             count = len(static_adapters)
-            self.lbl_status.config(text='STATIC_DNS', fg=RED)
-            self.lbl_desc.config(text=f'发现 {count} 个适配器 DNS 被修改', fg=GRAY)
+            self._render(self.lbl_status, text='STATIC_DNS', fg=RED)
+            self._render(self.lbl_desc, text=f'发现 {count} 个适配器 DNS 被修改', fg=GRAY)
             self._set_info_row(0, 'AFFECTED', f'{count} adapter(s)', RED)
             if mode == 'static':
                 primary = ips[0] if ips else '—'
@@ -348,13 +520,13 @@ class App(tk.Tk):
             return static_adapters
 
         if mode == 'dhcp' or all(
-            self.dns_configs.get(a['name'], {}).get('mode') == 'dhcp'
+            core.dns_mode(self.dns_configs.get(a['name'], {})) == 'dhcp'
             for a in self.adapters
         ):
             self._draw_circle(TEAL, '#0D2B1F')
-            self.lbl_dns_label.config(fg=TEAL)
-            self.lbl_status.config(text='DHCP_AUTO', fg=TEAL)
-            self.lbl_desc.config(text='所有适配器 DNS 自动获取，正常', fg=GRAY)
+            self._render(self.lbl_dns_label, fg=TEAL)
+            self._render(self.lbl_status, text='DHCP_AUTO', fg=TEAL)
+            self._render(self.lbl_desc, text='所有适配器 DNS 自动获取，正常', fg=GRAY)
             self._set_info_row(0, 'ADAPTER_NAME', name or '—')
             self._set_info_row(1, 'DNS_MODE', '■ 自动获取 (DHCP)', TEAL)
             self._set_info_row(2, '', '')
@@ -362,9 +534,9 @@ class App(tk.Tk):
             return []
 
         self._draw_circle(GRAY, BG_CARD)
-        self.lbl_dns_label.config(fg=GRAY)
-        self.lbl_status.config(text='UNKNOWN', fg=GRAY)
-        self.lbl_desc.config(text='无法检测 DNS 状态', fg=GRAY)
+        self._render(self.lbl_dns_label, fg=GRAY)
+        self._render(self.lbl_status, text='UNKNOWN', fg=GRAY)
+        self._render(self.lbl_desc, text='无法检测 DNS 状态', fg=GRAY)
         self._set_info_row(0, 'ADAPTER_NAME', name or '—')
         self._set_info_row(1, 'DNS_MODE', mode.upper(), GRAY)
         self._set_info_row(2, '', '')
@@ -375,13 +547,13 @@ class App(tk.Tk):
         if static_adapters:
             count = len(static_adapters)
             label = f'⚡  修复全部 ({count} 个适配器)' if count > 1 else '⚡  立即修复 DNS'
-            self.repair_btn.config(bg=ORANGE, fg=BLACK_T, text=label, cursor='hand2')
+            self._render(self.repair_btn, bg=ORANGE, fg=BLACK_T, text=label, cursor='hand2')
             default_note = '⚠  [WARNING] 修复前将自动备份当前配置'
         else:
             label = button_text or '⚡  DNS 状态正常'
-            self.repair_btn.config(bg=BG_ELEV, fg=BG_PH, text=label, cursor='arrow')
+            self._render(self.repair_btn, bg=BG_ELEV, fg=BG_PH, text=label, cursor='arrow')
             default_note = '[OK] 无需修复，网络连接正常'
-        self.note_lbl.config(text=note_text or default_note, fg=note_color if note_text else GRAY)
+        self._render(self.note_lbl, text=note_text or default_note, fg=note_color if note_text else GRAY)
         self._static_adapters = static_adapters
 
     def _on_adapter_change(self, _=None):
@@ -401,35 +573,52 @@ class App(tk.Tk):
         status_text = '自动修复中...' if auto else '修复中...'
         note_text = '[AUTO] 已检测到静态 DNS，正在自动修复' if auto else '⚠  [WARNING] 修复前将自动备份当前配置'
         note_color = TEAL if auto else GRAY
-        self.repair_btn.config(text=status_text, bg=BG_ELEV, fg=GRAY, cursor='arrow')
-        self.note_lbl.config(text=note_text, fg=note_color)
+        self._render(self.repair_btn, text=status_text, bg=BG_ELEV, fg=GRAY, cursor='arrow')
+        self._render(self.note_lbl, text=note_text, fg=note_color)
         flush = self.settings.get('flush_on_repair', True)
+        policy = 'all_or_nothing' if self.settings.get('atomic_repair') else 'best_effort'
         threading.Thread(
             target=self._do_repair,
-            args=(list(targets), flush, auto),
+            args=(list(targets), flush, auto, policy),
             daemon=True
         ).start()
 
-    def _do_repair(self, names: list, flush: bool, auto: bool):
-        results = [
-            core.repair_dns(name, flush=(flush and index == len(names) - 1))
-            for index, name in enumerate(names)
-        ]
-        self.after(0, self._apply_repair, results, auto)
+    def _do_repair(self, names: list, flush: bool, auto: bool, policy: str = 'best_effort'):
+        try:
+            with core.deadline(REPAIR_DEADLINE):
+                outcome = core.repair_transaction(names, flush=flush, policy=policy)
+        except Exception as exc:
+            results = [{'success': False, 'adapter': name, 'error': str(exc)} for name in names]
+            outcome = {'success': False, 'status': 'failed', 'policy': policy, 'results': results, 'rollback': []}
+        self._post(self._apply_repair, outcome, auto)
 
-    def _apply_repair(self, results: list, auto: bool):
+    def _apply_repair(self, outcome: dict, auto: bool):
         self._repair_in_progress = False
+        if self._scheduler is not None:
+            # 修复后一段时间内按最小间隔复查，尽快发现被再次改回静态的 DNS
+            self._arm_monitor(self._scheduler.tighten())
+        results = outcome['results']
         failed = [r for r in results if not r['success']]
-        if not failed:
+        if outcome['status'] in ('rolled_back', 'rollback_failed'):
+            errs = '; '.join(r.get('error', r['adapter']) for r in failed)
+            if outcome['status'] == 'rolled_back':
+                text, color = f'[ROLLBACK] 修复失败（{errs}），全部适配器已恢复修复前的配置', ORANGE
+            else:
+                undone = [r['adapter'] for r in outcome['rollback'] if not r['success']]
+                text, color = f'[ERROR] 修复失败且回滚未完成: {", ".join(undone)}', RED
+            self._render(self.note_lbl, text=text, fg=color)
+            self._render(self.repair_btn, text='⚡  立即修复 DNS', bg=ORANGE, fg=BLACK_T, cursor='hand2')
+            self.refresh(source='post-repair')
+        elif not failed:
             count = len(results)
             prefix = '[AUTO]' if auto else '[OK]'
-            self.note_lbl.config(text=f'{prefix} 修复成功，{count} 个适配器已恢复自动获取', fg=TEAL)
+            self._render(self.note_lbl, text=f'{prefix} 修复成功，{count} 个适配器已恢复自动获取', fg=TEAL)
             self.refresh(source='post-repair')
         else:
             errs = '; '.join(r.get('error', r['adapter']) for r in failed)
             prefix = '自动修复失败' if auto else '部分失败'
-            self.note_lbl.config(text=f'[ERROR] {prefix}: {errs}', fg=RED)
-            self.repair_btn.config(text='⚡  立即修复 DNS', bg=ORANGE, fg=BLACK_T, cursor='hand2')
+            self._render(self.note_lbl, text=f'[ERROR] {prefix}: {errs}', fg=RED)
+            self._render(self.repair_btn, text='⚡  立即修复 DNS', bg=ORANGE, fg=BLACK_T, cursor='hand2')
 
     # ── 子窗口 ────────────────────────────────────────
     def _open_settings(self):
@@ -445,7 +634,7 @@ class SettingsWindow(tk.Toplevel):
         super().__init__(parent)
         self.parent_app = parent
         self.title('设置')
-        self.geometry('400x420')
+        self.geometry('400x460')
         self.resizable(False, False)
         self.configure(bg=BG)
         self.grab_set()
@@ -472,25 +661,30 @@ class SettingsWindow(tk.Toplevel):
         self._section(content, '// MONITOR_OPTIONS')
         self._toggle_row(content, 'auto_monitor', 'auto_monitor', '后台定时检测DNS状态')
 
-        # 间隔选择
+        # 最大间隔选择：状态稳定时检测间隔逐步放宽到这里
         row = tk.Frame(content, bg=BG_CARD)
         row.pack(fill='x', pady=2)
-        tk.Label(row, text='monitor_interval', bg=BG_CARD, fg=WHITE,
+        tk.Label(row, text='max_interval', bg=BG_CARD, fg=WHITE,
                  font=FONT_S, padx=14, pady=10).pack(side='left')
         seg = tk.Frame(row, bg=BG_CARD)
         seg.pack(side='right', padx=14, pady=8)
-        self._vars['monitor_interval'] = tk.IntVar(value=self.settings.get('monitor_interval', 5))
-        for val in core.VALID_MONITOR_INTERVALS:
-            b = tk.Label(seg, text=f'{val}min', bg=BG_ELEV, fg=GRAY,
+        # 变量保存秒数；命令行或手工设置的值不在可选项中时原样列出，未改选就原样保存
+        current = int(self.settings.get('monitor_max_interval', core.DEFAULT_SETTINGS['monitor_max_interval']))
+        self._vars['monitor_max_interval'] = tk.IntVar(value=current)
+        choices = sorted({m * 60 for m in MONITOR_CEILING_CHOICES} | {current})
+        self._interval_btns = {}
+        for val in choices:
+            b = tk.Label(seg, text=_format_interval(val), bg=BG_ELEV, fg=GRAY,
                          font=FONT_XS, padx=10, pady=4, cursor='hand2')
             b.pack(side='left', padx=2)
-            b.bind('<Button-1>', lambda e, v=val, btn=b: self._select_interval(v))
-            if val == self.settings.get('monitor_interval', 5):
+            b.bind('<Button-1>', lambda e, v=val: self._select_interval(v))
+            if val == current:
                 b.config(bg=ORANGE, fg=BLACK_T)
-            setattr(self, f'_interval_btn_{val}', b)
+            self._interval_btns[val] = b
 
         self._toggle_row(content, 'auto_repair', 'auto_repair', '发现异常时自动修复')
         self._toggle_row(content, 'flush_on_repair', 'flush_on_repair', '修复时清除DNS缓存')
+        self._toggle_row(content, 'atomic_repair', 'atomic_repair', '任一适配器失败时全部回滚')
 
         # 保存按钮
         save = tk.Label(content, text='✓  save_settings',
@@ -533,33 +727,47 @@ class SettingsWindow(tk.Toplevel):
         self._draw_toggle(canvas, var.get())
 
     def _select_interval(self, val: int):
-        self._vars['monitor_interval'].set(val)
-        for v in core.VALID_MONITOR_INTERVALS:
-            btn = getattr(self, f'_interval_btn_{v}', None)
-            if btn:
-                btn.config(bg=ORANGE if v == val else BG_ELEV,
-                           fg=BLACK_T if v == val else GRAY)
+        self._vars['monitor_max_interval'].set(val)
+        for v, btn in self._interval_btns.items():
+            btn.config(bg=ORANGE if v == val else BG_ELEV,
+                       fg=BLACK_T if v == val else GRAY)
 
     def _save(self, _=None):
         s = dict(self.settings)
-        for key in ('auto_monitor', 'auto_repair', 'flush_on_repair'):
+        for key in ('auto_monitor', 'auto_repair', 'flush_on_repair', 'atomic_repair'):
             if key in self._vars:
                 s[key] = bool(self._vars[key].get())
-        s['monitor_interval'] = self._vars['monitor_interval'].get()
+        s['monitor_max_interval'] = self._vars['monitor_max_interval'].get()
         core.save_settings(s)
         self.parent_app.reload_settings()
         self.destroy()
 
 
+def _format_interval(seconds: int) -> str:
+    return f'{seconds // 60}min' if seconds % 60 == 0 else f'{seconds}s'
+
+
 # ── 日志窗口 ──────────────────────────────────────────
 class LogWindow(tk.Toplevel):
+    # 筛选按钮依次切换的取值：(显示文字, get_logs 参数值)
+    ACTION_FILTERS = (('全部操作', None), ('REPAIR', 'repair'), ('ROLLBACK', 'rollback'))
+    RESULT_FILTERS = (('全部结果', None), ('OK', True), ('FAIL', False))
+    ALL_ADAPTERS = '全部适配器'
+
     def __init__(self, parent):
         super().__init__(parent)
+        self.parent_app = parent
         self.title('操作日志')
-        self.geometry('480x400')
+        self.geometry('480x430')
         self.resizable(False, False)
         self.configure(bg=BG)
         self.grab_set()
+        self._filters = {'adapter': None, 'action': None, 'success': None}
+        self._generation = 0      # 筛选条件变化或清除后递增，丢弃过期的查询结果
+        self._cursor = None       # 已显示的最后一条记录的 seq
+        self._exhausted = False
+        self._loading = False
+        self._rows = 0
         self._build()
 
     def _build(self):
@@ -582,55 +790,141 @@ class LogWindow(tk.Toplevel):
         close.pack(side='left')
         close.bind('<Button-1>', lambda e: self.destroy())
 
+        # 筛选
+        filters = tk.Frame(self, bg=BG)
+        filters.pack(fill='x', padx=12, pady=(8, 0))
+
+        self._adapter_var = tk.StringVar(value=self.ALL_ADAPTERS)
+        names = [a['name'] for a in getattr(self.parent_app, 'adapters', [])]
+        adapter_menu = ttk.Combobox(filters, textvariable=self._adapter_var, state='readonly',
+                                    values=[self.ALL_ADAPTERS, *names], font=FONT_XS, width=22)
+        adapter_menu.pack(side='left')
+        adapter_menu.bind('<<ComboboxSelected>>', self._on_adapter_filter)
+
+        self._action_btn = self._filter_button(filters, 'action', self.ACTION_FILTERS)
+        self._result_btn = self._filter_button(filters, 'success', self.RESULT_FILTERS)
+
         # 日志列表
         frame = tk.Frame(self, bg=BG)
         frame.pack(fill='both', expand=True, padx=12, pady=8)
 
-        scrollbar = tk.Scrollbar(frame, bg=BG_CARD, troughcolor=BG)
-        scrollbar.pack(side='right', fill='y')
+        self._scrollbar = tk.Scrollbar(frame, bg=BG_CARD, troughcolor=BG)
+        self._scrollbar.pack(side='right', fill='y')
 
         self.listbox = tk.Listbox(
             frame, bg=BG_CARD, fg=WHITE, font=FONT_XS,
             selectbackground=BG_ELEV, relief='flat', bd=0,
-            yscrollcommand=scrollbar.set, activestyle='none'
+            yscrollcommand=self._on_scroll, activestyle='none'
         )
         self.listbox.pack(fill='both', expand=True)
-        scrollbar.config(command=self.listbox.yview)
+        self._scrollbar.config(command=self.listbox.yview)
+
+        self._reload()
+
+    def _filter_button(self, parent, key, choices):
+        btn = tk.Label(parent, text=choices[0][0], bg=BG_ELEV, fg=GRAY,
+                       font=FONT_XS, padx=10, pady=4, cursor='hand2')
+        btn.pack(side='right', padx=(4, 0))
+        btn.bind('<Button-1>', lambda e: self._cycle_filter(btn, key, choices))
+        return btn
+
+    def _cycle_filter(self, btn, key, choices):
+        values = [value for _, value in choices]
+        label, value = choices[(values.index(self._filters[key]) + 1) % len(choices)]
+        self._filters[key] = value
+        btn.config(text=label, fg=GRAY if value is None else WHITE)
+        self._reload()
+
+    def _on_adapter_filter(self, _=None):
+        name = self._adapter_var.get()
+        self._filters['adapter'] = None if name == self.ALL_ADAPTERS else name
+        self._reload()
+
+    # ── 分页加载 ──────────────────────────────────────
+    def _reload(self):
+        """清空列表并从最新一页重新读取；之前尚未返回的查询结果会被丢弃。"""
+        self._generation += 1
+        self._cursor = None
+        self._exhausted = False
+        self._loading = False
+        self._rows = 0
+        self.listbox.delete(0, 'end')
+        self._fetch_next()
 
-        self._load_logs()
+    def _fetch_next(self):
+        if self._loading or self._exhausted:
+            return
+        self._loading = True
+        query = dict(self._filters, limit=LOG_PAGE_SIZE, before=self._cursor)
+        threading.Thread(target=self._query, args=(self._generation, query), daemon=True).start()
 
-    def _load_logs(self):
-        self.listbox.delete(0, 'end')
-        logs = core.get_logs()
-        if not logs:
-            self.listbox.insert('end', '  // 暂无操作记录')
-            self.listbox.itemconfig(0, fg=GRAY)
+    def _query(self, generation: int, query: dict):
+        try:
+            page, error = core.get_logs(**query), None
+        except Exception as exc:
+            page, error = [], str(exc)
+        self.parent_app._post(self._show_page, generation, page, error)
+
+    def _show_page(self, generation: int, page: list, error: str = None):
+        if generation != self._generation or not self.winfo_exists():
             return
-        for entry in logs:
-            action = entry.get('action', '').upper()
-            adapter = entry.get('adapter', '')
-            ts = entry.get('ts', '')
-            success = entry.get('success', False)
-            before_ips = entry.get('before_ips', [])
-            ip_str = before_ips[0] if before_ips else ''
-            after_mode = entry.get('after_mode') or 'unknown'
-            status = 'OK' if success else 'FAIL'
-            color = TEAL if success else RED
-            target = {'dhcp': 'DHCP', 'static': 'STATIC'}.get(after_mode, 'UNKNOWN')
-            source = ip_str or entry.get('before_mode', 'unknown').upper()
-            text = f'  [{action}] {adapter}  {source}→{target}  {status}  {ts}'
-            self.listbox.insert('end', text)
-            self.listbox.itemconfig('end', fg=color)
+        self._loading = False
+        self._exhausted = error is not None or len(page) < LOG_PAGE_SIZE
+        if error is not None:
+            self._append_row(f'  // 日志读取失败: {error}', RED)
+        elif not page and not self._rows:
+            filtered = any(v is not None for v in self._filters.values())
+            self._append_row('  // 没有匹配的记录' if filtered else '  // 暂无操作记录', GRAY)
+        for entry in page:
+            self._append_row(*_format_log_row(entry))
+        if page:
+            self._cursor = page[-1]['seq']
+        # 第一页不足一屏时 yscrollcommand 不一定触发，这里补一次检查
+        self._on_scroll(*self.listbox.yview())
+
+    def _append_row(self, text: str, color: str):
+        self.listbox.insert('end', text)
+        self.listbox.itemconfig('end', fg=color)
+        self._rows += 1
+
+    def _on_scroll(self, first, last):
+        self._scrollbar.set(first, last)
+        hidden_below = (1.0 - float(last)) * self._rows
+        if hidden_below < LOG_PREFETCH_ROWS:
+            self._fetch_next()
 
     def _clear(self, _=None):
         if messagebox.askyesno('确认', '清除所有日志记录？', parent=self):
             core.clear_logs()
-            self._load_logs()
+            self._reload()
+
+
+def _format_log_row(entry: dict) -> tuple[str, str]:
+    """把一条日志格式化为列表中的一行，返回 (文字, 颜色)；只在该行所在的页被读取时调用。"""
+    action = entry.get('action', '').upper()
+    adapter = entry.get('adapter', '')
+    ts = entry.get('ts', '')
+    success = entry.get('success', False)
+    before_ips = entry.get('before_ips', [])
+    ip_str = before_ips[0] if before_ips else ''
+    after_mode = entry.get('after_mode') or 'unknown'
+    status = 'OK' if success else 'FAIL'
+    color = TEAL if success else RED
+    target = {'dhcp': 'DHCP', 'static': 'STATIC'}.get(after_mode, 'UNKNOWN')
+    source = ip_str or entry.get('before_mode', 'unknown').upper()
+    settle = f'  {entry["settle_ms"]:.0f}ms' if entry.get('settle_ms') is not None else ''
+    return f'  [{action}] {adapter}  {source}→{target}  {status}{settle}  {ts}', color
 
 
 # ── 入口 ──────────────────────────────────────────────
 if __name__ == '__main__':
-    if not core.is_admin():
+    profile = None
+    if '--startup-profile' in sys.argv[1:]:
+        # 测量模式只读取状态，不提权、不修改任何配置
+        profile = StartupProfile()
+        profile.mark('tk_imported', _T_TK)
+        profile.mark('core_imported', _T_IMPORTED)
+    elif not core.is_admin():
         core.relaunch_as_admin()
-    app = App()
+    app = App(profile=profile)
     app.mainloop()
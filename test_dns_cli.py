@@ -0,0 +1,131 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+import dns_cli
+
+ADAPTERS = [
+    {'name': 'Ethernet', 'type': 'ethernet', 'has_gateway': True},
+    {'name': 'Wi-Fi', 'type': 'wifi', 'has_gateway': False},
+]
+
+
+class DnsCliTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        dns_cli.core.configure(data_dir=self.tempdir.name)
+        self.addCleanup(dns_cli.core.configure, None)
+
+    def _run(self, *argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = dns_cli.main(list(argv))
+        return code, out.getvalue()
+
+    def _patch_state(self, modes):
+        configs = [
+            {'adapter': a['name'], 'mode': mode, 'ips': ['1.1.1.1'] if mode == 'static' else []}
+            for a, mode in zip(ADAPTERS, modes)
+        ]
+        for target, value in (('get_active_adapters', ADAPTERS), ('get_all_dns_configs', configs)):
+            patcher = patch(f'dns_cli.core.{target}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_check_json_reports_static_adapters_and_exit_code(self):
+        self._patch_state(['dhcp', 'static'])
+
+        code, out = self._run('check', '--json')
+
+        state = json.loads(out)
+        self.assertEqual(code, dns_cli.EXIT_STATIC)
+        self.assertEqual(state['status'], 'static')
+        self.assertEqual(state['static'], ['Wi-Fi'])
+        self.assertEqual(state['adapters'][1]['ips'], ['1.1.1.1'])
+
+    def test_check_returns_ok_when_all_adapters_use_dhcp(self):
+        self._patch_state(['dhcp', 'dhcp'])
+
+        code, _ = self._run('check')
+
+        self.assertEqual(code, dns_cli.EXIT_OK)
+
+    def test_repair_defaults_to_all_static_adapters(self):
+        self._patch_state(['static', 'dhcp'])
+        with patch('dns_cli.core.repair_many', return_value=[
+            {'success': False, 'adapter': 'Ethernet', 'error': 'boom'},
+        ]) as repair_many, patch('dns_cli.core.get_settings', return_value={'flush_on_repair': True}):
+            code, out = self._run('repair', '--no-flush')
+
+        repair_many.assert_called_once_with(['Ethernet'], flush=False)
+        self.assertEqual(code, dns_cli.EXIT_FAILED)
+        self.assertIn('[FAIL] Ethernet: boom', out)
+
+    def test_rollback_selects_backups_by_timestamp(self):
+        backups = [
+            {'ts': '2025-01-01 10:00:00', 'adapter': 'Ethernet', 'mode': 'static', 'ips': ['1.1.1.1']},
+            {'ts': '2025-01-01 11:00:00', 'adapter': 'Ethernet', 'mode': 'static', 'ips': ['8.8.8.8']},
+            {'ts': '2025-01-01 11:00:00', 'adapter': 'Wi-Fi', 'mode': 'dhcp', 'ips': []},
+        ]
+        with patch('dns_cli.core.get_backups', return_value=backups), \
+             patch('dns_cli.core.rollback', side_effect=lambda b: {'success': True, 'adapter': b['adapter']}) as rollback:
+            code, _ = self._run('rollback', '--ts', '2025-01-01 11:00:00', '--adapter', 'Ethernet')
+
+        self.assertEqual(code, dns_cli.EXIT_OK)
+        rollback.assert_called_once_with(backups[1])
+
+    def test_monitor_emits_one_json_line_per_tick(self):
+        self._patch_state(['dhcp', 'dhcp'])
+        with patch('dns_cli.core.create_change_source') as create_source:
+            code, out = self._run('monitor', '--interval', '0.01', '--count', '3')
+
+        self.assertEqual(code, dns_cli.EXIT_OK)
+        self.assertEqual(len(out.strip().splitlines()), 3)
+        self.assertEqual(create_source.return_value.wait.call_count, 2)
+
+    def test_monitor_writes_metrics_snapshot_each_tick(self):
+        self._patch_state(['dhcp', 'static'])
+        dns_cli.core.reset_metrics()
+        self.addCleanup(dns_cli.core.reset_metrics)
+        with patch('dns_cli.core.create_change_source'):
+            self._run('monitor', '--interval', '0.01', '--count', '2')
+
+        with open(os.path.join(self.tempdir.name, 'metrics.json'), 'r', encoding='utf-8') as handle:
+            snapshot = json.load(handle)
+        with open(os.path.join(self.tempdir.name, 'metrics.prom'), 'r', encoding='utf-8') as handle:
+            prom = handle.read()
+        self.assertEqual(snapshot['metrics']['refresh_total'], 2)
+        self.assertEqual(snapshot['metrics']['adapters_probed_total'], 4)
+        self.assertEqual(snapshot['metrics']['static_dns_detections_total'], {'Wi-Fi': 2})
+        self.assertIn('repairdns_static_dns_detections_total{adapter="Wi-Fi"} 2\n', prom)
+
+    def test_monitor_records_state_history(self):
+        self._patch_state(['dhcp', 'static'])
+        with patch('dns_cli.core.create_change_source'):
+            self._run('monitor', '--interval', '0.01', '--count', '3')
+
+        code, out = self._run('history', '--json')
+
+        self.assertEqual(code, dns_cli.EXIT_OK)
+        self.assertEqual([(r['adapter'], r['servers'], r['occurrences'], r['samples']) for r in json.loads(out)],
+                         [('Wi-Fi', ['1.1.1.1'], 1, 3)])
+
+    def test_cli_does_not_import_tkinter_or_sqlite(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        result = subprocess.run(
+            [sys.executable, '-c', 'import sys, dns_cli; print("tkinter" in sys.modules, "sqlite3" in sys.modules)'],
+            cwd=here, capture_output=True, text=True,
+        )
+
+        self.assertEqual(result.stdout.strip(), 'False False')
+
+
+if __name__ == '__main__':
+    unittest.main()
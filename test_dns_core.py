@@ -1,38 +1,429 @@
+import asyncio
+import itertools
+import json
 import os
+import random
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import call, patch
 
 import dns_core
 
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+FAKE_NETSH = [sys.executable, os.path.join(FIXTURES, 'fake_netsh.py')]
+
+
+def fake_netsh_module():
+    sys.path.insert(0, FIXTURES)
+    try:
+        import fake_netsh
+    finally:
+        sys.path.remove(FIXTURES)
+    return fake_netsh
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as handle:
+        return handle.read()
+
 
 class DnsCoreTests(unittest.TestCase):
     def setUp(self):
         self.tempdir = tempfile.TemporaryDirectory()
         self.addCleanup(self.tempdir.cleanup)
 
-        self.original_backup_file = dns_core.BACKUP_FILE
-        self.original_log_file = dns_core.LOG_FILE
-        self.original_settings_file = dns_core.SETTINGS_FILE
-        self.addCleanup(self._restore_paths)
-
-        dns_core.BACKUP_FILE = os.path.join(self.tempdir.name, 'backups.json')
-        dns_core.LOG_FILE = os.path.join(self.tempdir.name, 'log.json')
-        dns_core.SETTINGS_FILE = os.path.join(self.tempdir.name, 'settings.json')
-
-    def _restore_paths(self):
-        dns_core.BACKUP_FILE = self.original_backup_file
-        dns_core.LOG_FILE = self.original_log_file
-        dns_core.SETTINGS_FILE = self.original_settings_file
+        dns_core.configure(data_dir=self.tempdir.name)
+        self.addCleanup(dns_core.configure, None)
 
     def test_run_raises_on_nonzero_exit_code(self):
         completed = unittest.mock.Mock(returncode=1, stdout=b'', stderr='boom'.encode('utf-8'))
-        with patch('dns_core.subprocess.run', return_value=completed):
+        with patch('dns_core._spawn', return_value=completed):
             with self.assertRaises(dns_core.CommandError) as ctx:
                 dns_core.run(['netsh', 'interface', 'show', 'interface'])
 
         self.assertIn('boom', str(ctx.exception))
 
+    def test_get_all_dns_configs_probes_concurrently_and_keeps_adapter_order(self):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def fake_get_dns_config(name):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.05 if name == 'A' else 0.01)
+            with lock:
+                state['active'] -= 1
+            if name == 'B':
+                raise RuntimeError('netsh 崩溃')
+            return {'adapter': name, 'mode': 'dhcp', 'ips': []}
+
+        adapters = [{'name': 'A'}, {'name': 'B'}, {'name': 'C'}]
+        with patch('dns_core.get_dns_config', side_effect=fake_get_dns_config):
+            results = dns_core.get_all_dns_configs(adapters, max_workers=3, bulk=False)
+
+        self.assertEqual([r['adapter'] for r in results], ['A', 'B', 'C'])
+        self.assertEqual(results[0]['mode'], 'dhcp')
+        self.assertEqual(results[1]['mode'], 'unknown')
+        self.assertIn('netsh 崩溃', results[1]['error'])
+        self.assertEqual(results[2]['mode'], 'dhcp')
+        self.assertGreater(state['peak'], 1)
+
+    def test_bulk_parser_splits_english_sections(self):
+        configs = dns_core._parse_netsh_bulk(read_fixture('netsh_show_config_en.txt'))
+
+        self.assertEqual(list(configs), [
+            'Ethernet', 'Wi-Fi', 'OpenVPN TAP-Windows6',
+            'vEthernet (Default Switch)', 'Loopback Pseudo-Interface 1',
+        ])
+        self.assertEqual(configs['Ethernet']['mode'], 'dhcp')
+        self.assertEqual(configs['Ethernet']['ips'], ['192.168.1.1'])
+        self.assertEqual(configs['Wi-Fi']['mode'], 'static')
+        self.assertEqual(configs['Wi-Fi']['ips'], ['198.18.0.2', '8.8.8.8'])
+        self.assertEqual(configs['OpenVPN TAP-Windows6']['ips'], [])
+
+    def test_bulk_parser_matches_per_adapter_parser(self):
+        cases = [
+            ('netsh_show_config_en.txt', 'netsh_show_config_en_wifi.txt', 'Wi-Fi'),
+            ('netsh_show_config_zh.txt', 'netsh_show_config_zh_wlan.txt', 'WLAN'),
+        ]
+        for bulk_fixture, single_fixture, name in cases:
+            with self.subTest(fixture=bulk_fixture):
+                bulk = dns_core._parse_netsh_bulk(read_fixture(bulk_fixture))[name]
+                single = dns_core._parse_netsh(read_fixture(single_fixture), name)
+                self.assertEqual((bulk['mode'], bulk['ips']), (single['mode'], single['ips']))
+                self.assertEqual(bulk['raw'].strip(), single['raw'].strip())
+
+    def test_iter_netsh_configs_streams_sections_before_input_ends(self):
+        lines = read_fixture('netsh_show_config_en.txt').splitlines()
+
+        def feed():
+            yield from lines[:25]
+            raise AssertionError('parser read past the second section')
+
+        configs = dns_core.iter_netsh_configs(feed())
+        first = next(configs)
+
+        self.assertEqual((first['adapter'], first['mode']), ('Ethernet', 'dhcp'))
+
+    def test_parser_locks_locale_from_first_recognisable_line(self):
+        output = (
+            'Configuration for interface "以太网"\n'
+            '    Statically Configured DNS Servers:    1.1.1.1\n'
+            '                                          9.9.9.9\n'
+            '    Register with which suffix:           Primary only\n'
+        )
+        config = dns_core._parse_netsh_bulk(output)['以太网']
+
+        self.assertEqual(config['mode'], 'static')
+        self.assertEqual(config['ips'], ['1.1.1.1', '9.9.9.9'])
+
+    def test_get_all_dns_configs_uses_single_bulk_call(self):
+        output = read_fixture('netsh_show_config_zh.txt')
+        with patch('dns_core.run', return_value=output) as run_cmd, \
+             patch('dns_core.get_dns_config') as single:
+            results = dns_core.get_all_dns_configs(['WLAN', '以太网', '以太网 2'])
+
+        run_cmd.assert_called_once()
+        self.assertEqual(run_cmd.call_args.args[0][:2], ['netsh', '-f'])
+        single.assert_not_called()
+        self.assertEqual([r['mode'] for r in results], ['static', 'dhcp', 'dhcp'])
+        self.assertEqual(results[0]['ips'], ['198.18.0.2', '114.114.114.114'])
+
+    def test_get_all_dns_configs_falls_back_for_adapters_missing_from_bulk_output(self):
+        output = read_fixture('netsh_show_config_en.txt')
+        fallback = {'adapter': 'Bluetooth', 'mode': 'unknown', 'ips': []}
+        with patch('dns_core.run', return_value=output), \
+             patch('dns_core.get_dns_config', return_value=fallback) as single:
+            results = dns_core.get_all_dns_configs(['Ethernet', 'Bluetooth'])
+
+        single.assert_called_once_with('Bluetooth')
+        self.assertEqual([r['adapter'] for r in results], ['Ethernet', 'Bluetooth'])
+
+    def test_dual_stack_probe_splits_ipv4_and_ipv6_sections(self):
+        ipv6 = (
+            '\nConfiguration for interface "Ethernet"\n'
+            '    DNS servers configured through DHCP:  fe80::1%12\n'
+            '    Register with which suffix:           Primary only\n'
+            '\nConfiguration for interface "Wi-Fi"\n'
+            '    Statically Configured DNS Servers:    2606:4700:4700::1111\n'
+            '                                          2001:4860:4860::8888\n'
+            '    Register with which suffix:           Primary only\n'
+        )
+        output = read_fixture('netsh_show_config_en.txt') + ipv6
+        with patch('dns_core.run', return_value=output) as run_cmd:
+            configs = dns_core.get_all_dns_configs(['Ethernet', 'Wi-Fi', 'OpenVPN TAP-Windows6'])
+
+        run_cmd.assert_called_once()
+        ethernet, wifi, vpn = configs
+        self.assertEqual((ethernet['mode'], ethernet['ipv6']), ('dhcp', {'mode': 'dhcp', 'ips': ['fe80::1%12']}))
+        self.assertEqual(wifi['ips'], ['198.18.0.2', '8.8.8.8'])
+        self.assertEqual(wifi['ipv6'], {'mode': 'static', 'ips': ['2606:4700:4700::1111', '2001:4860:4860::8888']})
+        self.assertNotIn('ipv6', vpn)
+        self.assertEqual(dns_core.dns_mode({'mode': 'dhcp', 'ipv6': wifi['ipv6']}), 'static')
+
+    def test_repair_resets_static_ipv6_dns_and_verifies_both_families(self):
+        session = dns_core.enable_netsh_session(
+            argv=FAKE_NETSH + ['--adapters', 'Ethernet=dhcp:10.0.0.1|static:2001:db8::53'])
+        self.addCleanup(dns_core.enable_netsh_session, False)
+
+        before = dns_core.get_dns_config('Ethernet')
+        result = dns_core.repair_dns('Ethernet', flush=False)
+        after = dns_core.get_dns_config('Ethernet')
+
+        self.assertEqual(dns_core.dns_mode(before), 'static')
+        self.assertEqual(result, {'success': True, 'adapter': 'Ethernet'})
+        self.assertEqual(after['ipv6'], {'mode': 'dhcp', 'ips': []})
+        self.assertEqual(session.starts, 1)
+        backup = dns_core.get_backups()[-1]
+        self.assertEqual(backup['ipv6'], {'mode': 'static', 'ips': ['2001:db8::53']})
+        self.assertTrue(dns_core.rollback(backup)['success'])
+        self.assertEqual(dns_core.get_dns_config('Ethernet')['ipv6']['ips'], ['2001:db8::53'])
+
+    def _start_session(self, adapters):
+        session = dns_core.NetshSession(FAKE_NETSH + ['--adapters', adapters], timeout=10)
+        self.addCleanup(session.close)
+        return session
+
+    def test_netsh_session_reuses_one_process_for_many_commands(self):
+        session = self._start_session('Ethernet=dhcp:192.168.1.1;Wi-Fi 2=static:1.1.1.1,8.8.8.8')
+
+        first = session.execute(['interface', 'ip', 'show', 'config', 'Wi-Fi 2'])
+        session.execute(['interface', 'ip', 'set', 'dns', 'Wi-Fi 2', 'dhcp'])
+        after = session.execute(['interface', 'ip', 'show', 'config', 'Wi-Fi 2'])
+
+        self.assertEqual(session.starts, 1)
+        self.assertEqual(dns_core._parse_netsh(first, 'Wi-Fi 2')['ips'], ['1.1.1.1', '8.8.8.8'])
+        self.assertEqual(dns_core._parse_netsh(after, 'Wi-Fi 2')['mode'], 'dhcp')
+        self.assertNotIn('netsh>', after)
+        self.assertNotIn('__repairdns_', after)
+
+    def test_netsh_session_restarts_when_process_dies(self):
+        session = self._start_session('Ethernet=static:9.9.9.9')
+        session.execute(['interface', 'show', 'interface'])
+
+        session._proc.stdin.write(b'crash\n')
+        session._proc.stdin.flush()
+        session._proc.wait(timeout=5)
+        output = session.execute(['interface', 'ip', 'show', 'config', 'Ethernet'])
+
+        self.assertEqual(session.starts, 2)
+        self.assertEqual(dns_core._parse_netsh(output, 'Ethernet')['mode'], 'static')
+
+    def test_run_routes_netsh_commands_through_enabled_session(self):
+        dns_core.enable_netsh_session(argv=FAKE_NETSH + ['--adapters', 'Ethernet=dhcp:10.0.0.1'])
+        self.addCleanup(dns_core.enable_netsh_session, False)
+
+        with patch('dns_core._spawn') as spawn:
+            configs = dns_core.get_all_dns_configs(['Ethernet'])
+
+        spawn.assert_not_called()
+        self.assertEqual(configs[0]['mode'], 'dhcp')
+        self.assertEqual(configs[0]['ips'], ['10.0.0.1'])
+
+    def test_run_timeout_kills_the_whole_process_tree(self):
+        pid_file = os.path.join(self.tempdir.name, 'child.pid')
+        script = (
+            'import subprocess, sys, time\n'
+            'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+            f'open({pid_file!r}, "w").write(str(child.pid))\n'
+            'time.sleep(30)\n'
+        )
+        dns_core.reset_latency_stats()
+
+        started = time.monotonic()
+        with self.assertRaises(dns_core.CommandTimeout):
+            dns_core.run([sys.executable, '-c', script], timeout=1.0)
+
+        self.assertLess(time.monotonic() - started, 5)
+        stats = dns_core.get_latency_stats()[dns_core._command_verb(sys.executable)]
+        self.assertEqual((stats['count'], stats['timeouts']), (1, 1))
+        if os.path.isdir('/proc'):
+            with open(pid_file, 'r') as handle:
+                child = int(handle.read())
+            time.sleep(0.2)
+            try:
+                with open(f'/proc/{child}/stat', 'r') as handle:
+                    state = handle.read().rsplit(')', 1)[1].split()[0]
+            except FileNotFoundError:
+                state = 'gone'
+            self.assertIn(state, ('gone', 'Z'))
+
+    def test_deadline_bounds_a_sequence_of_commands(self):
+        slow = [sys.executable, '-c', 'import time; time.sleep(10)']
+
+        started = time.monotonic()
+        with dns_core.deadline(0.5):
+            with self.assertRaises(dns_core.CommandTimeout):
+                dns_core.run(slow)
+            with patch('dns_core._spawn') as spawn, self.assertRaises(dns_core.CommandTimeout):
+                dns_core.run(slow)
+
+        self.assertLess(time.monotonic() - started, 3)
+        spawn.assert_not_called()
+
+    def test_latency_histogram_percentiles(self):
+        histogram = dns_core.LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.observe(ms)
+
+        summary = histogram.summary()
+
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual((summary['p50_ms'], summary['p95_ms'], summary['p99_ms']), (50.0, 95.0, 99.0))
+        self.assertEqual(summary['max_ms'], 100.0)
+
+    def test_metrics_count_repairs_verification_failures_and_spawns(self):
+        dns_core.reset_metrics()
+        self.addCleanup(dns_core.reset_metrics)
+        configs = [
+            {'adapter': 'Ethernet', 'mode': 'static', 'ips': ['1.1.1.1']},
+            {'adapter': 'Ethernet', 'mode': 'static', 'ips': ['1.1.1.1']},
+            {'adapter': 'Wi-Fi', 'mode': 'static', 'ips': ['1.1.1.1']},
+            {'adapter': 'Wi-Fi', 'mode': 'dhcp', 'ips': []},
+        ]
+        wifi = iter(configs[2:])
+        # Ethernet 一直是静态（校验超时失败），Wi-Fi 第二次读取即生效
+        with patch('dns_core.get_dns_config', side_effect=lambda name: configs[0] if name == 'Ethernet' else next(wifi)), \
+             patch('dns_core.run', return_value='ok'), \
+             patch('dns_core.VERIFY_TIMEOUT', 0.2):
+            dns_core.repair_dns('Ethernet', flush=False)
+            dns_core.repair_dns('Wi-Fi', flush=False)
+        dns_core.run([sys.executable, '-c', 'pass'])
+        dns_core.record_refresh(configs[:3], 0.5)
+
+        metrics = dns_core.get_metrics()['metrics']
+        self.assertEqual(metrics['repair_attempts_total'], 2)
+        self.assertEqual(metrics['repair_success_total'], 1)
+        self.assertEqual(metrics['repair_failure_total'], 1)
+        self.assertEqual(metrics['verification_failures_total'], 1)
+        self.assertEqual(metrics['static_dns_detections_total'], {'Ethernet': 2, 'Wi-Fi': 1})
+        self.assertEqual(metrics['subprocess_spawns_total'], {dns_core._command_verb(sys.executable): 1})
+
+        json_path, prom_path = dns_core.write_metrics()
+        self.assertEqual(os.path.dirname(json_path), self.tempdir.name)
+        with open(prom_path, 'r', encoding='utf-8') as handle:
+            prom = handle.read()
+        self.assertIn('# TYPE repairdns_repair_failure_total counter\nrepairdns_repair_failure_total 1\n', prom)
+        self.assertIn('repairdns_refresh_seconds_total 0.5\n', prom)
+        self.assertIn('repairdns_command_duration_milliseconds_count{command=', prom)
+        self.assertEqual([f for f in os.listdir(self.tempdir.name) if f.endswith('.tmp')], [])
+
+    def _routing_run(self, calls, interfaces='Ethernet;Wi-Fi;OpenVPN TAP-Windows6'):
+        show_interface = fake_netsh_module().render_show_interface(
+            [{'name': name} for name in interfaces.split(';')])
+
+        def fake_run(cmd, check=True):
+            calls.append(' '.join(cmd))
+            if cmd[2:4] == ['show', 'interface']:
+                return show_interface
+            if cmd[4] == 'interfaces':
+                return read_fixture('netsh_show_interfaces_en.txt')
+            return read_fixture('netsh_show_route_en.txt')
+        return fake_run
+
+    def test_default_routes_are_joined_to_adapters_by_interface_index(self):
+        dns_core.notify_network_change()
+        calls = []
+        with patch('dns_core.run', side_effect=self._routing_run(calls)):
+            adapters = dns_core.get_active_adapters()
+
+        by_name = {a['name']: a for a in adapters}
+        self.assertEqual((by_name['Ethernet']['index'], by_name['Ethernet']['route_metric']), (12, 25))
+        self.assertEqual(by_name['Ethernet']['gateway'], '10.20.0.1')
+        self.assertEqual((by_name['Wi-Fi']['index'], by_name['Wi-Fi']['route_metric']), (17, 35))
+        self.assertEqual(by_name['OpenVPN TAP-Windows6']['index'], 23)
+        self.assertFalse(by_name['OpenVPN TAP-Windows6']['has_gateway'])
+        self.assertEqual(dns_core.primary_adapter(adapters)['name'], 'Ethernet')
+        self.assertNotIn('route print', ' | '.join(calls))
+
+    def test_routing_is_cached_until_the_network_changes(self):
+        dns_core.notify_network_change()
+        calls = []
+        with patch('dns_core.run', side_effect=self._routing_run(calls)):
+            dns_core.get_active_adapters()
+            dns_core.get_active_adapters()
+            self.assertEqual(len(calls), 4)
+
+            dns_core.notify_network_change()
+            dns_core.get_active_adapters()
+            self.assertEqual(len(calls), 7)
+
+        # 路由表里已有的适配器直接用缓存，新出现的适配器会触发重新读取
+        with patch('dns_core.run', side_effect=self._routing_run(calls, 'Ethernet;vEthernet (Default Switch)')):
+            self.assertEqual(dns_core.get_active_adapters()[1]['index'], 31)
+        self.assertEqual(len(calls), 8)
+        with patch('dns_core.run', side_effect=self._routing_run(calls, 'Ethernet;Ethernet 2')):
+            adapters = dns_core.get_active_adapters()
+        self.assertEqual(len(calls), 11)
+        self.assertIsNone(adapters[1]['index'])
+
+    def test_async_routing_is_cached_until_a_new_adapter_appears(self):
+        dns_core.notify_network_change()
+        calls = []
+
+        def async_runner(interfaces):
+            fake_run = self._routing_run(calls, interfaces)
+
+            async def fake_async_run(cmd, check=True, timeout=None):
+                return fake_run(cmd, check)
+            return patch('dns_core.async_run', side_effect=fake_async_run)
+
+        with async_runner('Ethernet;Wi-Fi;OpenVPN TAP-Windows6'):
+            asyncio.run(dns_core.async_get_active_adapters())
+            asyncio.run(dns_core.async_get_active_adapters())
+        self.assertEqual(len(calls), 4)
+
+        # 路由表里已有的适配器直接用缓存，新出现的适配器会触发重新读取
+        with async_runner('Ethernet;vEthernet (Default Switch)'):
+            self.assertEqual(asyncio.run(dns_core.async_get_active_adapters())[1]['index'], 31)
+        self.assertEqual(len(calls), 5)
+        with async_runner('Ethernet;Ethernet 2'):
+            adapters = asyncio.run(dns_core.async_get_active_adapters())
+        self.assertEqual(len(calls), 8)
+        self.assertIsNone(adapters[1]['index'])
+
+    def test_primary_adapter_falls_back_to_first_without_default_routes(self):
+        adapters = [{'name': 'A', 'has_gateway': False}, {'name': 'B', 'has_gateway': False}]
+        self.assertEqual(dns_core.primary_adapter(adapters)['name'], 'A')
+        self.assertIsNone(dns_core.primary_adapter([]))
+
+    def test_change_watcher_reports_pipe_events_within_a_second(self):
+        read_fd, write_fd = os.pipe()
+        fired = []
+        event = threading.Event()
+        source = dns_core.PipeChangeSource(os.fdopen(read_fd, 'rb'))
+        watcher = dns_core.ChangeWatcher(
+            source, lambda: (fired.append(time.monotonic()), event.set()), debounce=0.1
+        ).start()
+        self.addCleanup(watcher.stop)
+
+        time.sleep(0.2)
+        self.assertEqual(fired, [])
+        started = time.monotonic()
+        for _ in range(5):
+            os.write(write_fd, b'addr\n')
+        self.assertTrue(event.wait(2))
+        os.close(write_fd)
+        time.sleep(0.3)
+
+        self.assertEqual(len(fired), 1)
+        self.assertLess(fired[0] - started, 1.0)
+
+    def test_polling_change_source_fires_once_per_interval(self):
+        source = dns_core.PollingChangeSource(0.1)
+        self.addCleanup(source.close)
+
+        self.assertFalse(source.wait(0.02))
+        self.assertTrue(source.wait(0.5))
+        self.assertFalse(source.wait(0.02))
+
     def test_repair_dns_fails_when_verification_does_not_switch_to_dhcp(self):
         configs = [
             {'adapter': 'Ethernet', 'mode': 'static', 'ips': ['1.1.1.1']},
@@ -48,6 +439,173 @@ class DnsCoreTests(unittest.TestCase):
         self.assertIn('校验失败', result['error'])
         self.assertFalse(add_log.call_args.args[4])
 
+    def test_repair_many_uses_one_script_one_flush_and_batched_verification_reads(self):
+        before = read_fixture('netsh_show_config_en.txt')
+        after = before.replace('Statically Configured DNS Servers:    198.18.0.2\n'
+                               '                                          8.8.8.8',
+                               'DNS servers configured through DHCP:  10.0.0.1')
+        reads = itertools.chain([before], itertools.repeat(after))
+        scripts = []
+        commands = []
+
+        def fake_run(cmd, check=True):
+            if cmd[:2] == ['netsh', '-f']:
+                with open(cmd[2], 'r') as handle:
+                    script = handle.read().splitlines()
+                if script[0].startswith('interface ipv4 show'):
+                    commands.append('probe')
+                    return next(reads)
+                scripts.append(script)
+                commands.append('script')
+                return ''
+            commands.append(cmd[0])
+            if cmd[0] == 'ipconfig':
+                return ''
+            return next(reads)
+
+        # vEthernet 不在输出中，一直校验不通过，轮询到 VERIFY_TIMEOUT 为止
+        with patch('dns_core.run', side_effect=fake_run), patch('dns_core.VERIFY_TIMEOUT', 0.3):
+            results = dns_core.repair_many(['Wi-Fi', 'vEthernet (Default Switch)'])
+
+        self.assertEqual(scripts, [[
+            'interface ip set dns name="Wi-Fi" source=dhcp',
+            'interface ip set dns name="vEthernet (Default Switch)" source=dhcp',
+        ]])
+        self.assertEqual(commands[:4], ['probe', 'script', 'ipconfig', 'probe'])
+        self.assertGreater(commands.count('probe'), 2)
+        self.assertEqual(set(commands[4:]), {'probe'})
+        self.assertEqual(results[0], {'success': True, 'adapter': 'Wi-Fi'})
+        self.assertFalse(results[1]['success'])
+        self.assertIn('校验失败', results[1]['error'])
+
+        backups = dns_core.get_backups()
+        self.assertEqual([b['adapter'] for b in backups], ['Wi-Fi', 'vEthernet (Default Switch)'])
+        logs = dns_core.get_logs()
+        self.assertEqual([(l['adapter'], l['success']) for l in logs], [
+            ('vEthernet (Default Switch)', False), ('Wi-Fi', True),
+        ])
+        self.assertLess(logs[1]['settle_ms'], 300)
+        self.assertNotIn('settle_ms', logs[0])
+
+    def test_repair_verification_polls_until_dhcp_servers_appear(self):
+        static = {'adapter': 'Ethernet', 'mode': 'static', 'ips': ['1.1.1.1']}
+        dhcp = {'adapter': 'Ethernet', 'mode': 'dhcp', 'ips': ['10.0.0.1']}
+        with patch('dns_core.get_dns_config', side_effect=[static, static, static, dhcp]) as read, \
+             patch('dns_core.run', return_value='ok'), \
+             patch('dns_core.time.sleep') as sleep:
+            result = dns_core.repair_dns('Ethernet', flush=False)
+
+        self.assertEqual(result, {'success': True, 'adapter': 'Ethernet'})
+        self.assertEqual(read.call_count, 4)
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(delays), 3)
+        self.assertAlmostEqual(delays[0], dns_core.VERIFY_INITIAL_DELAY, places=2)
+        self.assertTrue(delays[0] < delays[1] < delays[2])
+        entry = dns_core.get_logs()[0]
+        self.assertTrue(entry['success'])
+        self.assertIn('settle_ms', entry)
+
+    def _fake_host(self, spec, locked='', failing='', local=False, no_ipv6=''):
+        """把 netsh 换成带状态文件的 fake_netsh，返回 (已执行命令, 读取状态)。
+
+        默认经 command_runner 执行；local=True 时改为替换 run()，走本机 netsh -f 脚本路径。
+        """
+        state = os.path.join(self.tempdir.name, 'host.json')
+        prefix = FAKE_NETSH + ['--state', state, '--locked', locked, '--failing', failing, '--no-ipv6', no_ipv6]
+        subprocess.run(prefix + ['--adapters', spec, 'interface', 'show', 'interface'], check=True, capture_output=True)
+        commands = []
+
+        def runner(cmd, check=True):
+            commands.append(list(cmd))
+            if cmd[0] == 'ipconfig':
+                return ''
+            result = subprocess.run(prefix + list(cmd[1:]), capture_output=True)
+            return dns_core._command_output(cmd, result, check)
+
+        context = patch('dns_core.run', side_effect=runner) if local else dns_core.command_runner(runner)
+        context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+        timeout = patch('dns_core.VERIFY_TIMEOUT', 0.3)
+        timeout.start()
+        self.addCleanup(timeout.stop)
+        return commands, lambda: {cfg['adapter']: cfg for cfg in dns_core.get_all_dns_configs(['Ethernet', 'Wi-Fi'])}
+
+    def test_ipv4_only_adapter_is_read_when_ipv6_lookup_fails(self):
+        self._fake_host('VPN=static:10.8.0.1;Ethernet=dhcp:192.168.1.1', no_ipv6='VPN')
+
+        configs = [dns_core.get_dns_config('VPN'), asyncio.run(dns_core.async_get_dns_config('VPN')),
+                   dns_core.get_dns_configs_bulk()['VPN']]
+
+        for config in configs:
+            self.assertEqual((config['mode'], config['ips']), ('static', ['10.8.0.1']))
+            self.assertNotIn('error', config)
+
+    def test_ipv4_only_adapter_is_read_when_ipv6_line_fails_the_netsh_script(self):
+        commands, _ = self._fake_host('VPN=static:10.8.0.1', no_ipv6='VPN', local=True)
+
+        config = dns_core.get_dns_config('VPN')
+
+        self.assertEqual(commands[0][1], '-f')
+        self.assertEqual((config['mode'], config['ips']), ('static', ['10.8.0.1']))
+        self.assertNotIn('error', config)
+
+    def test_repair_many_verifies_every_adapter_when_one_script_line_fails(self):
+        commands, read = self._fake_host('Ethernet=static:1.1.1.1;Wi-Fi=static:8.8.8.8', failing='Wi-Fi', local=True)
+
+        results = dns_core.repair_many(['Ethernet', 'Wi-Fi'])
+
+        self.assertIn('-f', [c[1] for c in commands if c[0] == 'netsh'])
+        self.assertEqual(results[0], {'success': True, 'adapter': 'Ethernet'})
+        self.assertFalse(results[1]['success'])
+        self.assertIn('netsh 脚本', results[1]['error'])
+        state = read()
+        self.assertEqual([dns_core.dns_mode(state[n]) for n in ('Ethernet', 'Wi-Fi')], ['dhcp', 'static'])
+
+    def test_repair_transaction_commits_all_adapters_in_one_round(self):
+        commands, read = self._fake_host('Ethernet=static:1.1.1.1|static:2001:db8::1;Wi-Fi=static:8.8.8.8')
+
+        outcome = dns_core.repair_transaction(['Ethernet', 'Wi-Fi'], policy='all_or_nothing')
+
+        self.assertEqual((outcome['success'], outcome['status'], outcome['rollback']), (True, 'committed', []))
+        # command_runner 下远程主机看不到本机的脚本文件，修改命令逐条发送
+        self.assertNotIn('-f', [c[1] for c in commands if c[0] == 'netsh'])
+        self.assertIn(['netsh', 'interface', 'ipv6', 'set', 'dnsservers', 'name=Ethernet', 'source=dhcp'], commands)
+        self.assertEqual([c[0] for c in commands].count('ipconfig'), 1)
+        state = read()
+        self.assertEqual([dns_core.dns_mode(state[n]) for n in ('Ethernet', 'Wi-Fi')], ['dhcp', 'dhcp'])
+
+    def test_repair_transaction_rolls_back_everything_when_one_adapter_fails(self):
+        commands, read = self._fake_host(
+            'Ethernet=static:1.1.1.1,9.9.9.9|static:2001:db8::1;Wi-Fi=static:8.8.8.8', locked='Wi-Fi')
+        dns_core.reset_metrics()
+        self.addCleanup(dns_core.reset_metrics)
+
+        best_effort = dns_core.repair_transaction(['Ethernet', 'Wi-Fi'], policy='best_effort')
+        self.assertEqual(best_effort['status'], 'partial')
+        self.assertEqual(dns_core.dns_mode(read()['Ethernet']), 'dhcp')
+        dns_core.rollback(dns_core.get_backups()[-2])
+        commands.clear()
+
+        outcome = dns_core.repair_transaction(['Ethernet', 'Wi-Fi'], policy='all_or_nothing')
+
+        self.assertFalse(outcome['success'])
+        self.assertEqual(outcome['status'], 'rolled_back')
+        self.assertEqual([r['success'] for r in outcome['results']], [True, False])
+        self.assertEqual([r['success'] for r in outcome['rollback']], [True, True])
+        ethernet = read()['Ethernet']
+        self.assertEqual((ethernet['mode'], ethernet['ips']), ('static', ['1.1.1.1', '9.9.9.9']))
+        self.assertEqual(ethernet['ipv6'], {'mode': 'static', 'ips': ['2001:db8::1']})
+        # 回滚同样经 command_runner 逐条执行
+        self.assertNotIn('-f', [c[1] for c in commands if c[0] == 'netsh'])
+        self.assertIn(['netsh', 'interface', 'ip', 'add', 'dns', 'name=Ethernet', 'address=9.9.9.9', 'index=2'],
+                      commands)
+        self.assertEqual(dns_core.get_metrics()['metrics']['repair_rollbacks_total'], 2)
+        actions = [(e['action'], e['adapter'], e['success']) for e in dns_core.get_logs(limit=4)]
+        self.assertEqual(actions, [('rollback', 'Wi-Fi', True), ('rollback', 'Ethernet', True),
+                                   ('repair', 'Wi-Fi', False), ('repair', 'Ethernet', True)])
+        with self.assertRaises(ValueError):
+            dns_core.repair_transaction(['Ethernet'], policy='sometimes')
+
     def test_save_backup_keeps_last_ten_per_adapter_and_preserves_other_adapters(self):
         seed = [
             {'adapter': 'A', 'mode': 'static', 'ips': ['1.1.1.1'], 'ts': f'a{i}'}
@@ -69,6 +627,172 @@ class DnsCoreTests(unittest.TestCase):
         self.assertEqual(a_backups[0]['ts'], 'a3')
         self.assertEqual(a_backups[-1]['mode'], 'dhcp')
 
+        self.assertFalse(os.path.exists(dns_core.BACKUP_FILE))
+        self.assertTrue(os.path.exists(dns_core.BACKUP_FILE + '.migrated'))
+
+    def test_backup_ring_trims_through_index_without_rewriting_journal(self):
+        for i in range(12):
+            dns_core._save_backup({'adapter': 'A', 'mode': 'static', 'ips': [f'1.1.1.{i}']})
+        dns_core._save_backup({'adapter': 'B', 'mode': 'dhcp', 'ips': []})
+
+        index = dns_core._load_backup_index(dns_core._backup_base())
+        with open(dns_core._journal_path(dns_core._backup_base(), index), 'rb') as handle:
+            journal_lines = handle.read().splitlines()
+        backups = dns_core.get_backups()
+
+        self.assertEqual(len(journal_lines), 13)
+        self.assertEqual(index['dead'], 2)
+        self.assertEqual([b['ips'][0] for b in backups if b['adapter'] == 'A'],
+                         [f'1.1.1.{i}' for i in range(2, 12)])
+        self.assertEqual(backups[-1]['adapter'], 'B')
+
+    def test_compact_backups_drops_dead_entries_and_switches_generation(self):
+        for i in range(15):
+            dns_core._save_backup({'adapter': 'A', 'mode': 'static', 'ips': [f'1.1.1.{i}']})
+        before = dns_core.get_backups()
+        old_journal = dns_core._journal_path(dns_core._backup_base(), dns_core._load_backup_index(dns_core._backup_base()))
+
+        dns_core.compact_backups()
+
+        index = dns_core._load_backup_index(dns_core._backup_base())
+        with open(dns_core._journal_path(dns_core._backup_base(), index), 'rb') as handle:
+            journal_lines = handle.read().splitlines()
+        self.assertEqual(index['dead'], 0)
+        self.assertEqual(len(journal_lines), 10)
+        self.assertFalse(os.path.exists(old_journal))
+        self.assertEqual(dns_core.get_backups(), before)
+
+    def test_backup_raw_is_stored_once_as_compressed_blob_and_collected_with_ring(self):
+        base = dns_core._backup_base()
+        first = 'Configuration for interface "A"\n' + '    DNS servers configured through DHCP:  10.0.0.1\n' * 100
+        second = first.replace('10.0.0.1', '10.0.0.2')
+        for i in range(12):
+            dns_core._save_backup({'adapter': 'A', 'mode': 'static', 'ips': [f'1.1.1.{i}'], 'raw': first})
+
+        blobs = os.listdir(dns_core._blob_dir(base))
+        index = dns_core._load_backup_index(base)
+        with open(dns_core._journal_path(base, index), 'rb') as handle:
+            journal = handle.read()
+        backup = dns_core.get_backups()[-1]
+        self.assertEqual(len(blobs), 1)
+        self.assertLess(os.path.getsize(os.path.join(dns_core._blob_dir(base), blobs[0])), len(first) // 10)
+        self.assertLess(len(journal), len(first))
+        self.assertNotIn('raw', backup)
+        self.assertEqual(index['blobs'], {backup['raw_sha256']: 10})
+        self.assertEqual(dns_core.get_backup_raw(backup), first)
+
+        for i in range(10):
+            dns_core._save_backup({'adapter': 'A', 'mode': 'static', 'ips': ['1.1.1.1'], 'raw': second})
+
+        latest = dns_core.get_backups()[-1]
+        self.assertEqual(os.listdir(dns_core._blob_dir(base)), [blobs[0].replace(backup['raw_sha256'], latest['raw_sha256'])])
+        self.assertIsNone(dns_core.get_backup_raw(backup))
+        self.assertEqual(dns_core.get_backup_raw(latest), second)
+
+    def test_blob_released_and_referenced_again_in_one_batch_is_kept(self):
+        configs = [{'adapter': 'A', 'mode': 'static', 'ips': ['1.1.1.1'], 'raw': raw} for raw in ('x', 'y', 'x')]
+        with patch('dns_core.BACKUP_KEEP', 1):
+            dns_core._save_backups(configs)
+
+        backup, = dns_core.get_backups()
+        self.assertEqual(dns_core.get_backup_raw(backup), 'x')
+        self.assertEqual(os.listdir(dns_core._blob_dir(dns_core._backup_base())), [backup['raw_sha256'] + '.z'])
+
+    def test_compact_backups_moves_inline_raw_into_blob_store(self):
+        base = dns_core._backup_base()
+        old = [{'ts': f't{i}', 'adapter': 'A', 'mode': 'static', 'ips': ['1.1.1.1'], 'raw': 'netsh output'}
+               for i in range(3)]
+        # 旧版本写入的 journal：raw 内联在每条备份中，没有索引
+        with open(dns_core._journal_path(base, {'generation': 1}), 'wb') as handle:
+            for entry in old:
+                handle.write(json.dumps(entry).encode('utf-8') + b'\n')
+        os.makedirs(dns_core._blob_dir(base))
+        orphan = os.path.join(dns_core._blob_dir(base), '0' * 64 + '.z')
+        open(orphan, 'wb').close()
+        self.assertEqual(dns_core.get_backups(), old)
+
+        dns_core.compact_backups()
+
+        backups = dns_core.get_backups()
+        self.assertEqual([b['ts'] for b in backups], ['t0', 't1', 't2'])
+        self.assertTrue(all('raw' not in b for b in backups))
+        self.assertEqual({dns_core.get_backup_raw(b) for b in backups}, {'netsh output'})
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_concurrent_backup_writers_do_not_lose_entries(self):
+        def writer(adapter):
+            for i in range(5):
+                dns_core._save_backup({'adapter': adapter, 'mode': 'dhcp', 'ips': [], 'n': i})
+
+        threads = [threading.Thread(target=writer, args=(f'A{k}',)) for k in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        backups = dns_core.get_backups()
+        self.assertEqual(len(backups), 40)
+        for k in range(8):
+            self.assertEqual([b['n'] for b in backups if b['adapter'] == f'A{k}'], list(range(5)))
+
+    def test_logs_rotate_into_segments_and_page_backwards(self):
+        self.addCleanup(setattr, dns_core, 'LOG_SEGMENT_BYTES', dns_core.LOG_SEGMENT_BYTES)
+        dns_core.LOG_SEGMENT_BYTES = 600
+        for i in range(30):
+            dns_core._add_log('repair', f'A{i}', {'mode': 'static', 'ips': []}, None, True)
+
+        log_dir = os.path.splitext(dns_core.LOG_FILE)[0] + '.d'
+        self.assertGreater(len(dns_core._log_segments(log_dir)), 3)
+
+        first = dns_core.get_logs(limit=7)
+        second = dns_core.get_logs(limit=7, before=first[-1]['seq'])
+        self.assertEqual([e['adapter'] for e in first], [f'A{i}' for i in range(29, 22, -1)])
+        self.assertEqual([e['adapter'] for e in second], [f'A{i}' for i in range(22, 15, -1)])
+        self.assertEqual([e['adapter'] for e in dns_core.get_logs()], [f'A{i}' for i in range(29, -1, -1)])
+
+    def test_get_logs_filters_before_limiting_and_pages_with_seq(self):
+        self.addCleanup(setattr, dns_core, 'LOG_SEGMENT_BYTES', dns_core.LOG_SEGMENT_BYTES)
+        dns_core.LOG_SEGMENT_BYTES = 600
+        for i in range(30):
+            action = 'rollback' if i % 3 == 0 else 'repair'
+            dns_core._add_log(action, f'A{i % 2}', {'mode': 'static', 'ips': []}, None, i % 5 != 0)
+
+        first = dns_core.get_logs(limit=3, adapter='A0', action='repair')
+        second = dns_core.get_logs(limit=3, before=first[-1]['seq'], adapter='A0', action='repair')
+        failed = dns_core.get_logs(success=False)
+
+        self.assertEqual([e['seq'] for e in first], [28, 26, 22])
+        self.assertEqual([e['seq'] for e in second], [20, 16, 14])
+        self.assertEqual([e['seq'] for e in failed], [25, 20, 15, 10, 5, 0])
+
+    def test_log_retention_drops_whole_old_segments(self):
+        self.addCleanup(setattr, dns_core, 'LOG_SEGMENT_BYTES', dns_core.LOG_SEGMENT_BYTES)
+        self.addCleanup(setattr, dns_core, 'LOG_RETENTION', dns_core.LOG_RETENTION)
+        dns_core.LOG_SEGMENT_BYTES = 600
+        dns_core.LOG_RETENTION = 10
+        for i in range(40):
+            dns_core._add_log('repair', f'A{i}', {'mode': 'static', 'ips': []}, None, True)
+
+        logs = dns_core.get_logs()
+        self.assertGreaterEqual(len(logs), 10)
+        self.assertLess(len(logs), 20)
+        self.assertEqual(logs[0]['adapter'], 'A39')
+
+    def test_legacy_log_json_is_migrated_and_clear_keeps_sequence(self):
+        dns_core._save_json(dns_core.LOG_FILE, [
+            {'ts': 't0', 'action': 'repair', 'adapter': 'Old', 'success': True},
+        ])
+        dns_core._add_log('rollback', 'New', {'mode': 'dhcp'}, None, False, 'x')
+
+        logs = dns_core.get_logs()
+        self.assertEqual([e['adapter'] for e in logs], ['New', 'Old'])
+        self.assertTrue(os.path.exists(dns_core.LOG_FILE + '.migrated'))
+
+        dns_core.clear_logs()
+        self.assertEqual(dns_core.get_logs(), [])
+        dns_core._add_log('repair', 'After', {'mode': 'static'}, None, True)
+        self.assertEqual(dns_core.get_logs()[0]['seq'], 2)
+
     def test_rollback_restores_all_static_dns_servers(self):
         backup = {
             'adapter': 'Ethernet',
@@ -91,6 +815,52 @@ class DnsCoreTests(unittest.TestCase):
             call(['netsh', 'interface', 'ip', 'add', 'dns', 'Ethernet', '9.9.9.9', 'index=3']),
         ])
 
+    def test_document_store_distinguishes_missing_empty_corrupt_and_caches_by_signature(self):
+        store = dns_core.DocumentStore()
+        path = os.path.join(self.tempdir.name, 'doc.json')
+
+        self.assertEqual(store.load(path), ('missing', None))
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write('  \n')
+        self.assertEqual(store.load(path)[0], 'empty')
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write('{"broken": ')
+        self.assertEqual(store.load(path)[0], 'corrupt')
+
+        store.save(path, {'a': 1}, lambda v: dns_core.json.dumps(v).encode('utf-8'))
+        misses = store.misses
+        self.assertEqual(store.load(path), ('ok', {'a': 1}))
+        self.assertEqual(store.load(path), ('ok', {'a': 1}))
+        self.assertEqual(store.misses, misses)
+        self.assertGreaterEqual(store.hits, 2)
+
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write('{"a": 22}')
+        self.assertEqual(store.load(path), ('ok', {'a': 22}))
+        self.assertEqual(store.misses, misses + 1)
+
+    def test_repeated_settings_reads_hit_the_cache(self):
+        dns_core.save_settings({'auto_monitor': True})
+        before = dns_core.store_stats()
+        for _ in range(5):
+            settings = dns_core.get_settings()
+            settings['auto_monitor'] = False
+        after = dns_core.store_stats()
+
+        self.assertEqual(after['misses'], before['misses'])
+        self.assertEqual(after['hits'], before['hits'] + 5)
+        self.assertTrue(dns_core.get_settings()['auto_monitor'])
+
+    def test_save_settings_keeps_corrupt_file_aside(self):
+        with open(dns_core.SETTINGS_FILE, 'w', encoding='utf-8') as handle:
+            handle.write('{not json')
+
+        self.assertFalse(dns_core.get_settings()['auto_monitor'])
+        dns_core.save_settings({'auto_monitor': True})
+
+        self.assertTrue(os.path.exists(dns_core.SETTINGS_FILE + '.corrupt'))
+        self.assertTrue(dns_core.get_settings()['auto_monitor'])
+
     def test_save_settings_filters_unknown_keys(self):
         dns_core.save_settings({
             'auto_monitor': True,
@@ -106,6 +876,198 @@ class DnsCoreTests(unittest.TestCase):
         self.assertIn('"auto_monitor": true', saved)
         self.assertNotIn('language', saved)
 
+    def test_import_has_no_side_effects_and_paths_follow_configure(self):
+        appdata = os.path.join(self.tempdir.name, 'appdata')
+        os.makedirs(appdata)
+        script = (
+            'import sys, dns_core; '
+            'print(int("ctypes" in sys.modules), int("concurrent.futures" in sys.modules))'
+        )
+        env = {**os.environ, 'APPDATA': appdata}
+        env.pop('REPAIRDNS_DATA_DIR', None)
+        out = subprocess.run(
+            [sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual(out.split(), ['0', '0'])
+        self.assertEqual(os.listdir(appdata), [])
+
+        other = os.path.join(self.tempdir.name, 'other')
+        dns_core.configure(data_dir=other)
+        dns_core.save_settings({'auto_monitor': True})
+
+        self.assertEqual(dns_core.SETTINGS_FILE, os.path.join(other, 'settings.json'))
+        self.assertTrue(os.path.exists(os.path.join(other, 'settings.json')))
+        self.assertTrue(dns_core.get_settings()['auto_monitor'])
+
+
+class VirtualClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def simulate(scheduler, clock, world, events=(), until=86400.0):
+    """用虚拟时钟驱动调度器：按调度结果或网络变化通知（events）检测，返回 [(时间, 状态)]。"""
+    pending = sorted(events)
+    probes = []
+    next_probe = clock.now
+    while next_probe < until:
+        event = bool(pending) and pending[0] <= next_probe
+        clock.now = pending.pop(0) if event else next_probe
+        state = world(clock.now)
+        probes.append((clock.now, state))
+        next_probe = clock.now + scheduler.observe(state, event=event)
+    return probes
+
+
+def detection_latency(probes, at: float, state) -> float:
+    return next(t for t, seen in probes if t >= at and seen == state) - at
+
+
+class AdaptiveSchedulerTests(unittest.TestCase):
+    def _scheduler(self, low=60, high=1800, jitter=0.1, seed=0):
+        clock = VirtualClock()
+        return dns_core.AdaptiveScheduler(low, high, jitter=jitter, clock=clock, rng=random.Random(seed)), clock
+
+    def test_stable_state_backs_off_geometrically_to_the_ceiling(self):
+        scheduler, clock = self._scheduler(jitter=0)
+
+        delays = [scheduler.observe('same') for _ in range(8)]
+
+        self.assertEqual(delays, [120, 240, 480, 960, 1800, 1800, 1800, 1800])
+        self.assertEqual(scheduler.observe('changed'), 60)
+        self.assertEqual(scheduler.observe('changed', event=True), 60)
+        self.assertEqual(scheduler.observe('changed'), 120)
+        self.assertEqual(scheduler.tighten(), 60)
+        clock.now += 45
+        self.assertEqual(scheduler.remaining(), 15)
+
+    def test_jitter_keeps_a_fleet_out_of_lockstep(self):
+        fleet = [self._scheduler(seed=seed)[0] for seed in range(50)]
+
+        delays = [[scheduler.observe('same') for _ in range(10)][-1] for scheduler in fleet]
+
+        self.assertTrue(all(1620 <= d <= 1800 for d in delays))
+        self.assertGreater(len({round(d) for d in delays}), 40)
+
+    def test_adaptive_schedule_probes_less_and_reacts_faster_after_churn(self):
+        # 06:00 VPN 连接（系统发出网络变化通知），两分半后 VPN 静默改写 DNS
+        connect, rewrite = 6 * 3600.0, 6 * 3600.0 + 150
+
+        def world(t):
+            if t >= rewrite:
+                return ('Ethernet', 'static'), ('VPN', 'dhcp')
+            if t >= connect:
+                return ('Ethernet', 'dhcp'), ('VPN', 'dhcp')
+            return (('Ethernet', 'dhcp'),)
+
+        adaptive, clock = self._scheduler()
+        fixed, fixed_clock = self._scheduler(300, 300, jitter=0)
+        adaptive_probes = simulate(adaptive, clock, world, events=[connect])
+        fixed_probes = simulate(fixed, fixed_clock, world, events=[connect])
+
+        self.assertLess(len(adaptive_probes), len(fixed_probes) / 3)
+        self.assertLessEqual(detection_latency(adaptive_probes, rewrite, world(rewrite)), 60)
+        self.assertLess(detection_latency(adaptive_probes, rewrite, world(rewrite)),
+                        detection_latency(fixed_probes, rewrite, world(rewrite)))
+        # 变化后按最小间隔复查，状态稳定后再次放宽
+        after = [t for t, _ in adaptive_probes if t > rewrite]
+        self.assertLess(after[1] - after[0], 150)
+        self.assertGreater(after[-1] - after[-2], 1500)
+
+    def test_settings_bound_intervals_and_migrate_the_legacy_fixed_interval(self):
+        self.assertEqual(dns_core._normalize_settings({'monitor_interval': 10})['monitor_max_interval'], 600)
+        settings = dns_core._normalize_settings({'monitor_min_interval': 1, 'monitor_max_interval': 'x'})
+        self.assertEqual((settings['monitor_min_interval'], settings['monitor_max_interval']), (10, 1800))
+        settings = dns_core._normalize_settings({'monitor_min_interval': 900, 'monitor_max_interval': 300})
+        self.assertEqual((settings['monitor_min_interval'], settings['monitor_max_interval']), (900, 900))
+        self.assertEqual(dns_core.create_scheduler(settings).max_interval, 900)
+
+
+class AsyncDnsCoreTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        dns_core.configure(data_dir=self.tempdir.name)
+        self.addCleanup(dns_core.configure, None)
+        self.state = os.path.join(self.tempdir.name, 'netsh.json')
+        self.commands = []
+        real_async_run = dns_core.async_run
+
+        # netsh / ipconfig 换成真实子进程中的替身，仍走 async_run 的子进程路径
+        async def fake_async_run(cmd, check=True):
+            self.commands.append(list(cmd))
+            if cmd[0] == 'netsh':
+                cmd = FAKE_NETSH + ['--state', self.state] + list(cmd[1:])
+            elif cmd[0] == 'ipconfig':
+                cmd = [sys.executable, '-c', 'pass']
+            return await real_async_run(cmd, check)
+
+        patcher = patch('dns_core.async_run', side_effect=fake_async_run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _adapters(self, spec):
+        subprocess.run(FAKE_NETSH + ['--adapters', spec, '--state', self.state, 'interface', 'show', 'interface'],
+                       check=True, capture_output=True)
+
+    async def test_probes_fan_out_on_one_event_loop(self):
+        self._adapters(';'.join(f'NIC {i}=static:10.0.0.{i}' for i in range(12)))
+
+        adapters = await dns_core.async_get_active_adapters()
+        configs = await asyncio.gather(*(dns_core.async_get_dns_config(a['name']) for a in adapters))
+
+        self.assertEqual([a['name'] for a in adapters], [f'NIC {i}' for i in range(12)])
+        self.assertEqual([(c['mode'], c['ips']) for c in configs],
+                         [('static', [f'10.0.0.{i}']) for i in range(12)])
+
+    async def test_async_repair_and_rollback_share_the_sync_flow(self):
+        self._adapters('Wi-Fi=static:198.18.0.2,8.8.8.8|static:2606:4700:4700::1111')
+
+        repaired = await dns_core.async_repair_dns('Wi-Fi')
+        backup = dns_core.get_backups()[-1]
+        self.commands.clear()
+        restored = await dns_core.async_rollback(backup)
+
+        self.assertEqual(repaired, {'success': True, 'adapter': 'Wi-Fi'})
+        self.assertEqual(restored, {'success': True, 'adapter': 'Wi-Fi'})
+        # 读取配置是一个 netsh -f 脚本（IPv4 + IPv6 一次进程）
+        self.assertEqual([cmd[:2] if cmd[1] == '-f' else cmd for cmd in self.commands], [
+            ['netsh', '-f'],
+            ['netsh', 'interface', 'ip', 'set', 'dns', 'Wi-Fi', 'static', '198.18.0.2'],
+            ['netsh', 'interface', 'ip', 'add', 'dns', 'Wi-Fi', '8.8.8.8', 'index=2'],
+            ['netsh', 'interface', 'ipv6', 'set', 'dnsservers', 'Wi-Fi', 'static', '2606:4700:4700::1111'],
+            ['netsh', '-f'],
+        ])
+        config = await dns_core.async_get_dns_config('Wi-Fi')
+        self.assertEqual(config['ips'], ['198.18.0.2', '8.8.8.8'])
+        self.assertEqual(config['ipv6'], {'mode': 'static', 'ips': ['2606:4700:4700::1111']})
+        self.assertEqual([e['action'] for e in dns_core.get_logs()], ['rollback', 'repair'])
+
+    async def test_cancelling_async_run_kills_the_subprocess(self):
+        spawned = []
+        real_exec = asyncio.create_subprocess_exec
+
+        async def tracking_exec(*args, **kwargs):
+            proc = await real_exec(*args, **kwargs)
+            spawned.append(proc)
+            return proc
+
+        with patch('asyncio.create_subprocess_exec', side_effect=tracking_exec):
+            task = asyncio.create_task(
+                dns_core.async_run([sys.executable, '-c', 'import time; time.sleep(30)'])
+            )
+            while not spawned:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.assertIsNotNone(spawned[0].returncode)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,156 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import Mock, patch
+
+import dns_core
+import dns_fleet
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FAKE_NETSH = os.path.join(FIXTURES, 'fake_netsh.py')
+
+
+class DnsFleetTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        dns_core.configure(data_dir=self.tempdir.name)
+        self.addCleanup(dns_core.configure, None)
+        self.state_dir = os.path.join(self.tempdir.name, 'state')
+        os.makedirs(self.state_dir)
+
+    def _host(self, host, *adapters):
+        with open(os.path.join(self.state_dir, f'{host}.json'), 'w', encoding='utf-8') as handle:
+            json.dump([{'name': n, 'mode': m, 'ips': ips} for n, m, ips in adapters], handle)
+
+    def _state(self, host):
+        with open(os.path.join(self.state_dir, f'{host}.json'), 'r', encoding='utf-8') as handle:
+            return json.load(handle)
+
+    def _transport(self, *options):
+        noop = [sys.executable, '-c', 'pass']
+        return dns_fleet.LocalTransport({
+            'netsh': [sys.executable, FAKE_NETSH, '--state', os.path.join(self.state_dir, '{host}.json'), *options],
+            'ipconfig': noop,
+        })
+
+    def test_check_streams_one_report_per_host(self):
+        self._host('pc-1', ('Ethernet', 'dhcp', ['10.0.0.1']))
+        self._host('pc-2', ('Ethernet', 'dhcp', []), ('Wi-Fi', 'static', ['198.18.0.2', '8.8.8.8']))
+
+        reports = dns_fleet.run_fleet(['pc-1', 'pc-2', 'pc-1'], 'check', self._transport(), parallel=2)
+
+        self.assertNotIsInstance(reports, list)
+        by_host = {r['host']: r for r in reports}
+        self.assertEqual(sorted(by_host), ['pc-1', 'pc-2'])
+        self.assertEqual(by_host['pc-1']['status'], 'ok')
+        self.assertEqual(by_host['pc-2']['status'], 'static')
+        self.assertEqual(by_host['pc-2']['static'], ['Wi-Fi'])
+        self.assertEqual(self._state('pc-2')[1]['mode'], 'static')
+
+    def test_repair_changes_only_static_hosts_and_keeps_backups_per_host(self):
+        self._host('pc-1', ('Ethernet', 'dhcp', []))
+        self._host('pc-2', ('Wi-Fi', 'static', ['198.18.0.2']))
+        data_root = os.path.join(self.tempdir.name, 'fleet')
+
+        reports = list(dns_fleet.run_fleet(['pc-1', 'pc-2'], 'repair', self._transport(),
+                                           data_root=data_root))
+
+        by_host = {r['host']: r for r in reports}
+        self.assertEqual(by_host['pc-1']['status'], 'ok')
+        self.assertEqual(by_host['pc-2']['status'], 'repaired')
+        self.assertEqual(by_host['pc-2']['repair'], [{'success': True, 'adapter': 'Wi-Fi'}])
+        self.assertEqual(self._state('pc-2')[0]['mode'], 'dhcp')
+        with dns_core.using_data_dir(os.path.join(data_root, 'pc-2')):
+            backups = dns_core.get_backups()
+            logs = dns_core.get_logs()
+        self.assertEqual([(b['adapter'], b['ips']) for b in backups], [('Wi-Fi', ['198.18.0.2'])])
+        self.assertEqual([(e['action'], e['success']) for e in logs], [('repair', True)])
+        self.assertFalse(os.path.exists(os.path.join(data_root, 'pc-1', 'backups.idx.json')))
+
+    def test_atomic_repair_rolls_back_every_adapter_on_the_remote_host(self):
+        self._host('pc-1', ('Ethernet', 'static', ['1.1.1.1', '9.9.9.9']), ('Wi-Fi', 'static', ['8.8.8.8']))
+
+        with patch('dns_core.VERIFY_TIMEOUT', 0.3):
+            reports = list(dns_fleet.run_fleet(['pc-1'], 'repair', self._transport('--locked', 'Wi-Fi'),
+                                               policy='all_or_nothing'))
+
+        report = reports[0]
+        self.assertEqual(report['status'], 'failed')
+        self.assertEqual(report['transaction'], 'rolled_back')
+        self.assertEqual([r['success'] for r in report['repair']], [True, False])
+        self.assertEqual([r['success'] for r in report['rollback']], [True, True])
+        self.assertEqual([(a['mode'], a['ips']) for a in self._state('pc-1')],
+                         [('static', ['1.1.1.1', '9.9.9.9']), ('static', ['8.8.8.8'])])
+
+    def test_host_deadline_and_bounded_parallelism(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        class SlowTransport(dns_fleet.Transport):
+            def run(self, host, cmd, timeout, check=True):
+                with lock:
+                    active.append(host)
+                    peak.append(len(set(active)))
+                try:
+                    if host == 'slow':
+                        time.sleep(timeout)
+                        raise dns_fleet.HostTimeout('超时')
+                    time.sleep(0.01)
+                    return ''
+                finally:
+                    with lock:
+                        active.remove(host)
+
+        hosts = ['slow'] + [f'pc-{i}' for i in range(6)]
+        started = time.monotonic()
+        reports = list(dns_fleet.run_fleet(hosts, 'check', SlowTransport(), parallel=3, host_timeout=0.3))
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 2.0)
+        self.assertLessEqual(max(peak), 3)
+        by_host = {r['host']: r for r in reports}
+        self.assertEqual(by_host['slow']['status'], 'timeout')
+        self.assertEqual({by_host[h]['status'] for h in hosts[1:]}, {'no_network'})
+        self.assertEqual(reports[-1]['host'], 'slow')
+
+    def test_remote_transport_wraps_command_for_invoke_command(self):
+        completed = Mock(returncode=0, stdout=b'ok', stderr=b'')
+        with patch('dns_fleet.subprocess.run', return_value=completed) as run:
+            out = dns_fleet.RemoteTransport().run("pc-1", ['netsh', 'interface', 'ip', 'set', 'dns', "Bob's NIC", 'dhcp'], 5)
+
+        self.assertEqual(out, 'ok')
+        argv = run.call_args.args[0]
+        self.assertEqual(argv[:4], ['powershell', '-NoProfile', '-NonInteractive', '-Command'])
+        self.assertIn("Invoke-Command -ComputerName 'pc-1'", argv[4])
+        self.assertIn("& 'netsh' 'interface' 'ip' 'set' 'dns' 'Bob''s NIC' 'dhcp'", argv[4])
+        self.assertEqual(run.call_args.kwargs['timeout'], 5)
+
+    def test_main_writes_json_lines_with_summary_and_exit_code(self):
+        self._host('pc-1', ('Ethernet', 'static', ['1.1.1.1']))
+        # --program 按 shell 规则拆分，路径统一用正斜杠
+        python, fake = sys.executable.replace('\\', '/'), FAKE_NETSH.replace('\\', '/')
+        state = os.path.join(self.state_dir, '{host}.json').replace('\\', '/')
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = dns_fleet.main([
+                'check', '--hosts', 'pc-1', '--transport', 'local',
+                '--program', f'netsh={python} {fake} --state {state}',
+                '--program', f'ipconfig={python} -c pass',
+            ])
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(code, dns_fleet.EXIT_STATIC)
+        self.assertEqual(lines[0]['host'], 'pc-1')
+        self.assertEqual(lines[-1]['summary']['status'], {'static': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
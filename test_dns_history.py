@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import dns_core
+import dns_history
+
+DAY = 86400
+# 2025-01-01 00:00:00 UTC，整点整天对齐，便于核对汇总桶
+T0 = 1735689600.0
+
+
+def cfg(adapter, mode='dhcp', ips=(), ipv6=None):
+    config = {'adapter': adapter, 'mode': mode, 'ips': list(ips)}
+    if ipv6:
+        config['ipv6'] = ipv6
+    return config
+
+
+class HistoryStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        dns_core.configure(data_dir=self.tempdir.name)
+        self.addCleanup(dns_core.configure, None)
+        self.store = self._open()
+
+    def _open(self):
+        store = dns_history.HistoryStore(clock=lambda: T0)
+        self.addCleanup(store.close)
+        return store
+
+    def test_unchanged_snapshots_collapse_into_intervals_in_wal_mode(self):
+        for i in range(5):
+            self.store.record([cfg('Ethernet', ips=['10.0.0.1']), cfg('Wi-Fi', 'static', ['8.8.8.8'])], T0 + i * 60)
+        self.store.record([cfg('Ethernet', ips=['10.0.0.1']), cfg('Wi-Fi', ips=['10.0.0.1'])], T0 + 300)
+        self.store.record([cfg('Ethernet', ips=['10.0.0.1'])], T0 + 360)
+
+        rows = [(r['adapter'], r['mode'], r['start'] - T0, r['end'] - T0, r['samples'])
+                for r in self.store.intervals()]
+
+        self.assertEqual(rows, [
+            ('Ethernet', 'dhcp', 0, 360, 7),
+            ('Wi-Fi', 'static', 0, 300, 5),
+            ('Wi-Fi', 'dhcp', 300, 300, 1),
+        ])
+        with sqlite3.connect(self.store.path) as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            indexes = {row[1] for row in conn.execute("SELECT type, name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn('intervals_adapter_end', indexes)
+
+    def test_report_counts_hijack_duration_and_servers_across_reopen(self):
+        hijack = [cfg('Wi-Fi', 'static', ['198.18.0.2'])]
+        ipv6 = [cfg('Wi-Fi', ipv6={'mode': 'static', 'ips': ['2001:db8::1']})]
+        self.store.record(hijack, T0)
+        self.store.record(hijack, T0 + 600)
+        self.store.record([cfg('Wi-Fi')], T0 + 900)
+        self.store.close()
+
+        reopened = self._open()
+        reopened.record([cfg('Wi-Fi')], T0 + 960)
+        reopened.record(hijack, T0 + 1000)
+        reopened.record(ipv6, T0 + 1100)
+        reopened.record([cfg('Wi-Fi')], T0 + 1200)
+
+        report = reopened.report(adapter='Wi-Fi')
+        dhcp = [r for r in reopened.intervals() if r['mode'] == 'dhcp']
+
+        self.assertEqual([(r['servers'], r['seconds'], r['occurrences']) for r in report], [
+            (['198.18.0.2'], 1000.0, 2),
+            (['2001:db8::1'], 100.0, 1),
+        ])
+        self.assertEqual([(r['start'] - T0, r['end'] - T0) for r in dhcp], [(900, 1000), (1200, 1200)])
+        self.assertEqual(reopened.report(adapter='Wi-Fi', since=T0 + 500, until=T0 + 700)[0]['seconds'], 200.0)
+
+    def test_old_intervals_are_downsampled_to_hours_then_days(self):
+        hijack = [cfg('Wi-Fi', 'static', ['198.18.0.2'])]
+        # 00:30 起为静态，03:00 检测到已恢复
+        for minute in range(30, 121, 10):
+            self.store.record(hijack, T0 + minute * 60)
+        self.store.record([cfg('Wi-Fi')], T0 + 3 * 3600)
+        before = self.store.report(adapter='Wi-Fi')
+
+        self.store.downsample(now=T0 + 10 * DAY)
+        with sqlite3.connect(self.store.path) as conn:
+            hourly = conn.execute(
+                "SELECT start - ?, seconds, transitions FROM rollups WHERE bucket = 'hour' AND mode = 'static' "
+                "ORDER BY start", (T0,)).fetchall()
+        after_hours = self.store.report(adapter='Wi-Fi')
+
+        self.store.downsample(now=T0 + 100 * DAY)
+        with sqlite3.connect(self.store.path) as conn:
+            buckets = conn.execute('SELECT DISTINCT bucket FROM rollups').fetchall()
+        after_days = self.store.report(adapter='Wi-Fi')
+
+        self.assertEqual(self.store.intervals(), [])
+        self.assertEqual(hourly, [(0, 1800.0, 1), (3600, 3600.0, 0), (7200, 3600.0, 0)])
+        self.assertEqual(buckets, [('day',)])
+        for report in (after_hours, after_days):
+            self.assertEqual([(r['seconds'], r['occurrences']) for r in report],
+                             [(r['seconds'], r['occurrences']) for r in before])
+
+    def test_record_is_batched_and_costs_under_a_millisecond(self):
+        configs = [cfg(f'Ethernet {i}', ips=['10.0.0.1']) for i in range(8)]
+
+        started = time.perf_counter()
+        for i in range(dns_history.HISTORY_BATCH_SIZE - 1):
+            self.store.record(configs, T0 + i)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed / (dns_history.HISTORY_BATCH_SIZE - 1), 0.001)
+        self.assertFalse(os.path.exists(self.store.path))
+        self.store.record(configs, T0 + dns_history.HISTORY_BATCH_SIZE)
+        self.store._flush_thread.join()
+        self.assertEqual(len(self.store.intervals()), 8)
+        self.assertEqual({r['samples'] for r in self.store.intervals()}, {dns_history.HISTORY_BATCH_SIZE})
+
+
+if __name__ == '__main__':
+    unittest.main()
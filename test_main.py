@@ -1,3 +1,5 @@
+import threading
+import time
 import unittest
 from unittest.mock import Mock, patch
 
@@ -9,14 +11,23 @@ class AppTests(unittest.TestCase):
         self.is_admin = patch('main.core.is_admin', return_value=True)
         self.get_settings = patch('main.core.get_settings', return_value={
             'auto_monitor': False,
-            'monitor_interval': 5,
+            'monitor_min_interval': 60,
+            'monitor_max_interval': 1800,
             'auto_repair': False,
             'flush_on_repair': True,
         })
+        # 启动时的首次检测在后台线程执行，界面测试里不跑真实命令
+        self.start_refresh = patch('main.App._start_refresh')
+        # 界面测试不写入数据目录中的历史数据库
+        self.record_history = patch('main.App._record_history')
         self.is_admin.start()
         self.get_settings.start()
+        self.start_refresh.start()
+        self.record_history.start()
         self.addCleanup(self.is_admin.stop)
         self.addCleanup(self.get_settings.stop)
+        self.addCleanup(self.start_refresh.stop)
+        self.addCleanup(self.record_history.stop)
 
     def _create_app(self):
         app = main.App()
@@ -40,7 +51,8 @@ class AppTests(unittest.TestCase):
         self.get_settings.stop()
         self.get_settings = patch('main.core.get_settings', return_value={
             'auto_monitor': True,
-            'monitor_interval': 5,
+            'monitor_min_interval': 60,
+            'monitor_max_interval': 1800,
             'auto_repair': True,
             'flush_on_repair': True,
         })
@@ -56,11 +68,34 @@ class AppTests(unittest.TestCase):
 
         app._start_repair.assert_called_once_with(['Ethernet'], auto=True)
 
+    def test_network_change_refresh_triggers_auto_repair(self):
+        self.get_settings.stop()
+        self.get_settings = patch('main.core.get_settings', return_value={
+            'auto_monitor': True,
+            'monitor_min_interval': 60,
+            'monitor_max_interval': 1800,
+            'auto_repair': True,
+            'flush_on_repair': True,
+        })
+        self.get_settings.start()
+        self.addCleanup(self.get_settings.stop)
+
+        with patch('main.core.create_change_source', return_value=None):
+            app = self._create_app()
+        app._start_repair = Mock()
+
+        adapters = [{'name': 'Ethernet', 'type': 'ethernet', 'has_gateway': True}]
+        configs = {'Ethernet': {'adapter': 'Ethernet', 'mode': 'static', 'ips': ['1.1.1.1']}}
+        app._apply_refresh(adapters, configs, 'change')
+
+        app._start_repair.assert_called_once_with(['Ethernet'], auto=True)
+
     def test_manual_refresh_does_not_trigger_auto_repair(self):
         self.get_settings.stop()
         self.get_settings = patch('main.core.get_settings', return_value={
             'auto_monitor': True,
-            'monitor_interval': 5,
+            'monitor_min_interval': 60,
+            'monitor_max_interval': 1800,
             'auto_repair': True,
             'flush_on_repair': True,
         })
@@ -76,6 +111,115 @@ class AppTests(unittest.TestCase):
 
         app._start_repair.assert_not_called()
 
+    def test_change_during_refresh_triggers_follow_up_refresh(self):
+        app = self._create_app()
+        app._scheduler = Mock()
+        app._scheduler.observe.return_value = None
+        app._refresh_in_progress = True
+        adapters = [{'name': 'Ethernet', 'type': 'ethernet', 'has_gateway': True}]
+        configs = {'Ethernet': {'adapter': 'Ethernet', 'mode': 'dhcp', 'ips': ['10.0.0.1']}}
+
+        app.refresh('change')
+        main.App._start_refresh.reset_mock()
+        app._apply_refresh(adapters, configs, 'monitor')
+
+        self.assertTrue(app._scheduler.observe.call_args.kwargs['event'])
+        main.App._start_refresh.assert_called_once_with('change')
+        self.assertFalse(app._change_pending)
+
+    def test_refresh_result_from_worker_thread_is_applied_on_the_ui_thread(self):
+        app = self._create_app()
+        app._refresh_in_progress = True
+        # 后台线程在 mainloop 之外完成，不能直接调用 Tk
+        with patch('main.core.get_active_adapters', side_effect=RuntimeError('boom')):
+            worker = threading.Thread(target=app._do_refresh, args=('manual',))
+            worker.start()
+            worker.join()
+
+        self.assertTrue(app._refresh_in_progress)
+        self._pump(app, lambda: not app._refresh_in_progress)
+        self.assertFalse(app._refresh_in_progress)
+
+    def test_repeated_refresh_reuses_widgets_and_skips_unchanged_updates(self):
+        app = self._create_app()
+        adapters = [{'name': 'Ethernet', 'type': 'ethernet', 'has_gateway': True}]
+        configs = {'Ethernet': {'adapter': 'Ethernet', 'mode': 'dhcp', 'ips': ['10.0.0.1']}}
+        app._apply_refresh(adapters, configs, 'monitor')
+
+        row_children = [tuple(row.winfo_children()) for row in app.info_rows]
+        canvas_items = app.canvas.find_all()
+        with patch.object(app.adapter_menu, 'configure') as menu_config, \
+             patch.object(app.lbl_status, 'config') as status_config:
+            app._apply_refresh(adapters, dict(configs), 'monitor')
+
+        menu_config.assert_not_called()
+        status_config.assert_not_called()
+        self.assertEqual([tuple(row.winfo_children()) for row in app.info_rows], row_children)
+        self.assertEqual(app.canvas.find_all(), canvas_items)
+        self.assertEqual(app.lbl_status.cget('text'), 'DHCP_AUTO')
+
+    def test_settings_window_keeps_unlisted_max_interval_seconds(self):
+        app = self._create_app()
+        app.reload_settings = Mock()
+        settings = dict(main.core.get_settings(), monitor_max_interval=450)
+
+        # 隐藏的主窗口下子窗口不可见，grab_set 会失败
+        with patch('main.core.get_settings', return_value=settings), \
+             patch('main.SettingsWindow.grab_set'), \
+             patch('main.core.save_settings') as save:
+            window = main.SettingsWindow(app)
+            self.assertEqual(window._interval_btns[450].cget('text'), '450s')
+            window._save()
+
+        self.assertEqual(save.call_args.args[0]['monitor_max_interval'], 450)
+
+    def test_log_window_queries_pages_off_the_ui_thread_and_applies_filters(self):
+        app = self._create_app()
+        page = [{'seq': 500 - i, 'action': 'repair', 'adapter': 'Ethernet', 'success': True, 'ts': 't'}
+                for i in range(main.LOG_PAGE_SIZE)]
+        threads = []
+
+        def get_logs(**query):
+            threads.append(threading.current_thread())
+            return page if query['before'] is None else []
+
+        with patch('main.core.get_logs', side_effect=get_logs) as logs, patch('main.LogWindow.grab_set'):
+            window = main.LogWindow(app)
+            self.addCleanup(window.destroy)
+            self._pump(app, lambda: window.listbox.size() > 0)
+            first = logs.call_args_list[0].kwargs
+            window._cycle_filter(window._action_btn, 'action', window.ACTION_FILTERS)
+            self._pump(app, lambda: any(c.kwargs['action'] == 'repair' for c in logs.call_args_list))
+
+        self.assertEqual(first, {'limit': main.LOG_PAGE_SIZE, 'before': None,
+                                 'adapter': None, 'action': None, 'success': None})
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertIn('[REPAIR] Ethernet', window.listbox.get(0))
+
+    def _pump(self, app, done, timeout=2.0):
+        end = time.monotonic() + timeout
+        while not done() and time.monotonic() < end:
+            app.update()
+            time.sleep(0.01)
+        app.update()
+
+
+class StartupProfileTests(unittest.TestCase):
+    def test_report_derives_phase_durations_from_marks(self):
+        profile = main.StartupProfile(start=10.0)
+        for name, at in (('tk_imported', 10.05), ('core_imported', 10.06), ('ui_start', 10.061),
+                         ('probe_start', 10.062), ('ui_built', 10.2), ('probe_done', 10.4),
+                         ('first_result', 10.41)):
+            profile.mark(name, at)
+        profile.mark('first_result', 99.0)   # 只记录第一次
+
+        report = profile.report()
+
+        self.assertEqual(report['import_core_ms'], 10.0)
+        self.assertEqual(report['ui_build_ms'], 139.0)
+        self.assertEqual(report['probe_ms'], 338.0)
+        self.assertEqual(report['time_to_first_status_ms'], 410.0)
+
 
 if __name__ == '__main__':
     unittest.main()